@@ -3,6 +3,10 @@ Chrome History Sidepanel Backend Application.
 
 A FastAPI application for tracking page visit metrics and history.
 """
+import time
+
+# Reference point for startup timing (first import of the package)
+STARTED_AT = time.perf_counter()
 
 __version__ = "0.1.0"
 __author__ = "Daniel Uche"
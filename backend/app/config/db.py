@@ -1,32 +1,92 @@
-from typing import Generator
+from typing import Generator, List
 
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 
-from .settings import Settings
+from app.utils.statement_cache import instrument
+from . import sqlite
+from .settings import settings
 
-# Initialize settings
-settings = Settings()
 
-# Create database engine with connection pooling configuration
-engine: Engine = create_engine(
-    settings.DATABASE_URL,
-    future=True,
-    pool_pre_ping=True,  # Verify connections before using them
-    pool_size=10,  # Maximum number of connections to keep in pool
-    max_overflow=20,  # Maximum number of connections that can be created beyond pool_size
-    pool_timeout=30,  # Seconds to wait before giving up on getting a connection
-    pool_recycle=3600,  # Recycle connections after 1 hour to avoid stale connections
-)
+def _connect_args(database_url: str) -> dict:
+    """Driver options; psycopg (v3) can run repeated statements as server-side prepared ones."""
+    if make_url(database_url).drivername == "postgresql+psycopg":
+        threshold = settings.DB_PREPARE_THRESHOLD
+        return {"prepare_threshold": threshold if threshold >= 0 else None}
+    return {}
+
+
+def _create_engine(database_url: str) -> Engine:
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        # Embedded file: SQLAlchemy's default pool for the URL, no pre-ping or recycling
+        sqlite_engine = create_engine(url, future=True, connect_args=sqlite.connect_args())
+        sqlite.configure_engine(sqlite_engine)
+        return sqlite_engine
+
+    # Create database engine with connection pooling configuration
+    return create_engine(
+        url,
+        future=True,
+        pool_pre_ping=True,  # Verify connections before using them
+        pool_size=10,  # Maximum number of connections to keep in pool
+        max_overflow=20,  # Maximum number of connections that can be created beyond pool_size
+        pool_timeout=30,  # Seconds to wait before giving up on getting a connection
+        pool_recycle=3600,  # Recycle connections after 1 hour to avoid stale connections
+        connect_args=_connect_args(database_url),
+    )
+
+
+engine: Engine = _create_engine(settings.DATABASE_URL)
+
+# Compiled statement cache hit/miss counters, reported by /health
+statement_cache_stats = instrument(engine)
+
+
+def statement_timeout_for(path: str) -> int:
+    """statement_timeout in ms for a request path (longest configured prefix wins)."""
+    best_prefix, timeout_ms = "", settings.DB_STATEMENT_TIMEOUT_MS
+    for prefix, ms in settings.DB_STATEMENT_TIMEOUTS_MS.items():
+        if path.startswith(prefix) and len(prefix) > len(best_prefix):
+            best_prefix, timeout_ms = prefix, ms
+    return timeout_ms
+
+
+def _apply_statement_timeout(session, transaction, connection) -> None:
+    # SET LOCAL lasts for one transaction, so it is re-applied on every begin
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def _begin_read_then_write(session, transaction, connection) -> None:
+    # A deferred SQLite transaction cannot write once another connection has
+    # committed after its first read; see app.config.sqlite
+    if session.info.get("read_then_write") and connection.dialect.name == "sqlite":
+        sqlite.begin_immediate(connection)
+
+
+def _sessionmaker(bind: Engine) -> sessionmaker:
+    factory = sessionmaker(
+        bind=bind,
+        autocommit=False,
+        autoflush=False,
+        future=True,
+        expire_on_commit=False,
+    )
+    event.listen(factory, "after_begin", _apply_statement_timeout)
+    event.listen(factory, "after_begin", _begin_read_then_write)
+    return factory
+
 
 # Create session factory
-SessionLocal: sessionmaker = sessionmaker(
-    bind=engine,
-    autocommit=False,
-    autoflush=False,
-    future=True,
-    expire_on_commit=False,
-)
+SessionLocal: sessionmaker = _sessionmaker(engine)
+
+# Sharded mode: one engine (and pool) per shard, indexed as in DATABASE_SHARD_URLS
+shard_engines: List[Engine] = [_create_engine(url) for url in settings.DATABASE_SHARD_URLS]
+ShardSessionLocals: List[sessionmaker] = [_sessionmaker(shard) for shard in shard_engines]
+
 
 # Declarative base for ORM models
 Base = declarative_base()
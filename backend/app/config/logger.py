@@ -1,37 +1,217 @@
+import copy
+import json
+import queue
+import random
 import sys
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
 from loguru import logger
 
-from app.config.settings import Settings
+from app.config.settings import settings
+
+TEXT_CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+TEXT_FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+ERROR_LOG_PATH = "logs/error.log"
+
+# Set per request by RequestIdMiddleware and attached to every log record
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_background_sinks: List["BackgroundSink"] = []
+
+
+class BackgroundSink:
+    """
+    Bounded queue in front of a slow sink, drained by a daemon thread.
+
+    The request thread only formats and enqueues; writes, rotation and
+    compression happen on the writer thread. When the queue is full the
+    message is dropped and counted, and the writer reports the count.
+    """
+
+    _STOP = object()
+
+    def __init__(self, write: Callable[[str], None], maxsize: int, name: str, report_drops: bool = True):
+        self.name = name
+        self._write = write
+        self._report_drops = report_drops  # Off for sinks whose format a notice line would break
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._reported = 0
+        self._thread = threading.Thread(target=self._run, name=f"log-writer-{name}", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message) -> None:
+        try:
+            self._queue.put_nowait(str(message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            try:
+                if self._report_drops and self.dropped != self._reported:
+                    dropped, self._reported = self.dropped - self._reported, self.dropped
+                    self._write(f"[logging] dropped {dropped} messages: log queue full\n")
+                self._write(item)
+            except Exception:
+                # Never let a broken sink kill the writer thread
+                pass
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued and stop the writer."""
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+
+
+def _add_request_id(record) -> None:
+    record["extra"].setdefault("request_id", request_id_var.get() or "-")
+
+
+def _json_format(record) -> str:
+    """loguru format callable rendering one compact JSON object per line."""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["extra"].get("name", record["name"]),
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+        "request_id": record["extra"].get("request_id"),
+    }
+    extra = {k: v for k, v in record["extra"].items() if k not in ("name", "request_id", "_json")}
+    if extra:
+        payload["extra"] = extra
+    if record["exception"] is not None:
+        exc_type, exc_value, _ = record["exception"]
+        payload["exception"] = f"{getattr(exc_type, '__name__', exc_type)}: {exc_value}"
+    record["extra"]["_json"] = json.dumps(payload, default=str)
+    return "{extra[_json]}\n"
+
+
+def make_sampling_filter(rates: Dict[str, float]) -> Callable:
+    """
+    Keep only a fraction of below-WARNING records from the configured loggers.
+
+    `rates` maps a logger name (or dotted prefix, e.g. "app.middleware") to the
+    fraction of DEBUG/INFO records kept; warnings and errors are never sampled.
+    """
+    resolved: Dict[str, float] = {}
+
+    def rate_for(name: str) -> float:
+        rate = resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in rates:
+                    rate = rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            resolved[name] = rate
+        return rate
+
+    def sampling_filter(record) -> bool:
+        if record["level"].no >= 30 or not rates:
+            return True
+        rate = rate_for(record["extra"].get("name", record["name"]))
+        return rate >= 1.0 or random.random() < rate
+
+    return sampling_filter
 
 
 def setup_logger():
     """Configure loguru logger with structured logging."""
-    settings = Settings()
-    
-    # Remove default handler
+    # Remove default handler (and any background writers from a previous setup)
+    shutdown_logger()
     logger.remove()
-    
-    # Add console handler with custom format
-    logger.add(
-        sys.stdout,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level=settings.LOG_LEVEL,
-        colorize=True,
-    )
-    
-    # Add file handler for errors
-    logger.add(
-        "logs/error.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="ERROR",
+    logger.configure(patcher=_add_request_id)
+
+    use_json = settings.LOG_FORMAT.lower() == "json"
+    console_format = _json_format if use_json else TEXT_CONSOLE_FORMAT + " | {extra[request_id]}"
+    file_format = _json_format if use_json else TEXT_FILE_FORMAT + " | {extra[request_id]}"
+    sampling_filter = make_sampling_filter(settings.LOG_SAMPLING)
+
+    if not settings.LOG_ASYNC:
+        # Add console handler with custom format
+        logger.add(
+            sys.stdout,
+            format=console_format,
+            level=settings.LOG_LEVEL,
+            colorize=not use_json,
+            filter=sampling_filter,
+        )
+
+        # Add file handler for errors
+        logger.add(
+            ERROR_LOG_PATH,
+            format=file_format,
+            level="ERROR",
+            rotation="10 MB",
+            retention="30 days",
+            compression="zip",
+            delay=True,  # Don't create the file (or logs/) until the first error
+        )
+        return logger
+
+    # Async mode: the error file keeps loguru's rotation/compression, but on an
+    # independent logger copy that is only ever called from the writer thread
+    file_writer = copy.deepcopy(logger)
+    file_writer.add(
+        ERROR_LOG_PATH,
+        format="{message}",
         rotation="10 MB",
         retention="30 days",
         compression="zip",
+        delay=True,
     )
-    
+
+    def write_console(text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    console_sink = BackgroundSink(write_console, settings.LOG_QUEUE_SIZE, "console")
+    file_sink = BackgroundSink(
+        lambda text: file_writer.opt(raw=True).error(text), settings.LOG_QUEUE_SIZE, "error-file"
+    )
+    _background_sinks.extend([console_sink, file_sink])
+
+    logger.add(
+        console_sink,
+        format=console_format,
+        level=settings.LOG_LEVEL,
+        colorize=not use_json,
+        filter=sampling_filter,
+    )
+    logger.add(file_sink, format=file_format, level="ERROR", colorize=False)
     return logger
 
 
+def log_queue_stats() -> Dict[str, Dict[str, int]]:
+    """Messages waiting in, and dropped by, each background sink (empty in synchronous mode)."""
+    return {sink.name: {"queued": sink.queued, "dropped": sink.dropped} for sink in _background_sinks}
+
+
+def shutdown_logger() -> None:
+    """Detach, flush and stop background writers (no-op in synchronous mode)."""
+    if not _background_sinks:
+        return
+    logger.remove()
+    while _background_sinks:
+        _background_sinks.pop().stop()
+
+
 def get_logger(name: str = "app"):
     """Get logger instance."""
     return logger.bind(name=name)
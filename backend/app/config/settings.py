@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -10,9 +11,126 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: str = ""
+    # With the psycopg (v3) driver (postgresql+psycopg://), statements executed this
+    # many times on a connection become server-side prepared statements; -1 disables
+    # (e.g. behind PgBouncer in transaction mode). psycopg2 has no equivalent.
+    DB_PREPARE_THRESHOLD: int = 5
+    # Postgres statement_timeout per request: default, and overrides by longest
+    # matching path prefix (as JSON); 0 disables
+    DB_STATEMENT_TIMEOUT_MS: int = 5000
+    DB_STATEMENT_TIMEOUTS_MS: Dict[str, int] = {"/metrics/stats": 15000, "/search": 3000}
+    # Sharded mode: per-URL tables (visits, repeats, daily rollups) live on these
+    # databases, chosen by a hash of the canonical URL (as a JSON list). Only ever
+    # append; DATABASE_URL keeps everything else. Empty keeps one database.
+    DATABASE_SHARD_URLS: List[str] = []
+    DB_SHARD_GATHER_THREADS: int = 16  # Threads querying shards in parallel, shared by all requests
+
+    # Admission control: requests allowed past the middleware at once. Keep
+    # READ + WRITE under the pool (pool_size 10 + max_overflow 20) so admitted
+    # requests never wait on pool_timeout and /health always finds a connection
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_READ_LIMIT: int = 20
+    ADMISSION_WRITE_LIMIT: int = 8
+    ADMISSION_QUEUE_SIZE: int = 50  # Waiting requests per budget before rejecting outright
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # SQLite (DATABASE_URL=sqlite:///path.db): pragmas applied to every connection
+    SQLITE_JOURNAL_MODE: str = "WAL"  # Readers run alongside the single writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # Durable with WAL except on power loss; FULL fsyncs every commit
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # Bytes of the file read via mmap
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # Page cache per connection
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 5.0  # Wait for the writer lock/other processes before failing
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # "text" or "json"
+    LOG_ASYNC: bool = False  # Write logs from a background thread via a bounded queue
+    LOG_QUEUE_SIZE: int = 10000  # Messages buffered per sink before dropping
+    LOG_SAMPLING: Dict[str, float] = {}  # Logger name/prefix -> fraction of DEBUG/INFO kept, as JSON
+
+    # Traffic capture for load replays (scripts/replay-traffic.sh)
+    TRAFFIC_CAPTURE_ENABLED: bool = False
+    TRAFFIC_CAPTURE_FILE: str = "logs/traffic.jsonl"
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 0.1  # Fraction of requests recorded
+    TRAFFIC_CAPTURE_ANONYMIZE: bool = True  # Replace URLs, domains and search text with keyed hashes
+    TRAFFIC_CAPTURE_SALT: str = ""  # Hash key; if empty, a random one is kept in TRAFFIC_CAPTURE_FILE.key
+
+    # On-demand CPU profiling (app/middleware/profiling.py); off unless a token or rate is set
+    PROFILING_TOKEN: str = ""  # Admin secret: requests sending it in X-Profile are profiled individually
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of all requests folded into aggregate profiles
+    PROFILING_DIR: str = "logs/profiles"  # Collapsed-stack files, one per profiled request or window
+    PROFILING_INTERVAL_MS: float = 5.0  # Stack sampling period
+    PROFILING_AGGREGATE_SECONDS: float = 300.0  # Length of each aggregate profile window
+    PROFILING_AGGREGATE_KEEP: int = 48  # Newest aggregate files kept in PROFILING_DIR
+
+    # Memory diagnostics (app/routers/debug.py); the endpoints answer 404 unless the token is set
+    MEMORY_DIAGNOSTICS_TOKEN: str = ""  # Admin secret, sent in X-Admin-Token
+    MEMORY_TRACE_AT_STARTUP: bool = False  # Start tracemalloc at startup, not at the first snapshot
+    MEMORY_TRACE_FRAMES: int = 1  # Stack frames kept per traced allocation
+    MEMORY_SNAPSHOT_TOP: int = 25  # Allocation sites listed per snapshot
+    MEMORY_SAMPLE_RATE: float = 0.0  # Fraction of requests whose retained allocations are summed per route
+
+    # Startup
+    STARTUP_BUDGET_SECONDS: float = 5.0  # Warn when boot-to-ready exceeds this
+    STARTUP_PREWARM_CONNECTIONS: int = 10  # Pool connections opened before reporting ready
+
+    # URL canonicalization
+    URL_CACHE_SIZE: int = 4096  # Raw URL -> canonical URL memo entries
+    URL_STRIP_TRACKING_PARAMS: bool = False  # Drop utm_*, gclid, fbclid, ... from stored URLs
+
+    # Idempotency-Key replay cache for POST /visits
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    IDEMPOTENCY_MAX_KEYS: int = 10000  # Per worker
+
+    # Compact storage: revisits with unchanged metrics store only a timestamp record
+    VISIT_DEDUP_ENABLED: bool = False
+    VISIT_DEDUP_CACHE_SIZE: int = 10000  # URLs whose latest metrics are kept per worker
+    VISIT_DEDUP_RECHECK_SECONDS: float = 60.0  # While off: how often to look for repeats other workers wrote
+
+    # Top domains/URLs (GET /top)
+    HEAVY_HITTERS_CAPACITY: int = 1000  # Counters per day and kind
+    HEAVY_HITTERS_RETENTION_DAYS: int = 90
+    HEAVY_HITTERS_CHECKPOINT_SECONDS: float = 60.0
+
+    # Known-URL Bloom filter: /metrics and /visits for never-recorded URLs skip the database.
+    # Needs VISIT_STREAM_PG_BRIDGE, so every worker hears every new URL
+    KNOWN_URLS_FILTER_ENABLED: bool = False
+    KNOWN_URLS_FALSE_POSITIVE_RATE: float = 0.01  # Unseen URLs that still take the query
+    KNOWN_URLS_MIN_CAPACITY: int = 100_000  # URLs sized for at least; rebuilds size for 2x the current count
+    KNOWN_URLS_REBUILD_SECONDS: float = 3600.0
+
+    # In-process columnar store of recent visits, serving most /visits, /metrics and stats reads.
+    # Needs VISIT_STREAM_PG_BRIDGE, so every worker holds every new visit
+    HOT_STORE_ENABLED: bool = False
+    HOT_STORE_WINDOW_HOURS: float = 72.0  # Must be shorter than RETENTION_RAW_DAYS
+    HOT_STORE_MAX_BYTES: int = 256 * 1024 * 1024  # Column memory; the window shrinks to fit
+    HOT_STORE_MAINTENANCE_SECONDS: float = 60.0  # Eviction and buffer merge interval
+
+    # URL search (GET /search)
+    SEARCH_IN_PROCESS_INDEX: bool = False  # In-memory prefix/trigram index; for SQLite deployments
+
+    # Retention: raw visits older than this are rolled into page_metric_daily
+    RETENTION_ENABLED: bool = False
+    RETENTION_RAW_DAYS: int = 90
+    RETENTION_BATCH_SIZE: int = 1000  # Rows deleted per transaction
+    RETENTION_INTERVAL_SECONDS: float = 3600.0
+
+    # Cold storage: raw visits removed by retention are kept in compressed segment files
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"  # Shared by every worker serving reads
+    ARCHIVE_BLOCK_ROWS: int = 1000  # Rows per compressed block; a URL lookup decompresses only its blocks
+    ARCHIVE_COMPACT_ROWS: int = 1_000_000  # Rows per segment after compaction
+    ARCHIVE_COMPACT_SECONDS: float = 3600.0  # How often the scheduler merges the small per-batch segments
+
+    # Incremental change feed (GET /visits/changes)
+    VISIT_CHANGES_SETTLE_SECONDS: float = 1.0  # Postgres: wait for writes holding lower ids, else return an empty page
+
+    # Live visit stream (GET /visits/stream)
+    VISIT_STREAM_BUFFER_SIZE: int = 100  # Max queued events per connection before dropping oldest
+    VISIT_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    VISIT_STREAM_PG_BRIDGE: bool = False  # Fan out across workers via Postgres LISTEN/NOTIFY
+    VISIT_STREAM_RESYNC_SECONDS: float = 15.0  # How soon the known-URL filter and hot store catch up after a reconnect
 
 
-# Create settings instance
+# Single shared settings instance; import this rather than calling Settings()
 settings = Settings()
@@ -0,0 +1,187 @@
+"""
+SQLite tuning for single-user deployments (DATABASE_URL=sqlite:///...).
+
+Every new connection gets the configured pragmas (WAL journal, relaxed
+`synchronous`, memory-mapped I/O, a larger page cache, a busy timeout).
+
+SQLite allows one writer at a time. Instead of letting concurrent writers
+race and fail with "database is locked", writes in this process queue on a
+single lock: a transaction whose first statement writes starts with
+BEGIN IMMEDIATE while holding it, and it is released on commit or rollback.
+Readers never wait on it (`WITH ... SELECT` included); in WAL mode they run
+alongside the writer.
+
+A transaction that reads first starts with a plain BEGIN and only takes the
+lock at its first write. If another connection committed in between, that
+write fails at once with "database is locked" (SQLITE_BUSY_SNAPSHOT), which
+neither the lock nor the busy timeout can help. Sessions that read and then
+write in one transaction set `session.info["read_then_write"]`; their
+transactions start with BEGIN IMMEDIATE under the lock (`begin_immediate`). A thread that already holds the lock through one
+session takes it again for another instead of queueing behind itself;
+SQLite's busy timeout then arbitrates the two connections.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import OperationalError
+
+from .settings import settings
+
+READ_KEYWORDS = ("SELECT", "PRAGMA", "EXPLAIN")
+# Statements a WITH clause can introduce that only read
+_CTE_READS = ("SELECT", "VALUES")
+_CTE_BODIES = _CTE_READS + ("INSERT", "UPDATE", "DELETE", "REPLACE")
+# Quoted strings and identifiers, comments, parentheses and words
+_TOKEN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/|[()]|\w+""", re.S)
+
+
+def is_memory_database(database: str | None) -> bool:
+    return not database or database == ":memory:" or database.startswith("file::memory:")
+
+
+def connect_args() -> dict:
+    return {
+        "check_same_thread": False,  # Pooled connections move between request threads
+        "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS,
+    }
+
+
+def _cte_statement(statement: str) -> str:
+    """The statement a leading WITH clause belongs to (e.g. SELECT); "" if not found."""
+    depth = 0
+    for match in _TOKEN.finditer(statement):
+        token = match.group()
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper() in _CTE_BODIES:
+            return token.upper()
+    return ""
+
+
+def _is_write(statement: str) -> bool:
+    statement = statement.lstrip()
+    if statement[:4].upper() == "WITH":
+        return _cte_statement(statement) not in _CTE_READS
+    return not statement.upper().startswith(READ_KEYWORDS)
+
+
+class WriterLock:
+    """
+    The writer lock, re-entrant per thread.
+
+    Unlike threading.RLock it may be released from any thread: a session can
+    commit or close on another thread than the one where it started writing.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._owner: Optional[int] = None
+        self._holds = 0
+
+    def acquire(self, timeout: float) -> bool:
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner != me:
+                if not self._condition.wait_for(lambda: self._holds == 0, timeout):
+                    return False
+                self._owner = me
+            self._holds += 1
+            return True
+
+    def release(self) -> None:
+        with self._condition:
+            self._holds -= 1
+            if self._holds == 0:
+                self._owner = None
+                self._condition.notify()
+
+
+def begin_immediate(conn) -> None:
+    """Start the connection's pending transaction with BEGIN IMMEDIATE, whatever its first statement."""
+    # Only engines set up by configure_engine have a pending BEGIN to upgrade
+    if "sqlite_begin_pending" in conn.info:
+        conn.info["sqlite_begin_pending"] = "immediate"
+
+
+def configure_engine(engine: Engine) -> WriterLock:
+    """
+    Apply pragmas on connect and serialize writers on one lock.
+
+    Returns:
+        WriterLock: The writer lock, held while a write transaction is open
+    """
+    writer_lock = WriterLock()
+    in_memory = is_memory_database(engine.url.database)
+    pragmas = [
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size = -{settings.SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}",
+        "PRAGMA foreign_keys = ON",
+    ]
+    if not in_memory:
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # Take over transaction control from the sqlite3 module so BEGIN is ours
+        dbapi_connection.isolation_level = None
+        for pragma in pragmas:
+            dbapi_connection.execute(pragma)
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        # Defer BEGIN until the first statement shows whether this transaction writes
+        conn.info["sqlite_begin_pending"] = True
+
+    def _acquire(conn, statement, parameters) -> None:
+        if not writer_lock.acquire(timeout=settings.SQLITE_BUSY_TIMEOUT_SECONDS):
+            raise OperationalError(
+                statement, parameters, sqlite3.OperationalError("database is locked (writer queue timeout)")
+            )
+        conn.info["sqlite_writer"] = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        writes = _is_write(statement)
+        pending = conn.info.pop("sqlite_begin_pending", False)
+        if pending:
+            if writes or pending == "immediate":
+                _acquire(conn, statement, parameters)
+                conn.connection.dbapi_connection.execute("BEGIN IMMEDIATE")
+            else:
+                conn.connection.dbapi_connection.execute("BEGIN")
+        elif writes and conn.in_transaction() and not conn.info.get("sqlite_writer"):
+            _acquire(conn, statement, parameters)
+
+    def _release(info: dict) -> None:
+        info.pop("sqlite_begin_pending", None)
+        if info.pop("sqlite_writer", False):
+            writer_lock.release()
+
+    # Fired just before the driver commits/rolls back; a writer waiting on the lock
+    # then starts BEGIN IMMEDIATE, which the busy timeout covers until that finishes.
+    # If no statement ran, no BEGIN was sent and the driver call is a no-op.
+    @event.listens_for(engine, "commit")
+    def _on_commit(conn):
+        _release(conn.info)
+
+    @event.listens_for(engine, "rollback")
+    def _on_rollback(conn):
+        _release(conn.info)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        # Safety net for connections returned to the pool mid-transaction
+        if connection_record is not None:
+            _release(connection_record.info)
+
+    return writer_lock
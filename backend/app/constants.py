@@ -4,6 +4,7 @@ DATETIME_FORMAT = "%B %d, %Y at %I:%M %p"
 # API Tags
 TAG_HEALTH = "health"
 TAG_HISTORY = "history"
+TAG_ADMIN = "admin"
 
 # HTTP Status Codes
 NOT_FOUND_STATUS = 404
@@ -11,6 +12,25 @@ NOT_FOUND_STATUS = 404
 # Default Query Limits
 DEFAULT_VISIT_LIMIT = 50
 
+# URL canonicalization
+MAX_URL_LENGTH = 2048  # Standard max URL length
+MIN_URL_LENGTH = 1
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+TRACKING_PARAMS = frozenset({"gclid", "dclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_ga", "yclid"})
+
+# Common multi-label public suffixes; anything else is treated as a one-label suffix
+MULTI_LABEL_SUFFIXES = frozenset({
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "ltd.uk", "plc.uk", "me.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au",
+    "co.nz", "org.nz", "co.jp", "ne.jp", "or.jp", "ac.jp", "co.kr", "or.kr",
+    "com.br", "com.cn", "net.cn", "org.cn", "com.hk", "com.sg", "com.tw",
+    "co.in", "net.in", "org.in", "co.za", "com.mx", "com.ar", "com.tr", "com.ng",
+    "github.io", "gitlab.io", "herokuapp.com", "vercel.app", "netlify.app", "pages.dev",
+    "blogspot.com", "appspot.com", "cloudfront.net", "azurewebsites.net",
+})
+MAX_HOST_LENGTH = 253
+
 # Application Info
 APP_TITLE = "History Sidepanel API"
 APP_VERSION = "0.1.0"
@@ -9,6 +9,43 @@ class URLNotVisitedException(HTTPException):
             detail=f"No visits recorded for URL: {url}",
         )
 
+
+class InvalidIdempotencyKeyException(HTTPException):
+    """Raised when an Idempotency-Key header is empty or too long."""
+    def __init__(self, max_length: int):
+        super().__init__(
+            status_code=400,
+            detail=f"Idempotency-Key must be between 1 and {max_length} characters",
+        )
+
+
+class InvalidFieldsException(HTTPException):
+    """Raised when a `fields` query parameter names a field the response does not have."""
+    def __init__(self, unknown: list, allowed: tuple):
+        super().__init__(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(allowed)}",
+        )
+
+
+class IdempotencyKeyMismatchException(HTTPException):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+    def __init__(self):
+        super().__init__(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+
+
+class AdminNotAuthorizedException(HTTPException):
+    """Raised when an admin endpoint is called without its token; a 404 so the endpoint stays hidden."""
+    def __init__(self):
+        super().__init__(
+            status_code=404,
+            detail="Not Found",
+        )
+
+
 class DatabaseConnectionException(Exception):
     """Raised when database connection fails."""
     def __init__(self, message: str = "Failed to connect to database"):
@@ -2,41 +2,147 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
 
-from app.config import SessionLocal
-from app.config.logger import setup_logger, get_logger
+from app import STARTED_AT
+from app.config import SessionLocal, engine
+from app.config.db import shard_engines
+from app.config.logger import setup_logger, shutdown_logger, get_logger
+from app.config.settings import settings
 from app.constants import APP_DESCRIPTION, APP_TITLE, APP_VERSION
 from app.exceptions import DatabaseConnectionException
-from app.middleware import DatabaseMiddleware, limiter, RequestValidationMiddleware, RateLimitMiddleware
+from app.middleware import memory, profiling
+from app.middleware.traffic_capture import close_recorder
+from app.middleware import AdmissionMiddleware, database_error_handler, DatabaseMiddleware, limiter, MemoryMiddleware, ProfilingMiddleware, RequestIdMiddleware, RequestValidationMiddleware, RateLimitMiddleware, TrafficCaptureMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from sqlalchemy.exc import OperationalError
+from app.services import archive, dedup, heavy_hitters, hot_store, known_urls, page_metrics, retention, search, sharding, visit_stream
+from app.utils.scheduler import Scheduler
+from app.utils.startup import StartupTimer, prefill_pool
 
 # Setup structured logging
 setup_logger()
 logger = get_logger(__name__)
 
 
+def _run_with_session(job) -> None:
+    """Run a maintenance job with its own short-lived session, logging failures."""
+    db = SessionLocal()
+    try:
+        job(db)
+    except Exception as e:
+        logger.error(f"{getattr(job, '__qualname__', job)} failed: {e}")
+    finally:
+        sharding.close_sessions(db)
+        db.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    app.state.ready = False
+    timer = StartupTimer(STARTED_AT)
+    timer.mark("imports")
     logger.info("Starting up application...")
-    # Test database connection
-    logger.info("Testing database connection...")
+    if settings.MEMORY_TRACE_AT_STARTUP:
+        memory.snapshots.start(settings.MEMORY_TRACE_FRAMES)
+
+    # Open the pool's connections up front; this is also the connectivity check
     try:
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))
-        db.close()
-        logger.info("Database connected successfully")
+        with timer.phase("database"):
+            opened = prefill_pool(engine, settings.STARTUP_PREWARM_CONNECTIONS)
+            for shard_engine in shard_engines:
+                opened += prefill_pool(shard_engine, settings.STARTUP_PREWARM_CONNECTIONS)
+        logger.info(f"Database connected successfully ({opened} pooled connections ready)")
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         raise DatabaseConnectionException(str(e))
 
+    # Misconfiguration fails startup here; the warm-up jobs below only log failures
+    if settings.KNOWN_URLS_FILTER_ENABLED:
+        known_urls.check_settings()
+    if settings.HOT_STORE_ENABLED:
+        hot_store.check_settings()
+
+    if settings.VISIT_STREAM_PG_BRIDGE:
+        visit_stream.start_bridge(settings.DATABASE_URL)
+
+    # Warm statement and in-process caches before reporting ready
+    with timer.phase("warmup"):
+        _run_with_session(page_metrics.warm_up)
+        _run_with_session(heavy_hitters.tracker.load)
+        if settings.SEARCH_IN_PROCESS_INDEX:
+            _run_with_session(search.enable_index)
+        # After warm_up, whose reads use a URL the filter would answer without a query
+        if settings.KNOWN_URLS_FILTER_ENABLED:
+            _run_with_session(known_urls.enable)
+        if settings.HOT_STORE_ENABLED:
+            _run_with_session(hot_store.enable)
+
+    scheduler = Scheduler()
+    scheduler.every(
+        settings.HEAVY_HITTERS_CHECKPOINT_SECONDS,
+        lambda: _run_with_session(heavy_hitters.tracker.checkpoint),
+        name="heavy-hitters-checkpoint",
+    )
+    if not settings.VISIT_DEDUP_ENABLED:
+        # Workers still on an older config may write repeats this one must read
+        visit_stream.hub.add_listener(dedup.note_visit)
+        scheduler.every(
+            settings.VISIT_DEDUP_RECHECK_SECONDS,
+            lambda: _run_with_session(dedup.recheck_repeats),
+            name="dedup-recheck",
+        )
+    if settings.KNOWN_URLS_FILTER_ENABLED:
+        scheduler.every(
+            settings.KNOWN_URLS_REBUILD_SECONDS,
+            lambda: _run_with_session(known_urls.rebuild),
+            name="known-urls-rebuild",
+        )
+        scheduler.every(
+            settings.VISIT_STREAM_RESYNC_SECONDS,
+            lambda: _run_with_session(known_urls.resync),
+            name="known-urls-resync",
+        )
+    if settings.HOT_STORE_ENABLED:
+        scheduler.every(
+            settings.HOT_STORE_MAINTENANCE_SECONDS,
+            hot_store.maintain,
+            name="hot-store-maintenance",
+        )
+        scheduler.every(
+            settings.VISIT_STREAM_RESYNC_SECONDS,
+            lambda: _run_with_session(hot_store.resync),
+            name="hot-store-resync",
+        )
+    if settings.RETENTION_ENABLED:
+        scheduler.every(
+            settings.RETENTION_INTERVAL_SECONDS,
+            lambda: _run_with_session(retention.roll_up_all),
+            name="retention-rollup",
+        )
+    if settings.ARCHIVE_ENABLED:
+        scheduler.every(
+            settings.ARCHIVE_COMPACT_SECONDS,
+            archive.compact_segments,
+            name="archive-compact",
+        )
+
+    timer.report(settings.STARTUP_BUDGET_SECONDS)
+    app.state.startup = timer
+    app.state.ready = True
     logger.info("Application started successfully\n")
     yield
 
     # Shutdown
+    app.state.ready = False
     logger.info("Shutting down...")
+    await scheduler.shutdown()
+    _run_with_session(heavy_hitters.tracker.checkpoint)
+    visit_stream.stop_bridge()
+    close_recorder()
+    profiling.close_aggregates()
+    shutdown_logger()
 
 
 # Create FastAPI app
@@ -51,10 +157,19 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler) # type: ignore This is a known issue with SlowAPI's type annotations not perfectly matching FastAPI's exception handler signature.
 
+app.add_exception_handler(OperationalError, database_error_handler)  # type: ignore Same signature mismatch as above
+
 # Add middleware (execute in reverse order of registration)
 app.add_middleware(DatabaseMiddleware)
+app.add_middleware(AdmissionMiddleware)  # Shed load before a DB session is opened
 app.add_middleware(RequestValidationMiddleware)
 app.add_middleware(RateLimitMiddleware)  # Rate limiting applied globally
+app.add_middleware(TrafficCaptureMiddleware)  # Sees rate-limited and shed requests with their real status
+if profiling.enabled():
+    app.add_middleware(ProfilingMiddleware)  # Not installed at all unless configured
+if memory.enabled():
+    app.add_middleware(MemoryMiddleware)  # Likewise; outside profiling, so profiles do not include it
+app.add_middleware(RequestIdMiddleware)  # Outermost of ours so every log line carries the id
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -64,9 +179,13 @@ app.add_middleware(
 )
 
 # Import routers AFTER app creation to avoid circular imports
-from app.routers import db_router, health_router
+from app.routers import db_router, debug_router, health_router, search_router, stream_router, top_router
 
 # Include routers
 app.include_router(health_router)
+app.include_router(stream_router)
+app.include_router(top_router)
+app.include_router(search_router)
 app.include_router(db_router)
+app.include_router(debug_router)
 
@@ -1,5 +1,10 @@
+from .admission import AdmissionMiddleware, database_error_handler
 from .database import DatabaseMiddleware
+from .memory import MemoryMiddleware
+from .profiling import ProfilingMiddleware
 from .rate_limit import limiter, get_rate_limiter, RateLimitMiddleware
+from .request_id import RequestIdMiddleware
 from .request_validation import RequestValidationMiddleware
+from .traffic_capture import TrafficCaptureMiddleware
 
-__all__ = ["DatabaseMiddleware", "limiter", "get_rate_limiter", "RateLimitMiddleware", "RequestValidationMiddleware"]
+__all__ = ["AdmissionMiddleware", "database_error_handler", "DatabaseMiddleware", "limiter", "MemoryMiddleware", "get_rate_limiter", "ProfilingMiddleware", "RateLimitMiddleware", "RequestIdMiddleware", "RequestValidationMiddleware", "TrafficCaptureMiddleware"]
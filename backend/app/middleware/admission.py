@@ -0,0 +1,125 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict
+
+from fastapi import Request
+from sqlalchemy.exc import OperationalError
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.config.logger import get_logger
+from app.config.settings import settings
+
+logger = get_logger(__name__)
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Probes must answer while the app is saturated; streams are long-lived and hold no DB connection
+EXEMPT_PATHS = frozenset({"/", "/health", "/ready", "/visits/stream", "/docs", "/redoc", "/openapi.json"})
+QUERY_CANCELED = "57014"  # Postgres SQLSTATE raised when statement_timeout fires
+
+
+class AdmissionBudget:
+    """
+    Concurrency limit with a bounded FIFO wait queue.
+
+    Requests beyond `limit` wait up to `timeout` seconds in a queue of at most
+    `max_queue`; beyond that they are rejected immediately. Only touched from
+    the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot over by resolving the future
+            await asyncio.wait_for(waiter, self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away; give back a slot that was handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting, "rejected": self.rejected}
+
+
+read_budget = AdmissionBudget(
+    "read", settings.ADMISSION_READ_LIMIT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+write_budget = AdmissionBudget(
+    "write", settings.ADMISSION_WRITE_LIMIT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+
+
+def _overloaded(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": detail},
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+class AdmissionMiddleware(BaseHTTPMiddleware):
+    """
+    Shed load with a fast 503 instead of queueing on the DB pool.
+
+    Reads and writes have separate budgets so a burst of one cannot starve
+    the other.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        if not settings.ADMISSION_ENABLED or request.url.path in EXEMPT_PATHS:
+            return await call_next(request)
+
+        budget = read_budget if request.method in READ_METHODS else write_budget
+        if not await budget.acquire():
+            logger.debug(f"Rejected {request.method} {request.url.path}: {budget.name} budget exhausted")
+            return _overloaded("Server is busy, retry later")
+        try:
+            return await call_next(request)
+        finally:
+            budget.release()
+
+
+async def database_error_handler(request: Request, exc: OperationalError) -> JSONResponse:
+    """Turn statement_timeout cancellations into a retryable 503."""
+    if getattr(exc.orig, "pgcode", None) == QUERY_CANCELED:
+        logger.warning(f"Statement timeout on {request.method} {request.url.path}")
+        return _overloaded("Query took too long, retry later")
+    logger.error(f"Database error on {request.method} {request.url.path}: {exc}")
+    return JSONResponse(status_code=500, content={"detail": "Database error"})
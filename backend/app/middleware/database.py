@@ -3,15 +3,18 @@ from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
-from app.config.db import SessionLocal
+from app.config.db import SessionLocal, statement_timeout_for
+from app.services import sharding
 
 
 class DatabaseMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next) -> Response:
         db = SessionLocal()
+        db.info["statement_timeout_ms"] = statement_timeout_for(request.url.path)
         request.state.db = db
         try:
             response = await call_next(request)
         finally:
+            sharding.close_sessions(db)
             db.close()
         return response
@@ -0,0 +1,53 @@
+"""
+Per-route allocation sampling (MEMORY_SAMPLE_RATE).
+
+That fraction of requests is measured: the interpreter's allocated blocks
+(and traced bytes, while tracemalloc runs) before the request and once its
+response has started, summed per route and reported by GET /debug/memory.
+See app.utils.memory for how to read the numbers. The middleware is only
+installed when sampling is on.
+"""
+from __future__ import annotations
+
+import random
+import sys
+import tracemalloc
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.config.settings import settings
+from app.utils.memory import RouteAllocations, Snapshots
+
+# Streams stay open for minutes and buffer events by design; the admin
+# endpoints' own snapshots would swamp the numbers they report
+EXEMPT_PREFIXES = ("/visits/stream", "/debug/")
+
+route_allocations = RouteAllocations()
+snapshots = Snapshots()  # Shared with the admin endpoints, which start and stop tracing
+
+
+def enabled() -> bool:
+    return settings.MEMORY_SAMPLE_RATE > 0
+
+
+def _root(request: Request) -> str:
+    # The route template keeps /domains/{domain}/... in one entry whatever the domain
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+class MemoryMiddleware(BaseHTTPMiddleware):
+    """Attribute what sampled requests leave allocated to their route."""
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        if request.url.path.startswith(EXEMPT_PREFIXES) or random.random() >= settings.MEMORY_SAMPLE_RATE:
+            return await call_next(request)
+        tracing = tracemalloc.is_tracing()
+        blocks = sys.getallocatedblocks()
+        traced = tracemalloc.get_traced_memory()[0] if tracing else 0
+        response = await call_next(request)
+        retained = tracemalloc.get_traced_memory()[0] - traced if tracing and tracemalloc.is_tracing() else None
+        route_allocations.add(_root(request), sys.getallocatedblocks() - blocks, retained)
+        return response
@@ -0,0 +1,173 @@
+"""
+On-demand CPU profiling of requests (PROFILING_TOKEN, PROFILING_SAMPLE_RATE).
+
+A request carrying `X-Profile: <PROFILING_TOKEN>` is profiled on its own:
+its stacks are sampled every PROFILING_INTERVAL_MS through the middleware,
+route and services, and written to PROFILING_DIR as collapsed stacks, named
+in the response's X-Profile-File header. Requests with a missing or wrong
+token are served normally, with no sign that profiling exists.
+
+With PROFILING_SAMPLE_RATE > 0, that fraction of all requests is profiled
+into rolling aggregate files, one per PROFILING_AGGREGATE_SECONDS window and
+worker, with each route as a root frame; only the newest
+PROFILING_AGGREGATE_KEEP are kept. Render either kind with flamegraph.pl or
+https://www.speedscope.app.
+
+The middleware is only installed when one of the two is configured, so
+profiling costs nothing otherwise. See app.utils.profiling for how the
+sampler attributes threads to a request.
+"""
+from __future__ import annotations
+
+import hmac
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.config.logger import get_logger, request_id_var
+from app.config.settings import settings
+from app.utils.profiling import Profile, StackSampler, active_profile, write_collapsed
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+# Streams stay open for minutes; a profile of one says nothing about per-request cost
+EXEMPT_PATHS = frozenset({"/visits/stream"})
+AGGREGATE_PREFIX = "aggregate-"
+_UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+sampler = StackSampler(settings.PROFILING_INTERVAL_MS / 1000)
+
+
+def enabled() -> bool:
+    return bool(settings.PROFILING_TOKEN) or settings.PROFILING_SAMPLE_RATE > 0
+
+
+class AggregateProfiles:
+    """The current window's shared stack counts, written out when the window ends."""
+
+    def __init__(self, directory: str, window_seconds: float, keep: int):
+        self.directory = Path(directory)
+        self.window_seconds = window_seconds
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._started = time.time()
+
+    def add(self, root: str, profile: Profile) -> None:
+        """Fold one sampled request's stacks into the current window under `root`."""
+        self.rotate()
+        with self._lock:
+            for stack, count in profile.stacks.items():
+                self._stacks[f"{root};{stack}"] += count
+
+    def rotate(self, force: bool = False) -> Optional[Path]:
+        """Write out the current window if it has ended (or `force`); returns the file written."""
+        with self._lock:
+            if not force and time.time() - self._started < self.window_seconds:
+                return None
+            stacks, started = self._stacks, self._started
+            self._stacks, self._started = Counter(), time.time()
+        if not stacks:
+            return None
+        stamp = datetime.fromtimestamp(started, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = self.directory / f"{AGGREGATE_PREFIX}{stamp}-{os.getpid()}.collapsed"
+        write_collapsed(path, stacks)
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        if self.keep <= 0:
+            return
+        # Names sort by window start, across all workers sharing the directory
+        old = sorted(self.directory.glob(f"{AGGREGATE_PREFIX}*.collapsed"))[: -self.keep]
+        for path in old:
+            path.unlink(missing_ok=True)
+
+
+_aggregates: Optional[AggregateProfiles] = None
+_aggregates_lock = threading.Lock()
+
+
+def get_aggregates() -> AggregateProfiles:
+    global _aggregates
+    with _aggregates_lock:
+        if _aggregates is None:
+            _aggregates = AggregateProfiles(
+                settings.PROFILING_DIR, settings.PROFILING_AGGREGATE_SECONDS, settings.PROFILING_AGGREGATE_KEEP
+            )
+        return _aggregates
+
+
+def close_aggregates() -> None:
+    """Write out the partial aggregate window, if any requests were sampled."""
+    global _aggregates
+    with _aggregates_lock:
+        if _aggregates is not None:
+            _aggregates.rotate(force=True)
+            _aggregates = None
+
+
+def _authorized(request: Request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    return bool(token and settings.PROFILING_TOKEN) and hmac.compare_digest(
+        token.encode("utf-8"), settings.PROFILING_TOKEN.encode("utf-8")
+    )
+
+
+def _root(request: Request) -> str:
+    # The route template keeps /domains/{domain}/... in one frame whatever the domain
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+def _request_file(request: Request) -> Path:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = _UNSAFE_NAME_CHARS.sub("_", request.url.path.strip("/")) or "root"
+    request_id = request_id_var.get() or "-"
+    return Path(settings.PROFILING_DIR) / f"{stamp}-{request.method}-{path}-{request_id}.collapsed"
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """Profile admin-flagged requests and a sample of all traffic; see module docstring."""
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        if request.url.path in EXEMPT_PATHS:
+            return await call_next(request)
+        if _authorized(request):
+            profile = Profile()
+            response = await self._profiled(request, call_next, profile)
+            path = _request_file(request)
+            await run_in_threadpool(write_collapsed, path, profile.stacks, _root(request))
+            logger.info(f"Wrote profile of {profile.samples} samples to {path}")
+            response.headers[PROFILE_FILE_HEADER] = path.name
+            return response
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            profile = Profile()
+            response = await self._profiled(request, call_next, profile)
+            # Adding may write out the ended window
+            await run_in_threadpool(get_aggregates().add, _root(request), profile)
+            return response
+        return await call_next(request)
+
+    async def _profiled(self, request: Request, call_next, profile: Profile) -> Response:
+        profile.threads.add(threading.get_ident())
+        token = active_profile.set(profile)
+        sampler.start(profile)
+        try:
+            return await call_next(request)
+        finally:
+            sampler.stop(profile)
+            active_profile.reset(token)
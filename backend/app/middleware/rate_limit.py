@@ -18,26 +18,27 @@ def get_rate_limiter():
     return limiter
 
 
+# Decorated once: each `limiter.limit` call registers another limit under the
+# function's name, and every registered limit is hit on each check
+@limiter.limit(READ_RATE_LIMIT)
+async def _check_read_limit(request: Request):
+    pass
+
+
+@limiter.limit(WRITE_RATE_LIMIT)
+async def _check_write_limit(request: Request):
+    pass
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """Middleware to apply rate limits based on HTTP method."""
     
     async def dispatch(self, request: Request, call_next):
-        # Apply different rate limits based on HTTP method
+        # Apply different rate limits based on HTTP method; raises RateLimitExceeded
         if request.method in ["GET", "HEAD", "OPTIONS"]:
-            rate_limit = READ_RATE_LIMIT
+            await _check_read_limit(request)
         else:  # POST, PUT, DELETE, PATCH
-            rate_limit = WRITE_RATE_LIMIT
-        
-        # Apply rate limit by checking directly
-        try:
-            # Create a dummy function that takes request as parameter (must be named 'request')
-            @limiter.limit(rate_limit)
-            async def _check_rate_limit(request: Request):
-                pass
-            
-            await _check_rate_limit(request)
-        except RateLimitExceeded:
-            raise
+            await _check_write_limit(request)
         
         response = await call_next(request)
         return response
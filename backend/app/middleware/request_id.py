@@ -0,0 +1,31 @@
+import re
+import uuid
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.config.logger import request_id_var
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Accept client-supplied ids only if they are short and log-safe
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+class RequestIdMiddleware(BaseHTTPMiddleware):
+    """
+    Assign every request an id, exposed to log records and the response.
+
+    Reuses a well-formed incoming X-Request-ID so ids can be traced across services.
+    """
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        try:
+            response = await call_next(request)
+        finally:
+            request_id_var.reset(token)
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
@@ -0,0 +1,231 @@
+"""
+Sampled request capture for load replays (TRAFFIC_CAPTURE_ENABLED).
+
+A TRAFFIC_CAPTURE_SAMPLE_RATE fraction of requests is appended to
+TRAFFIC_CAPTURE_FILE as one JSON object per line: arrival time, method,
+path, matched route, query string, JSON body, status and duration. Lines are
+written by a background thread through a bounded queue and dropped (counted)
+if it falls behind, so capture never slows requests down.
+
+With TRAFFIC_CAPTURE_ANONYMIZE, visited URLs, domains and search text are
+replaced by keyed hashes that keep the load's shape: the same URL always maps
+to the same pseudonym within a capture, and hosts keep their registrable
+domain, so domain reads still match the hosts recorded under them. The hash
+key is TRAFFIC_CAPTURE_SALT or, if that is empty, a random key the first
+worker writes to TRAFFIC_CAPTURE_FILE + ".key" and the others read, so every
+worker appending to the file uses the same one. Keep the key with the server:
+anyone holding it can test guessed URLs against the pseudonyms.
+
+Replay a capture with ./scripts/replay-traffic.sh.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.config.logger import BackgroundSink, get_logger, request_id_var
+from app.config.settings import settings
+from app.utils.urls import split_host
+
+logger = get_logger(__name__)
+
+# Probes say nothing about load; streams are long-lived and have no meaningful duration
+EXEMPT_PATHS = frozenset({"/health", "/ready", "/visits/stream", "/docs", "/redoc", "/openapi.json"})
+MAX_BODY_BYTES = 64 * 1024  # Larger bodies are recorded as omitted
+URL_FIELDS = ("url",)  # Query parameters and body fields holding a visited URL
+TEXT_FIELDS = ("q",)  # Query parameters holding free text
+DOMAIN_PREFIX = "/domains/"
+
+
+class Anonymizer:
+    """Keyed, stable pseudonyms for URLs, domains and search text."""
+
+    def __init__(self, key: bytes):
+        self._key = key
+
+    def _token(self, value: str) -> str:
+        return hmac.new(self._key, value.encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+    def host(self, host: str, domain: str) -> str:
+        pseudo_domain = f"d{self._token(domain)}.test"
+        return pseudo_domain if host == domain else f"h{self._token(host)}.{pseudo_domain}"
+
+    def domain(self, name: str) -> str:
+        try:
+            host, domain = split_host(f"https://{name}/")
+        except ValueError:
+            return f"d{self._token(name)}.test"
+        return self.host(host, domain)
+
+    def url(self, url: str) -> str:
+        try:
+            parts = urlsplit(url)
+            host, domain = split_host(url)
+        except ValueError:
+            return f"https://u{self._token(url)}.test/"
+        rest = parts.path + (f"?{parts.query}" if parts.query else "")
+        path = f"/{self._token(rest)}" if rest not in ("", "/") else "/"
+        return urlunsplit((parts.scheme or "https", self.host(host, domain), path, "", ""))
+
+    def text(self, value: str) -> str:
+        return f"q{self._token(value)}"
+
+    def query(self, query: str) -> str:
+        pairs = []
+        for name, value in parse_qsl(query, keep_blank_values=True):
+            if name in URL_FIELDS:
+                value = self.url(value)
+            elif name in TEXT_FIELDS:
+                value = self.text(value)
+            pairs.append((name, value))
+        return urlencode(pairs)
+
+    def path(self, path: str) -> str:
+        if not path.startswith(DOMAIN_PREFIX):
+            return path
+        name, slash, rest = path[len(DOMAIN_PREFIX):].partition("/")
+        return f"{DOMAIN_PREFIX}{self.domain(name)}{slash}{rest}"
+
+    def body(self, body):
+        if isinstance(body, dict):
+            return {
+                name: self.url(value) if name in URL_FIELDS and isinstance(value, str) else value
+                for name, value in body.items()
+            }
+        return body
+
+
+class TrafficRecorder:
+    """Appends capture records to a JSONL file from a background thread."""
+
+    def __init__(self, path: str, anonymizer: Optional[Anonymizer], queue_size: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.anonymizer = anonymizer
+        self._file = self.path.open("a", encoding="utf-8")
+        self._sink = BackgroundSink(self._write, maxsize=queue_size, name="traffic", report_drops=False)
+
+    @property
+    def dropped(self) -> int:
+        return self._sink.dropped
+
+    def _write(self, line: str) -> None:
+        self._file.write(line)
+        self._file.flush()
+
+    def record(self, entry: dict) -> None:
+        if self.anonymizer is not None:
+            entry["path"] = self.anonymizer.path(entry["path"])
+            entry["query"] = self.anonymizer.query(entry["query"])
+            entry["body"] = self.anonymizer.body(entry["body"])
+        self._sink(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+
+    def close(self) -> None:
+        self._sink.stop()
+        self._file.close()
+        if self.dropped:
+            logger.warning(f"Traffic capture dropped {self.dropped} records: queue full")
+
+
+def _capture_key(capture_file: str) -> bytes:
+    """TRAFFIC_CAPTURE_SALT, or the random key kept beside `capture_file`, created if missing."""
+    if settings.TRAFFIC_CAPTURE_SALT:
+        return settings.TRAFFIC_CAPTURE_SALT.encode("utf-8")
+    path = Path(f"{capture_file}.key")
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp, path)  # Never replaces a key another worker linked first
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+    return bytes.fromhex(path.read_text().strip())
+
+
+_recorder: Optional[TrafficRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> TrafficRecorder:
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            anonymizer = None
+            if settings.TRAFFIC_CAPTURE_ANONYMIZE:
+                anonymizer = Anonymizer(_capture_key(settings.TRAFFIC_CAPTURE_FILE))
+            _recorder = TrafficRecorder(settings.TRAFFIC_CAPTURE_FILE, anonymizer, settings.LOG_QUEUE_SIZE)
+            logger.info(f"Capturing {settings.TRAFFIC_CAPTURE_SAMPLE_RATE:.0%} of requests to {_recorder.path}")
+        return _recorder
+
+
+def close_recorder() -> None:
+    """Flush and close the capture file, if one was opened."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is not None:
+            _recorder.close()
+            _recorder = None
+
+
+async def _json_body(request: Request):
+    if "json" not in request.headers.get("content-type", ""):
+        return None
+    body = await request.body()
+    if len(body) > MAX_BODY_BYTES:
+        return {"_omitted_bytes": len(body)}
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+class TrafficCaptureMiddleware(BaseHTTPMiddleware):
+    """Record a sample of requests for later replay; see module docstring."""
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        if (
+            not settings.TRAFFIC_CAPTURE_ENABLED
+            or request.url.path in EXEMPT_PATHS
+            or random.random() >= settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+        ):
+            return await call_next(request)
+
+        arrived = time.time()
+        started = time.perf_counter()
+        body = await _json_body(request)
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            get_recorder().record({
+                "ts": round(arrived, 6),
+                "method": request.method,
+                "path": request.url.path,
+                "route": getattr(route, "path", None),
+                "query": request.url.query,
+                "body": body,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "request_id": request_id_var.get(),
+            })
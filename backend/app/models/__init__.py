@@ -1,3 +1,6 @@
+from .heavy_hitters import HeavyHitterSummary
+from .page_metric_daily import PageMetricDaily
 from .page_metrics import PageMetric
+from .page_visit_repeat import PageVisitRepeat
 
-__all__ = ["PageMetric"]
\ No newline at end of file
+__all__ = ["HeavyHitterSummary", "PageMetric", "PageMetricDaily", "PageVisitRepeat"]
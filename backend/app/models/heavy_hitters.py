@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Date, DateTime, Integer, JSON, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.config.db import Base
+
+
+class HeavyHitterSummary(Base):
+    """Checkpointed Space-Saving counters for one UTC day and kind (domain/url)."""
+    __tablename__ = "heavy_hitter_summaries"
+    __table_args__ = (UniqueConstraint("day", "kind", name="uq_heavy_hitter_summaries_day_kind"),)
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    kind = Column(String(16), nullable=False)
+    counters = Column(JSON, nullable=False, default=dict)
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Date, DateTime, Index, Integer, String, UniqueConstraint
+
+from app.config.db import Base
+
+
+class PageMetricDaily(Base):
+    """
+    Per-URL, per-UTC-day rollup of raw visits removed by the retention job.
+
+    Sums are stored instead of averages so rollups of the same day can be
+    merged exactly; the `last_*` columns keep the latest visit's metrics so
+    /metrics still has something to show once all raw rows are gone.
+    """
+    __tablename__ = "page_metric_daily"
+    __table_args__ = (
+        UniqueConstraint("url", "day", name="uq_page_metric_daily_url_day"),
+        Index("ix_page_metric_daily_host_day", "host", "day"),
+        Index("ix_page_metric_daily_domain_day", "domain", "day"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
+    host = Column(String, nullable=True)
+    domain = Column(String, nullable=True)
+    day = Column(Date, nullable=False)
+    visit_count = Column(Integer, nullable=False)
+    link_count_min = Column(Integer, nullable=False)
+    link_count_max = Column(Integer, nullable=False)
+    link_count_sum = Column(Integer, nullable=False)
+    word_count_min = Column(Integer, nullable=False)
+    word_count_max = Column(Integer, nullable=False)
+    word_count_sum = Column(Integer, nullable=False)
+    image_count_min = Column(Integer, nullable=False)
+    image_count_max = Column(Integer, nullable=False)
+    image_count_sum = Column(Integer, nullable=False)
+    last_visited = Column(DateTime(timezone=True), nullable=False)
+    last_link_count = Column(Integer, nullable=False)
+    last_word_count = Column(Integer, nullable=False)
+    last_image_count = Column(Integer, nullable=False)
+
+    @property
+    def link_count_avg(self) -> float:
+        return self.link_count_sum / self.visit_count
+
+    @property
+    def word_count_avg(self) -> float:
+        return self.word_count_sum / self.visit_count
+
+    @property
+    def image_count_avg(self) -> float:
+        return self.image_count_sum / self.visit_count
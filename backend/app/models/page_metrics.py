@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Index, Integer, String, DateTime
 from sqlalchemy.sql import func
 
 from app.config.db import Base
@@ -6,8 +6,24 @@ from app.config.db import Base
 
 class PageMetric(Base):
     __tablename__ = "page_metrics"
-    id = Column(Integer, primary_key=True, index=True)
-    url = Column(String, index=True, nullable=False)
+    __table_args__ = (
+        # Serves the per-URL reads; on Postgres the included columns make them index-only scans
+        Index(
+            "ix_page_metrics_url_datetime_covering",
+            "url",
+            "datetime_visited",
+            postgresql_include=["id", "link_count", "word_count", "image_count"],
+        ),
+        Index("ix_page_metrics_host_datetime", "host", "datetime_visited"),
+        Index("ix_page_metrics_domain_datetime", "domain", "datetime_visited"),
+        # Client-supplied Idempotency-Key; unique so retries can never double-insert
+        Index("ix_page_metrics_idempotency_key", "idempotency_key", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
+    # Derived from url at write time so domain queries avoid LIKE scans
+    host = Column(String, nullable=True)
+    domain = Column(String, nullable=True)  # Registrable domain, e.g. example.co.uk
     datetime_visited = Column(
         DateTime(timezone=True),
         nullable=False,
@@ -16,3 +32,4 @@ class PageMetric(Base):
     link_count = Column(Integer, nullable=False)
     word_count = Column(Integer, nullable=False)
     image_count = Column(Integer, nullable=False)
+    idempotency_key = Column(String(255), nullable=True)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer
+
+from app.config.db import Base
+
+
+class PageVisitRepeat(Base):
+    """
+    A visit whose metrics were identical to an already stored visit.
+
+    Written instead of a full `page_metrics` row when VISIT_DEDUP_ENABLED is
+    set; reads expand it back into a visit with the referenced row's url and
+    counts. Reported with a negative id so ids stay unique across both tables.
+    """
+    __tablename__ = "page_visit_repeats"
+    __table_args__ = (
+        Index("ix_page_visit_repeats_visit_datetime", "visit_id", "datetime_visited"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    visit_id = Column(Integer, ForeignKey("page_metrics.id"), nullable=False)
+    datetime_visited = Column(DateTime(timezone=True), nullable=False)
@@ -1,5 +1,9 @@
 from .db import db_router
+from .debug import debug_router
 from .health import health_router
+from .search import search_router
+from .stream import stream_router
+from .top import top_router
 
-__all__ = ["db_router", "health_router"]
+__all__ = ["db_router", "debug_router", "health_router", "search_router", "stream_router", "top_router"]
 
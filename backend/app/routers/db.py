@@ -1,18 +1,23 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Optional, List
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from app.config import get_db
 from app.constants import TAG_HISTORY
 from app.exceptions import URLNotVisitedException
 from app.schemas import page_metric as schemas
-from app.services import page_metrics
+from app.schemas import stats as stats_schemas
+from app.services import idempotency, page_metrics, stats
+from app.utils.profiling import ProfiledRoute
 
 
 db_router = APIRouter(
     prefix="",
+    route_class=ProfiledRoute,
     tags=[TAG_HISTORY],
     dependencies=[Depends(get_db)],
 )
@@ -22,12 +27,47 @@ def get_metrics(
     request: Request,
     url: str,
     tz_offset: Optional[float] = None,
+    fields: Optional[str] = None,
 ) -> schemas.PageMetrics | None:
+    """
+    Get the latest metrics and visit count for a URL.
+
+    Args:
+        url: The URL to get metrics for
+        tz_offset: Timezone offset in hours for datetime formatting
+        fields: Comma-separated fields to return (e.g. visit_count,last_visited); default all
+    """
+    selected = page_metrics.parse_fields(fields, schemas.METRICS_FIELDS)
     db: Session = request.state.db
-    metrics = page_metrics.get_latest_metrics_for_url(db, url=url, tz_offset_hours=tz_offset)
+    metrics = page_metrics.get_latest_metrics_for_url(
+        db, url=url, tz_offset_hours=tz_offset, fields=selected
+    )
+    if selected is not None:
+        return JSONResponse(metrics)  # A partial object; skips response_model validation
     return metrics
 
 
+@db_router.get("/metrics/stats", response_model=stats_schemas.PageMetricStats)
+def get_metric_stats(
+    request: Request,
+    url: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    tz_offset: Optional[float] = None,
+) -> stats_schemas.PageMetricStats:
+    """
+    Get min, max, mean, stddev and p50/p90/p99 of link, word and image counts.
+
+    Args:
+        url: The URL to summarize
+        start: Include visits at or after this time (ISO 8601, UTC if no offset)
+        end: Include visits before this time (ISO 8601, UTC if no offset)
+        tz_offset: Timezone offset in hours for datetime formatting
+    """
+    db: Session = request.state.db
+    return stats.get_metric_stats(db, url=url, start=start, end=end, tz_offset_hours=tz_offset)
+
+
 @db_router.get("/visits", response_model=List[schemas.PageMetric])
 def list_visits(
     request: Request,
@@ -35,6 +75,7 @@ def list_visits(
     limit: int = 50,
     offset: int = 0,
     tz_offset: Optional[float] = None,
+    fields: Optional[str] = None,
 ) -> List[schemas.PageMetric]:
     """
     Get paginated list of visits for a URL.
@@ -44,6 +85,7 @@ def list_visits(
         limit: Maximum number of results to return (default: 50, max: 100)
         offset: Number of results to skip for pagination (default: 0)
         tz_offset: Timezone offset in hours for datetime formatting
+        fields: Comma-separated fields to return per visit (e.g. id,datetime_visited); default all
     """
     # Validate pagination parameters
     if limit < 1 or limit > 100:
@@ -51,18 +93,112 @@ def list_visits(
     if offset < 0:
         raise ValueError("Offset must be non-negative")
     
+    selected = page_metrics.parse_fields(fields, schemas.VISIT_FIELDS)
     db: Session = request.state.db
     visits = page_metrics.get_visits_for_url(
-        db, url=url, limit=limit, offset=offset, tz_offset_hours=tz_offset
+        db, url=url, limit=limit, offset=offset, tz_offset_hours=tz_offset, fields=selected
     )
+    if selected is not None:
+        return JSONResponse(visits)  # Partial objects; skips response_model validation
     return visits
 
 
+@db_router.get("/visits/changes", response_model=schemas.VisitChanges)
+def list_visit_changes(
+    request: Request,
+    since: int = 0,
+    limit: int = 500,
+    tz_offset: Optional[float] = None,
+    since_repeat: int = 0,
+) -> schemas.VisitChanges:
+    """
+    Get visits recorded after a cursor, across all URLs, oldest first.
+
+    Start with since=0 and pass each response's `next_cursor` as `since`
+    (and `next_repeat_cursor` as `since_repeat`) to sync incrementally;
+    `has_more` says whether to fetch again right away.
+
+    Args:
+        since: Cursor from a previous response (default: 0, from the beginning)
+        limit: Maximum number of changes to return (default: 500, max: 1000)
+        tz_offset: Timezone offset in hours for datetime formatting
+        since_repeat: Repeat cursor from a previous response (default: 0)
+    """
+    if limit < 1 or limit > 1000:
+        raise ValueError("Limit must be between 1 and 1000")
+
+    db: Session = request.state.db
+    return page_metrics.get_visit_changes(
+        db, since=since, limit=limit, tz_offset_hours=tz_offset, since_repeat=since_repeat
+    )
+
+
+@db_router.get("/domains/{domain}/metrics", response_model=schemas.DomainMetrics | None)
+def get_domain_metrics(
+    request: Request,
+    domain: str,
+    tz_offset: Optional[float] = None,
+) -> schemas.DomainMetrics | None:
+    """
+    Get visit count and latest visit across a domain.
+
+    A registrable domain (example.com) includes its subdomains; a subdomain
+    (blog.example.com) matches only that host.
+    """
+    db: Session = request.state.db
+    return page_metrics.get_latest_metrics_for_domain(db, name=domain, tz_offset_hours=tz_offset)
+
+
+@db_router.get("/domains/{domain}/visits", response_model=List[schemas.PageMetric])
+def list_domain_visits(
+    request: Request,
+    domain: str,
+    limit: int = 50,
+    offset: int = 0,
+    tz_offset: Optional[float] = None,
+) -> List[schemas.PageMetric]:
+    """
+    Get paginated list of visits across a domain, newest first.
+
+    Args:
+        domain: Registrable domain (includes subdomains) or exact host
+        limit: Maximum number of results to return (default: 50, max: 100)
+        offset: Number of results to skip for pagination (default: 0)
+        tz_offset: Timezone offset in hours for datetime formatting
+    """
+    if limit < 1 or limit > 100:
+        raise ValueError("Limit must be between 1 and 100")
+    if offset < 0:
+        raise ValueError("Offset must be non-negative")
+
+    db: Session = request.state.db
+    return page_metrics.get_visits_for_domain(
+        db, name=domain, limit=limit, offset=offset, tz_offset_hours=tz_offset
+    )
+
+
 @db_router.post("/visits", response_model=schemas.PageMetric)
 def create_visit(
     request: Request,
     visit_in: schemas.PageMetricCreateDTO,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> schemas.PageMetric:
+    """
+    Record a page visit.
+
+    Clients may send an `Idempotency-Key` header; retries carrying the same key
+    get the original response back without inserting another row.
+    """
     db: Session = request.state.db
-    visit = page_metrics.create_page_visit(db, visit_in)
+    if idempotency_key is None:
+        return page_metrics.create_page_visit(db, visit_in)
+
+    key = idempotency.validate_key(idempotency_key)
+    request_fingerprint = idempotency.fingerprint(visit_in.model_dump_json())
+    cached = idempotency.lookup(key, request_fingerprint)
+    if cached is not None:
+        return schemas.PageMetric.model_validate(cached)
+
+    visit = page_metrics.create_page_visit(db, visit_in, idempotency_key=key)
+    idempotency.remember(key, request_fingerprint, visit.model_dump())
     return visit
@@ -19,17 +19,6 @@ db_router = APIRouter(
 )
 
 
-def normalize_url_in_dict(data):
-    """Recursively normalize URLs in dict/list by removing trailing slash."""
-    if isinstance(data, dict):
-        if 'url' in data and isinstance(data['url'], str):
-            data['url'] = data['url'].rstrip('/') or '/'
-        return data
-    elif isinstance(data, list):
-        return [normalize_url_in_dict(item) for item in data]
-    return data
-
-
 @db_router.get("/metrics")
 def get_metrics(request: Request, url: str, tz_offset: Optional[float] = None):
     db: Session = request.state.db
@@ -37,7 +26,6 @@ def get_metrics(request: Request, url: str, tz_offset: Optional[float] = None):
     if metrics is None:
         raise HTTPException(status_code=404, detail="No visits recorded for this URL")
     result = metrics.model_dump()
-    result = normalize_url_in_dict(result)
     return JSONResponse(result)
 
 
@@ -47,8 +35,8 @@ def list_visits(request: Request, url: str, limit: int = 50, tz_offset: Optional
     visits = page_metric_services.get_visits_for_url(db, url=url, limit=limit, tz_offset_hours=tz_offset)
     if not visits:
         raise HTTPException(status_code=404, detail="No visits recorded for this URL")
+    # URLs come back from the service already canonical
     results = [v.model_dump() for v in visits]
-    results = normalize_url_in_dict(results)
     return JSONResponse(results)
 
 
@@ -57,5 +45,4 @@ def create_visit(request: Request, visit_in: schemas.PageMetricCreateDTO):
     db: Session = request.state.db
     visit = page_metric_services.create_page_visit(db, visit_in)
     result = visit.model_dump()
-    result = normalize_url_in_dict(result)
     return JSONResponse(result)
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Admin memory diagnostics (MEMORY_DIAGNOSTICS_TOKEN).
+
+Every endpoint here needs `X-Admin-Token: <MEMORY_DIAGNOSTICS_TOKEN>` and
+answers 404 without it, or when no token is configured. Each worker answers
+for itself.
+"""
+from __future__ import annotations
+
+import hmac
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, Request
+
+from app.config.db import engine
+from app.config.logger import log_queue_stats
+from app.config.settings import settings
+from app.constants import TAG_ADMIN
+from app.exceptions import AdminNotAuthorizedException
+from app.middleware import memory
+from app.middleware.rate_limit import limiter
+from app.services import dedup, heavy_hitters, hot_store, idempotency, known_urls, search, visit_stream
+from app.utils.memory import process_stats
+from app.utils.profiling import ProfiledRoute
+from app.utils.urls import canonicalize_url, split_host
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def require_admin(request: Request) -> None:
+    token = request.headers.get(ADMIN_TOKEN_HEADER)
+    expected = settings.MEMORY_DIAGNOSTICS_TOKEN
+    if not (token and expected and hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))):
+        raise AdminNotAuthorizedException()
+
+
+debug_router = APIRouter(
+    prefix="/debug",
+    route_class=ProfiledRoute,
+    tags=[TAG_ADMIN],
+    dependencies=[Depends(require_admin)],
+    include_in_schema=False,
+)
+
+
+def _gauges() -> Dict[str, Any]:
+    """Sizes of the worker's in-process structures."""
+    storage = limiter._storage  # slowapi exposes no public view of its counters
+    store = idempotency.get_store()
+    compiled = engine._compiled_cache
+    return {
+        "rate_limit_counters": len(getattr(storage, "storage", ())),
+        "rate_limit_route_limits": sum(len(limits) for limits in limiter._route_limits.values()),
+        "compiled_statements": len(compiled) if compiled is not None else 0,
+        "url_cache": {
+            "canonicalize_url": canonicalize_url.cache_info().currsize,
+            "split_host": split_host.cache_info().currsize,
+        },
+        "dedup_cache": len(dedup.cache),
+        "idempotency_keys": len(store) if isinstance(store, idempotency.InMemoryIdempotencyStore) else None,
+        "heavy_hitters_counters": heavy_hitters.tracker.counters,
+        "known_urls_filter_bytes": known_urls.urls.nbytes,
+        "hot_store_rows": hot_store.store.rows,
+        "hot_store_bytes": hot_store.store.rows * hot_store.ROW_BYTES,
+        "search_index_urls": len(search.index) if search.index is not None else None,
+        "visit_stream_subscribers": visit_stream.hub.subscriber_count(),
+        "log_queues": log_queue_stats(),
+    }
+
+
+@debug_router.get("/memory")
+def memory_report() -> dict:
+    """
+    This worker's memory at a glance.
+
+    Returns:
+        dict: Process RSS, allocated blocks and GC counts; tracemalloc totals
+        while tracing; gauges of in-process structures; and per-route
+        retained allocations when MEMORY_SAMPLE_RATE is on
+    """
+    return {
+        **process_stats(),
+        "tracing": memory.snapshots.status(),
+        "gauges": _gauges(),
+        "routes": memory.route_allocations.snapshot(),
+    }
+
+
+@debug_router.post("/memory/snapshots")
+def take_memory_snapshot(top: int = settings.MEMORY_SNAPSHOT_TOP) -> dict:
+    """
+    Take a tracemalloc snapshot, starting tracing if it is off.
+
+    Args:
+        top: Allocation sites to list (default: MEMORY_SNAPSHOT_TOP, max: 500)
+
+    Returns:
+        dict: The largest allocation sites, and those that grew most since the
+        previous snapshot (null for the first one)
+    """
+    if top < 1 or top > 500:
+        raise ValueError("top must be between 1 and 500")
+    return memory.snapshots.take(top, settings.MEMORY_TRACE_FRAMES)
+
+
+@debug_router.delete("/memory/snapshots")
+def stop_memory_tracing() -> dict:
+    """Stop tracemalloc, which slows every allocation, and drop the kept snapshot."""
+    memory.snapshots.stop()
+    return {"tracing": None}
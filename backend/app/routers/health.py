@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from datetime import datetime
+from app.config.db import statement_cache_stats
+from app.config.settings import settings
+from app.services import sharding, visit_stream
 from app.constants import TAG_HEALTH, APP_VERSION
+from app.middleware.admission import read_budget, write_budget
+from app.utils.profiling import ProfiledRoute
 
 health_router = APIRouter(
     prefix="",
+    route_class=ProfiledRoute,
     tags=[TAG_HEALTH],
 )
 
@@ -15,7 +22,9 @@ def health_check(request: Request) -> dict:
     Enhanced health check endpoint with database connectivity status.
     
     Returns:
-        dict: Health status including timestamp, version, and database connectivity
+        dict: Health status including timestamp, version, database connectivity
+        and compiled statement cache hit rate; answered even when admission
+        budgets are exhausted
     """
     health_status = {
         "status": "ok",
@@ -23,7 +32,9 @@ def health_check(request: Request) -> dict:
         "version": APP_VERSION,
         "checks": {
             "database": "unknown"
-        }
+        },
+        "statement_cache": statement_cache_stats.snapshot(),
+        "admission": {"read": read_budget.snapshot(), "write": write_budget.snapshot()},
     }
     
     # Check database connectivity
@@ -34,10 +45,42 @@ def health_check(request: Request) -> dict:
     except Exception as e:
         health_status["status"] = "degraded"
         health_status["checks"]["database"] = f"unhealthy: {str(e)}"
+
+    if sharding.enabled():
+        for index, shard in enumerate(sharding.all_sessions(db)):
+            try:
+                shard.execute(text("SELECT 1"))
+                health_status["checks"][f"shard_{index}"] = "healthy"
+            except Exception as e:
+                health_status["status"] = "degraded"
+                health_status["checks"][f"shard_{index}"] = f"unhealthy: {str(e)}"
     
     return health_status
 
 
+@health_router.get("/ready")
+def readiness_check(request: Request) -> JSONResponse:
+    """
+    Readiness probe: 200 once startup (pool prefill, cache warm-up) has finished.
+
+    Returns 503 while booting and while shutting down, so load balancers only
+    route to warmed workers. With VISIT_STREAM_PG_BRIDGE on, also reports
+    whether the bridge is listening or reconnecting; reads stay correct
+    meanwhile, but this worker's streams miss other workers' visits.
+    """
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    timer = request.app.state.startup
+    body = {
+        "status": "ready",
+        "startup_ms": round(timer.total * 1000),
+        "phases_ms": {name: round(seconds * 1000) for name, seconds in timer.phases.items()},
+    }
+    if settings.VISIT_STREAM_PG_BRIDGE:
+        body["visit_stream_bridge"] = "listening" if visit_stream.bridge_running() else "reconnecting"
+    return JSONResponse(body)
+
+
 @health_router.get("/")
 def home() -> str:
     return "Welcome to the History Sidepanel API"
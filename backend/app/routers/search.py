@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.orm import Session
+
+from app.config import get_db
+from app.constants import TAG_HISTORY
+from app.schemas import search as schemas
+from app.services import search
+from app.utils.profiling import ProfiledRoute
+
+
+search_router = APIRouter(
+    prefix="",
+    route_class=ProfiledRoute,
+    tags=[TAG_HISTORY],
+    dependencies=[Depends(get_db)],
+)
+
+
+@search_router.get("/search", response_model=List[schemas.SearchResult])
+def search_visits(
+    request: Request,
+    q: str,
+    mode: str = search.MODE_PREFIX,
+    limit: int = 20,
+    tz_offset: Optional[float] = None,
+) -> List[schemas.SearchResult]:
+    """
+    Find visited URLs by prefix or substring.
+
+    Args:
+        q: Text to match; a prefix without a scheme also matches http(s):// and www.
+        mode: "prefix" or "substring" (case-insensitive)
+        limit: Maximum number of results to return (default: 20, max: 100)
+        tz_offset: Timezone offset in hours for datetime formatting
+    """
+    if limit < 1 or limit > 100:
+        raise ValueError("Limit must be between 1 and 100")
+
+    db: Session = request.state.db
+    return search.search_urls(db, q, mode=mode, limit=limit, tz_offset_hours=tz_offset)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.config.settings import settings
+from app.constants import TAG_HISTORY
+from app.schemas import page_metric as schemas
+from app.services import visit_stream
+from app.utils.helpers import format_datetime
+from app.utils.profiling import ProfiledRoute
+from app.utils.urls import canonicalize_url
+
+
+stream_router = APIRouter(
+    prefix="",
+    route_class=ProfiledRoute,
+    tags=[TAG_HISTORY],
+)
+
+
+def _format_event(event: dict, tz_offset: Optional[float]) -> str:
+    visit = schemas.PageMetric.model_validate(
+        {
+            **event,
+            "datetime_visited": format_datetime(event["datetime_visited"], tz_offset),
+        }
+    )
+    return f"event: visit\nid: {visit.id}\ndata: {visit.model_dump_json()}\n\n"
+
+
+@stream_router.get("/visits/stream")
+async def stream_visits(
+    request: Request,
+    url: List[str] = Query(...),
+    tz_offset: Optional[float] = None,
+) -> StreamingResponse:
+    """
+    Server-Sent Events stream of new visits for one or more URLs.
+
+    Args:
+        url: URL to subscribe to (repeat the parameter for several URLs)
+        tz_offset: Timezone offset in hours for datetime formatting
+    """
+    urls = [canonicalize_url(u) for u in url]
+    if tz_offset is not None and not -12 <= tz_offset <= 14:
+        raise ValueError("Timezone offset must be between -12 and +14 hours")
+    heartbeat = settings.VISIT_STREAM_HEARTBEAT_SECONDS
+
+    async def event_stream() -> AsyncIterator[str]:
+        subscription = visit_stream.hub.subscribe(urls)
+        try:
+            yield ": subscribed\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format_event(event, tz_offset)
+        finally:
+            visit_stream.hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
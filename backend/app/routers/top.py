@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+
+from app.constants import TAG_HISTORY
+from app.schemas import top as schemas
+from app.services import heavy_hitters
+from app.utils.profiling import ProfiledRoute
+
+
+top_router = APIRouter(
+    prefix="",
+    route_class=ProfiledRoute,
+    tags=[TAG_HISTORY],
+)
+
+
+@top_router.get("/top", response_model=schemas.TopItems)
+def get_top(kind: str = heavy_hitters.KIND_DOMAIN, days: int = 7, limit: int = 10) -> schemas.TopItems:
+    """
+    Approximate most visited domains or URLs, answered from memory.
+
+    Args:
+        kind: "domain" or "url" (default: domain)
+        days: Window size in UTC days, including today (default: 7)
+        limit: Number of items to return (default: 10, max: 100)
+    """
+    if limit < 1 or limit > 100:
+        raise ValueError("Limit must be between 1 and 100")
+    items = heavy_hitters.get_top(kind, days, limit)
+    return schemas.TopItems.model_validate({"kind": kind, "days": days, "items": items})
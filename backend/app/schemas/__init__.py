@@ -1,3 +1,3 @@
-from . import page_metric
+from . import page_metric, search, stats, top
 
-__all__ = ["page_metric"]
+__all__ = ["page_metric", "search", "stats", "top"]
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, HttpUrl, field_validator
 
+from app.utils.urls import canonicalize_url
+
 
 class PageMetricBase(BaseModel):
     url: str  # Use str instead of HttpUrl to avoid automatic trailing slash addition
@@ -14,21 +16,18 @@ class PageMetricBase(BaseModel):
     @field_validator('url', mode='before')
     @classmethod
     def normalize_url_input(cls, v):
-        """Normalize URL by removing trailing slash."""
-        if isinstance(v, str):
-            # Validate it's a URL first
-            try:
-                HttpUrl(v)
-            except Exception:
-                raise ValueError(f"Invalid URL: {v}")
-            # Remove trailing slash
-            normalized = v.rstrip('/') or '/'
-            return normalized
-        # If it's already HttpUrl, convert to string and normalize
+        """Canonicalize the URL (validates scheme, host and length)."""
         if isinstance(v, HttpUrl):
-            normalized = str(v).rstrip('/') or '/'
-            return normalized
+            v = str(v)
+        if isinstance(v, str):
+            return canonicalize_url(v)
         return v
+
+# Fields a client may select with `fields=`, in response order
+VISIT_FIELDS = ("id", "url", "link_count", "word_count", "image_count", "datetime_visited")
+METRICS_FIELDS = ("url", "link_count", "word_count", "image_count", "last_visited", "visit_count")
+
+
 class PageMetricCreateDTO(PageMetricBase):
     datetime_visited: Optional[datetime] = None
     timezone_offset: Optional[float] = None  # Timezone offset in hours
@@ -46,3 +45,17 @@ class PageMetrics(BaseModel):
     image_count: int
     last_visited: Optional[str]
     visit_count: int
+
+
+class DomainMetrics(BaseModel):
+    domain: str  # Registrable domain or exact host that was queried
+    last_url: str
+    last_visited: Optional[str]
+    visit_count: int
+
+
+class VisitChanges(BaseModel):
+    changes: List[PageMetric]  # Visits recorded after the request's cursor, oldest first
+    next_cursor: int  # Pass as `since` on the next call
+    next_repeat_cursor: int = 0  # Pass as `since_repeat`; moves only for VISIT_DEDUP_ENABLED repeats
+    has_more: bool  # True if more changes are ready right now
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+from typing import Optional
+from pydantic import BaseModel
+
+
+class SearchResult(BaseModel):
+    url: str
+    visit_count: int
+    last_visited: Optional[str]
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Optional
+from pydantic import BaseModel
+
+
+class MetricDistribution(BaseModel):
+    # All None when there are no visits in the range; stddev also when there is one
+    min: Optional[float]
+    max: Optional[float]
+    mean: Optional[float]
+    stddev: Optional[float]  # Sample standard deviation
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]  # Percentiles interpolate between visits (percentile_cont)
+
+
+class PageMetricStats(BaseModel):
+    url: str
+    start: Optional[str]
+    end: Optional[str]
+    visit_count: int
+    link_count: MetricDistribution
+    word_count: MetricDistribution
+    image_count: MetricDistribution
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from typing import List
+from pydantic import BaseModel
+
+
+class TopItem(BaseModel):
+    item: str
+    count: int  # Upper bound on the true count
+    error: int  # count - error is a lower bound
+
+
+class TopItems(BaseModel):
+    kind: str
+    days: int
+    items: List[TopItem]
@@ -1,5 +1,5 @@
 """Business logic services."""
 
-from . import page_metrics
+from . import archive, dedup, heavy_hitters, hot_store, idempotency, known_urls, page_metrics, retention, search, sharding, stats, visit_stream
 
-__all__ = ["page_metrics"]
+__all__ = ["archive", "dedup", "heavy_hitters", "hot_store", "idempotency", "known_urls", "page_metrics", "retention", "search", "sharding", "stats", "visit_stream"]
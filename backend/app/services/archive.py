@@ -0,0 +1,411 @@
+"""
+Cold storage of raw visits in compressed segment files (ARCHIVE_ENABLED).
+
+With archiving on, the raw visits (and compact-mode repeats) the retention
+job removes from the database are also written to append-only segment
+files under ARCHIVE_DIR. Daily rollups keep /metrics counts exact; the
+archive keeps per-visit history, and `get_visits_for_url` merges it with
+the visits still in the database by visit time.
+
+A segment is a `.seg` file of independently zlib-compressed NDJSON blocks,
+rows sorted by (URL hash, URL, newest first), plus a `.idx.json` sidecar
+with the segment's min/max visit time, the sorted hashes of the URLs it
+holds, and each block's URL-hash range, offset and length. A URL lookup
+skips segments that do not hold the URL's hash or whose time range cannot
+reach the requested page, and in the rest memory-maps the segment and
+decompresses only the blocks whose hash range holds the URL.
+
+Each retention batch stages its segment as `.pending` files (fsynced)
+before its transaction commits and publishes them by rename afterwards.
+If the process dies in between, `recover` publishes the pending segment
+if its rows are gone from the database, or discards it otherwise. Every
+ARCHIVE_COMPACT_SECONDS the workers' schedulers merge the small per-batch
+segments; a lock file lets one compactor run at a time.
+
+    python -m app.services.archive recover    # also runs before each retention pass
+    python -m app.services.archive compact    # also runs on the scheduler
+    python -m app.services.archive stats
+
+ARCHIVE_DIR must be shared by every worker that serves reads.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.logger import get_logger
+from app.config.settings import settings
+from app.models.page_metrics import PageMetric
+from app.models.page_visit_repeat import PageVisitRepeat
+from app.services import sharding
+from app.utils.urls import url_hash
+
+logger = get_logger(__name__)
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx.json"
+PENDING_SUFFIX = ".pending"
+COMPACT_LOCK = ".compact.lock"
+RACY_MTIME_NS = 1_000_000_000
+FORMAT_VERSION = 2  # Version 1 indexes have no URL hashes; their segments are always searched
+# A pending segment younger than this may belong to a batch that is still committing
+RECOVER_MIN_AGE_SECONDS = 600
+
+
+class ArchivedVisit(NamedTuple):
+    id: int  # page_metrics id, or the negative id of a compact-mode repeat
+    url: str
+    link_count: int
+    word_count: int
+    image_count: int
+    datetime_visited: datetime
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes that were stored as UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _encode(visit: ArchivedVisit) -> dict:
+    return {
+        "id": visit.id,
+        "url": visit.url,
+        "link_count": visit.link_count,
+        "word_count": visit.word_count,
+        "image_count": visit.image_count,
+        "datetime_visited": _as_utc(visit.datetime_visited).isoformat(),
+    }
+
+
+def _decode(record: dict) -> ArchivedVisit:
+    return ArchivedVisit(
+        record["id"], record["url"], record["link_count"], record["word_count"], record["image_count"],
+        datetime.fromisoformat(record["datetime_visited"]),
+    )
+
+
+def _fsync_write(path: Path, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Segment:
+    """One published segment: its index in memory, its data read through mmap on demand."""
+
+    def __init__(self, data_path: Path, index: dict):
+        self.data_path = data_path
+        self.index = index
+        self.min_time = datetime.fromisoformat(index["min_time"])
+        self.max_time = datetime.fromisoformat(index["max_time"])
+        self._last_hashes = [block[1] for block in index["blocks"]]
+        hashes = index.get("url_hashes")
+        self._url_hashes = array("Q", hashes) if hashes is not None else None
+
+    @property
+    def rows(self) -> int:
+        return self.index["rows"]
+
+    def holds(self, key: int) -> bool:
+        """Whether a URL with this hash may have visits here, without reading the data."""
+        if self._url_hashes is None:
+            return True
+        i = bisect.bisect_left(self._url_hashes, key)
+        return i < len(self._url_hashes) and self._url_hashes[i] == key
+
+    def _blocks_for(self, key: int) -> List[list]:
+        blocks = self.index["blocks"]
+        start = bisect.bisect_left(self._last_hashes, key)
+        matches = []
+        for block in blocks[start:]:
+            if block[0] > key:
+                break
+            matches.append(block)
+        return matches
+
+    def visits_for(self, url: str, key: int) -> List[ArchivedVisit]:
+        blocks = self._blocks_for(key) if self.holds(key) else []
+        if not blocks:
+            return []
+        visits = []
+        with open(self.data_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for _, _, offset, length, _ in blocks:
+                for line in zlib.decompress(data[offset:offset + length]).splitlines():
+                    record = json.loads(line)
+                    if record["url"] == url:
+                        visits.append(_decode(record))
+        return visits
+
+    def all_visits(self) -> Iterable[ArchivedVisit]:
+        with open(self.data_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for _, _, offset, length, _ in self.index["blocks"]:
+                for line in zlib.decompress(data[offset:offset + length]).splitlines():
+                    yield _decode(json.loads(line))
+
+
+class PendingSegment(NamedTuple):
+    """A written, fsynced segment that readers cannot see until published."""
+    data_path: Path
+    index_path: Path
+
+    def publish(self) -> None:
+        # The index is renamed last: readers only load segments whose index exists
+        os.replace(self.data_path, str(self.data_path)[: -len(PENDING_SUFFIX)])
+        os.replace(self.index_path, str(self.index_path)[: -len(PENDING_SUFFIX)])
+
+    def discard(self) -> None:
+        for path in (self.index_path, self.data_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class Archive:
+    """The segments in one directory, with a catalog refreshed when the directory changes."""
+
+    def __init__(self, directory: str, block_rows: int):
+        self.directory = Path(directory)
+        self.block_rows = block_rows
+        self._segments: Dict[str, Segment] = {}
+        self._dir_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def stage(self, visits: Iterable[ArchivedVisit]) -> Optional[PendingSegment]:
+        """Write `visits` as a pending segment; None if there are none."""
+        rows = sorted(
+            ((url_hash(v.url), v.url, -_as_utc(v.datetime_visited).timestamp(), _encode(v)) for v in visits),
+            key=lambda row: row[:3],
+        )
+        if not rows:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data, blocks = bytearray(), []
+        for start in range(0, len(rows), self.block_rows):
+            block = rows[start:start + self.block_rows]
+            payload = zlib.compress(
+                b"".join(json.dumps(row[3], separators=(",", ":")).encode("utf-8") + b"\n" for row in block)
+            )
+            blocks.append([block[0][0], block[-1][0], len(data), len(payload), len(block)])
+            data += payload
+
+        times = [_as_utc(datetime.fromisoformat(row[3]["datetime_visited"])) for row in rows]
+        index = {
+            "version": FORMAT_VERSION,
+            "rows": len(rows),
+            "min_time": min(times).isoformat(),
+            "max_time": max(times).isoformat(),
+            "url_hashes": sorted({row[0] for row in rows}),
+            "blocks": blocks,
+        }
+        name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:12]}"
+        pending = PendingSegment(
+            self.directory / f"{name}{SEGMENT_SUFFIX}{PENDING_SUFFIX}",
+            self.directory / f"{name}{INDEX_SUFFIX}{PENDING_SUFFIX}",
+        )
+        _fsync_write(pending.data_path, bytes(data))
+        _fsync_write(pending.index_path, json.dumps(index).encode("utf-8"))
+        return pending
+
+    def segments(self) -> List[Segment]:
+        """Published segments, newest visits first; reloads the catalog if the directory changed."""
+        try:
+            mtime = self.directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if mtime != self._dir_mtime:
+                # Timestamps are coarse: a change in the same tick as this read would keep
+                # the mtime, so a just-modified directory is re-listed until it settles
+                self._dir_mtime = mtime if time.time_ns() - mtime > RACY_MTIME_NS else None
+                loaded = {}
+                for index_path in self.directory.glob(f"*{INDEX_SUFFIX}"):
+                    name = index_path.name[: -len(INDEX_SUFFIX)]
+                    segment = self._segments.get(name)
+                    if segment is None:
+                        try:
+                            index = json.loads(index_path.read_text())
+                        except (OSError, ValueError) as e:
+                            logger.warning(f"Skipping unreadable archive index {index_path}: {e}")
+                            continue
+                        segment = Segment(self.directory / f"{name}{SEGMENT_SUFFIX}", index)
+                    loaded[name] = segment
+                self._segments = loaded
+            return sorted(self._segments.values(), key=lambda s: s.max_time, reverse=True)
+
+    def newest(self) -> Optional[datetime]:
+        """Time of the newest archived visit to any URL; None while the archive is empty."""
+        segments = self.segments()
+        return segments[0].max_time if segments else None
+
+    def visits_for_url(self, url: str, limit: int, offset: int) -> List[ArchivedVisit]:
+        """Archived visits to `url`, newest first, paged like the database reads."""
+        try:
+            return self._visits_for_url(url, limit, offset)
+        except FileNotFoundError:
+            # Compaction replaced a segment after the catalog was read; reload and retry
+            with self._lock:
+                self._dir_mtime = None
+            return self._visits_for_url(url, limit, offset)
+
+    def _visits_for_url(self, url: str, limit: int, offset: int) -> List[ArchivedVisit]:
+        key = url_hash(url)
+        wanted = offset + limit
+        found: Dict[int, ArchivedVisit] = {}  # By id: a visit may sit in two segments mid-compaction
+        for segment in self.segments():
+            if len(found) >= wanted:
+                kth_newest = sorted((v.datetime_visited for v in found.values()), reverse=True)[wanted - 1]
+                # Segments come newest first; this one and the rest cannot change the page
+                if segment.max_time < kth_newest:
+                    break
+            for visit in segment.visits_for(url, key):
+                found[visit.id] = visit
+        ordered = sorted(found.values(), key=lambda v: (v.datetime_visited, v.id), reverse=True)
+        return ordered[offset:wanted]
+
+    def compact(self, target_rows: int) -> int:
+        """
+        Merge segments smaller than `target_rows` into larger ones.
+
+        Returns:
+            int: Segments removed; 0 if another process is compacting
+        """
+        if not self.directory.exists():
+            return 0
+        with open(self.directory / COMPACT_LOCK, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            # Another compactor may have replaced segments since the catalog was read
+            with self._lock:
+                self._dir_mtime = None
+            return self._compact(target_rows)
+
+    def _compact(self, target_rows: int) -> int:
+        small = sorted((s for s in self.segments() if s.rows < target_rows), key=lambda s: s.min_time)
+        removed = 0
+        batch: List[Segment] = []
+        for segment in small + [None]:
+            if segment is not None:
+                batch.append(segment)
+                if sum(s.rows for s in batch) < target_rows:
+                    continue
+            if len(batch) > 1:
+                pending = self.stage(v for s in batch for v in s.all_visits())
+                pending.publish()
+                # Until these are gone, reads see both copies and keep one per id
+                for old in batch:
+                    Path(str(old.data_path)[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX).unlink()
+                    old.data_path.unlink()
+                removed += len(batch)
+            batch = []
+        return removed
+
+    def recover(self, db: Session, min_age_seconds: float = RECOVER_MIN_AGE_SECONDS) -> int:
+        """Publish or discard pending segments left by interrupted retention batches."""
+        handled = 0
+        for index_path in self.directory.glob(f"*{INDEX_SUFFIX}{PENDING_SUFFIX}"):
+            if time.time() - index_path.stat().st_mtime < min_age_seconds:
+                continue
+            name = index_path.name[: -len(INDEX_SUFFIX + PENDING_SUFFIX)]
+            pending = PendingSegment(self.directory / f"{name}{SEGMENT_SUFFIX}{PENDING_SUFFIX}", index_path)
+            try:
+                ids = {v.id for v in Segment(pending.data_path, json.loads(index_path.read_text())).all_visits()}
+            except (OSError, ValueError, zlib.error):
+                pending.discard()  # Never fully written, so its batch never committed
+                handled += 1
+                continue
+            # The batch ran on one shard; its rows are gone only if they are on none
+            if any(sharding.gather(db, lambda shard: _any_still_stored(shard, ids))):
+                pending.discard()  # Its batch rolled back
+            else:
+                pending.publish()  # Its batch committed
+            handled += 1
+        return handled
+
+
+def _any_still_stored(db: Session, ids: Set[int]) -> bool:
+    visit_ids = [i for i in ids if i > 0]
+    repeat_ids = [-i for i in ids if i < 0]
+    if visit_ids and db.execute(select(PageMetric.id).where(PageMetric.id.in_(visit_ids)).limit(1)).first():
+        return True
+    if repeat_ids and db.execute(
+        select(PageVisitRepeat.id).where(PageVisitRepeat.id.in_(repeat_ids)).limit(1)
+    ).first():
+        return True
+    return False
+
+
+store = Archive(settings.ARCHIVE_DIR, settings.ARCHIVE_BLOCK_ROWS)
+
+
+def commit_archiving(db: Session, visits: List[ArchivedVisit]) -> None:
+    """Commit a retention batch, keeping the visits it removed in the archive."""
+    if not settings.ARCHIVE_ENABLED:
+        db.commit()
+        return
+    pending = store.stage(visits)
+    try:
+        db.commit()
+    except Exception:
+        if pending is not None:
+            pending.discard()
+        raise
+    if pending is not None:
+        pending.publish()
+
+
+def compact_segments() -> None:
+    """Scheduled compaction of the shared store."""
+    removed = store.compact(settings.ARCHIVE_COMPACT_ROWS)
+    if removed:
+        logger.info(f"Merged {removed} archive segments")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the cold visit archive.")
+    parser.add_argument("command", choices=("recover", "compact", "stats"))
+    parser.add_argument("--target-rows", type=int, default=settings.ARCHIVE_COMPACT_ROWS,
+                        help="Rows per segment after compaction")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        print(f"Merged {store.compact(args.target_rows)} segments")
+    elif args.command == "stats":
+        segments = store.segments()
+        rows = sum(s.rows for s in segments)
+        size = sum(s.data_path.stat().st_size for s in segments)
+        print(f"{len(segments)} segments, {rows} visits, {size / 1e6:.1f} MB in {store.directory}")
+    else:
+        from app.config.db import SessionLocal
+
+        db = SessionLocal()
+        try:
+            handled = store.recover(db, min_age_seconds=0)
+        finally:
+            sharding.close_sessions(db)
+            db.close()
+        print(f"Recovered {handled} pending segments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compact storage of repeated visits with unchanged metrics (VISIT_DEDUP_ENABLED).
+
+When a URL is revisited with the same link/word/image counts as a visit this
+worker recently stored, only a `page_visit_repeats` row (a timestamp and a
+reference to that visit) is written instead of a full `page_metrics` row.
+Reads expand repeats back into visits, so /visits and /metrics are logically
+unchanged.
+
+The comparison uses a bounded in-memory map of each URL's latest stored
+metrics, so it costs no query. It may be stale across workers; that only
+means a full row is stored where a repeat would have done, since a repeat is
+only ever written for counts equal to the referenced row's.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.page_visit_repeat import PageVisitRepeat
+from app.services import sharding
+
+Counts = Tuple[int, int, int]  # link_count, word_count, image_count
+
+
+class RepeatedVisit(NamedTuple):
+    """A repeat expanded into the fields of the visit it stands for."""
+    id: int  # Negative repeat id
+    url: str
+    host: Optional[str]
+    domain: Optional[str]
+    link_count: int
+    word_count: int
+    image_count: int
+    datetime_visited: datetime
+
+
+def repeat_visit_id(repeat_id: int) -> int:
+    """Public id of a repeat; negative so it never collides with page_metrics ids."""
+    return -repeat_id
+
+
+class LatestMetricsCache:
+    """LRU map of url -> (id of its latest stored row, that row's counts)."""
+
+    def __init__(self, max_urls: int):
+        self.max_urls = max_urls
+        self._entries: "OrderedDict[str, Tuple[int, Counts]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def remember(self, url: str, visit_id: int, counts: Counts) -> None:
+        with self._lock:
+            self._entries[url] = (visit_id, counts)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_urls:
+                self._entries.popitem(last=False)
+
+    def match(self, url: str, counts: Counts) -> Optional[int]:
+        """Id of the cached row for `url` if its counts equal `counts`."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[1] != counts:
+                return None
+            self._entries.move_to_end(url)
+            return entry[0]
+
+    def forget(self, url: str) -> None:
+        with self._lock:
+            self._entries.pop(url, None)
+
+
+cache = LatestMetricsCache(settings.VISIT_DEDUP_CACHE_SIZE)
+
+# Whether repeats exist, so reads keep expanding them after VISIT_DEDUP_ENABLED is
+# turned off. Set at startup, then rechecked every VISIT_DEDUP_RECHECK_SECONDS while
+# off, since workers still running with it on (e.g. mid-deploy) may write the first
+# ones later; with the bridge, a repeat another worker announces sets it at once
+_repeats_stored = False
+
+
+def _any_repeats(db: Session) -> bool:
+    return any(sharding.gather(
+        db, lambda shard: bool(shard.execute(select(exists().select_from(PageVisitRepeat))).scalar())
+    ))
+
+
+def detect_repeats(db: Session) -> bool:
+    global _repeats_stored
+    _repeats_stored = _any_repeats(db)
+    return _repeats_stored
+
+
+def recheck_repeats(db: Session) -> None:
+    """Start expanding repeats once any appear; never stops, so it cannot race a listener."""
+    global _repeats_stored
+    if not active() and _any_repeats(db):
+        _repeats_stored = True
+
+
+def note_visit(event) -> None:
+    """Visit stream listener: a repeat from any worker means reads must include repeats."""
+    global _repeats_stored
+    if event["id"] < 0:
+        _repeats_stored = True
+
+
+def active() -> bool:
+    """Whether reads must include `page_visit_repeats`."""
+    return settings.VISIT_DEDUP_ENABLED or _repeats_stored
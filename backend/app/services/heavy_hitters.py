@@ -0,0 +1,231 @@
+"""
+Approximate "most visited" domains and URLs from streaming Space-Saving summaries.
+
+Every recorded visit is offered to a per-day, per-kind summary holding at most
+HEAVY_HITTERS_CAPACITY counters, so memory and /top latency stay constant no
+matter how large `page_metrics` grows. Counts are over-estimates bounded by
+each counter's `error`.
+
+Workers only see their own writes in real time. On every checkpoint a worker
+merges the counts it accumulated since the last one into the shared row in
+`heavy_hitter_summaries` (under a row lock) and adopts the merged result, so
+all workers converge within one checkpoint interval.
+"""
+from __future__ import annotations
+
+import heapq
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.heavy_hitters import HeavyHitterSummary
+
+KIND_DOMAIN = "domain"
+KIND_URL = "url"
+KINDS = (KIND_DOMAIN, KIND_URL)
+
+
+class SpaceSaving:
+    """Space-Saving top-K summary (Metwally et al.) with mergeable counters."""
+
+    def __init__(self, capacity: int, counters: Optional[Dict[str, List[int]]] = None):
+        self.capacity = capacity
+        # item -> [count, error]
+        self.counters: Dict[str, List[int]] = counters if counters is not None else {}
+        # One (count, item) entry per counter, for finding the smallest in O(log k). Counts
+        # only grow, so an entry may be stale (too low) and is refreshed when it surfaces
+        self._heap: List[Tuple[int, str]] = [(counter[0], item) for item, counter in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def offer(self, item: str, count: int = 1) -> None:
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+        else:
+            # Replace the smallest counter; its count becomes the newcomer's error bound
+            while True:
+                floor, victim = self._heap[0]
+                current = self.counters[victim][0]
+                if current == floor:
+                    break
+                heapq.heapreplace(self._heap, (current, victim))
+            del self.counters[victim]
+            self.counters[item] = [floor + count, floor]
+            heapq.heapreplace(self._heap, (floor + count, item))
+
+    @property
+    def floor(self) -> int:
+        """Upper bound on the count of any item not held: the smallest count once full, else 0."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Return a new summary combining both, truncated to this capacity.
+
+        An item missing from one side may still have been seen there up to
+        that side's floor times, which is added to its count and error so
+        counts stay upper bounds (Agarwal et al., "Mergeable Summaries").
+        """
+        floor, other_floor = self.floor, other.floor
+        combined: Dict[str, List[int]] = {}
+        for item, (count, error) in self.counters.items():
+            other_count, other_error = other.counters.get(item, (other_floor, other_floor))
+            combined[item] = [count + other_count, error + other_error]
+        for item, (count, error) in other.counters.items():
+            if item not in combined:
+                combined[item] = [count + floor, error + floor]
+        kept = sorted(combined.items(), key=lambda kv: kv[1][0], reverse=True)[: self.capacity]
+        return SpaceSaving(self.capacity, dict(kept))
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)[:k]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        return {k: list(v) for k, v in self.counters.items()}
+
+    @classmethod
+    def from_dict(cls, capacity: int, data: Optional[Dict[str, List[int]]]) -> "SpaceSaving":
+        return cls(capacity, {k: list(v) for k, v in (data or {}).items()})
+
+
+def _utc_day(dt: datetime) -> date:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.date()
+
+
+class HeavyHitters:
+    """Per-day Space-Saving summaries for domains and URLs."""
+
+    def __init__(self, capacity: int, retention_days: int):
+        self.capacity = capacity
+        self.retention_days = retention_days
+        # Merged view served by /top, and counts not yet checkpointed
+        self._view: Dict[Tuple[date, str], SpaceSaving] = {}
+        self._pending: Dict[Tuple[date, str], SpaceSaving] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def counters(self) -> int:
+        """Counters held, across the served view and the ones awaiting checkpoint."""
+        with self._lock:
+            return sum(len(summary.counters) for table in (self._view, self._pending) for summary in table.values())
+
+    def _summary(self, table: Dict[Tuple[date, str], SpaceSaving], key: Tuple[date, str]) -> SpaceSaving:
+        summary = table.get(key)
+        if summary is None:
+            summary = table[key] = SpaceSaving(self.capacity)
+        return summary
+
+    def record(self, url: str, visited_at: datetime, domain: Optional[str] = None) -> None:
+        day = _utc_day(visited_at)
+        domain = domain or urlsplit(url).hostname or url
+        with self._lock:
+            for kind, item in ((KIND_DOMAIN, domain), (KIND_URL, url)):
+                self._summary(self._view, (day, kind)).offer(item)
+                self._summary(self._pending, (day, kind)).offer(item)
+
+    def top(self, kind: str, days: int, k: int, today: Optional[date] = None) -> List[Tuple[str, int, int]]:
+        """Approximate top-k items of `kind` over the last `days` days (UTC, inclusive)."""
+        today = today or datetime.now(timezone.utc).date()
+        merged = SpaceSaving(self.capacity)
+        with self._lock:
+            for offset in range(days):
+                summary = self._view.get((today - timedelta(days=offset), kind))
+                if summary is not None:
+                    merged = merged.merge(summary)
+        return merged.top(k)
+
+    def _prune(self, today: date) -> None:
+        cutoff = today - timedelta(days=self.retention_days)
+        for table in (self._view, self._pending):
+            for key in [key for key in table if key[0] < cutoff]:
+                del table[key]
+
+    def load(self, db: Session) -> None:
+        """Seed the in-memory view from checkpoints within the retention window."""
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=self.retention_days)
+        rows = db.execute(
+            select(HeavyHitterSummary).where(HeavyHitterSummary.day >= cutoff)
+        ).scalars().all()
+        with self._lock:
+            for row in rows:
+                key = (row.day, row.kind)
+                restored = SpaceSaving.from_dict(self.capacity, row.counters)
+                pending = self._pending.get(key)
+                self._view[key] = restored.merge(pending) if pending else restored
+
+    def checkpoint(self, db: Session) -> int:
+        """
+        Merge pending counts into the shared checkpoint rows.
+
+        Returns:
+            int: Number of (day, kind) summaries written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        # Each summary is read, merged and written back in one transaction
+        db.info["read_then_write"] = True
+        written = 0
+        try:
+            for (day, kind), delta in pending.items():
+                row = db.execute(
+                    select(HeavyHitterSummary)
+                    .where(HeavyHitterSummary.day == day, HeavyHitterSummary.kind == kind)
+                    .with_for_update()
+                ).scalar_one_or_none()
+                if row is None:
+                    row = HeavyHitterSummary(day=day, kind=kind)
+                    db.add(row)
+                merged = SpaceSaving.from_dict(self.capacity, row.counters).merge(delta)
+                row.counters = merged.to_dict()
+                row.updated_at = datetime.now(timezone.utc)
+                db.commit()
+                written += 1
+                with self._lock:
+                    # Adopt other workers' counts, keeping anything recorded meanwhile
+                    since = self._pending.get((day, kind))
+                    self._view[(day, kind)] = merged.merge(since) if since else merged
+        except Exception:
+            db.rollback()
+            # Put unsaved deltas back so the next checkpoint retries them
+            with self._lock:
+                for key, delta in list(pending.items())[written:]:
+                    since = self._pending.get(key)
+                    self._pending[key] = delta.merge(since) if since else delta
+            raise
+        with self._lock:
+            self._prune(datetime.now(timezone.utc).date())
+        return written
+
+
+tracker = HeavyHitters(
+    capacity=settings.HEAVY_HITTERS_CAPACITY,
+    retention_days=settings.HEAVY_HITTERS_RETENTION_DAYS,
+)
+
+
+def record_visit(visit) -> None:
+    tracker.record(visit.url, visit.datetime_visited, visit.domain)
+
+
+def get_top(kind: str, days: int, limit: int) -> List[Dict[str, object]]:
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(KINDS)}")
+    if not 1 <= days <= tracker.retention_days:
+        raise ValueError(f"days must be between 1 and {tracker.retention_days}")
+    return [
+        {"item": item, "count": count, "error": error}
+        for item, count, error in tracker.top(kind, days, limit)
+    ]
@@ -0,0 +1,474 @@
+"""
+In-process columnar store of recent visits (HOT_STORE_ENABLED).
+
+Nearly all reads are for visits from the last few days. With the store on,
+each worker keeps the visits of the last HOT_STORE_WINDOW_HOURS in NumPy
+columns sorted by URL and newest first, with each URL's row range in a dict:
+
+- a /visits page that lies within a URL's recent visits is sliced from them;
+- /metrics takes the newest one and adds the URL's older visit count, read
+  from the database once per URL and then kept up to date;
+- /metrics/stats for a range starting inside the window is reduced with
+  NumPy over the URL's rows.
+
+Anything reaching further back takes the usual queries.
+
+The store is loaded from every shard at startup and fed each visit after it
+commits. New rows go to a per-URL buffer, which reads combine with the
+columns; only the maintenance job merges it in, so no request pays for a
+re-sort. Other workers' visits arrive through the visit stream hub, which
+only hears them through VISIT_STREAM_PG_BRIDGE; startup fails without the
+bridge. While its listener is reconnecting, and after it reconnects until
+the store is reloaded (within VISIT_STREAM_RESYNC_SECONDS), every read takes
+the usual queries rather than miss visits another worker recorded.
+
+Every HOT_STORE_MAINTENANCE_SECONDS, rows older than the window are evicted
+into the older-visit counts, and if the columns hold more than
+HOT_STORE_MAX_BYTES the window is shortened to fit. The window must be
+shorter than RETENTION_RAW_DAYS, so retention never rolls up a row the store
+still holds.
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, func, select, union_all
+from sqlalchemy.orm import Session
+
+from app.config.logger import get_logger
+from app.config.settings import settings
+from app.models.page_metric_daily import PageMetricDaily
+from app.models.page_metrics import PageMetric
+from app.models.page_visit_repeat import PageVisitRepeat
+from app.services import dedup, sharding, visit_stream
+
+logger = get_logger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_COLUMNS = {
+    "id": np.int64, "url": np.int32, "link_count": np.int32,
+    "word_count": np.int32, "image_count": np.int32, "time": np.int64,
+}
+ROW_BYTES = sum(np.dtype(dtype).itemsize for dtype in _COLUMNS.values())
+# Ids of visits older than the window, remembered so a repeated announcement counts once
+_LATE_IDS = 4096
+
+
+class HotVisit(NamedTuple):
+    id: int
+    url: str
+    link_count: int
+    word_count: int
+    image_count: int
+    datetime_visited: datetime
+
+
+# (time, id, link_count, word_count, image_count) of a buffered visit
+_Row = Tuple[int, int, int, int, int]
+
+
+def _micros(dt: datetime) -> int:
+    # Naive times are UTC, like stored visit times
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def _datetime(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def _bound(db: Session, micros: int) -> datetime:
+    # SQLite stores UTC wall-clock strings; Postgres compares timestamptz
+    bound = _datetime(micros)
+    return bound.replace(tzinfo=None) if db.get_bind().dialect.name == "sqlite" else bound
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in _COLUMNS.items()}
+
+
+def _build_recent_stmt(repeats: bool):
+    raw = PageMetric
+    counts = (raw.link_count, raw.word_count, raw.image_count)
+    stmt = select(raw.id, raw.url, *counts, raw.datetime_visited).where(raw.datetime_visited >= bindparam("since"))
+    if repeats:
+        stmt = union_all(
+            stmt,
+            select(-PageVisitRepeat.id, raw.url, *counts, PageVisitRepeat.datetime_visited)
+            .join(raw, raw.id == PageVisitRepeat.visit_id)
+            .where(PageVisitRepeat.datetime_visited >= bindparam("since")),
+        )
+    return stmt
+
+
+def _build_older_count_stmt(repeats: bool):
+    raw = PageMetric
+    older = select(raw.id).where(raw.url == bindparam("value"), raw.datetime_visited < bindparam("before"))
+    if repeats:
+        older = union_all(
+            older,
+            select(PageVisitRepeat.id)
+            .join(raw, raw.id == PageVisitRepeat.visit_id)
+            .where(raw.url == bindparam("value"), PageVisitRepeat.datetime_visited < bindparam("before")),
+        )
+    rolled_up = (
+        select(func.coalesce(func.sum(PageMetricDaily.visit_count), 0))
+        .where(PageMetricDaily.url == bindparam("value"))
+        .scalar_subquery()
+    )
+    return select(func.count() + rolled_up).select_from(older.subquery())
+
+
+_RECENT_STMTS = {repeats: _build_recent_stmt(repeats) for repeats in (False, True)}
+_OLDER_COUNT_STMTS = {repeats: _build_older_count_stmt(repeats) for repeats in (False, True)}
+
+
+class HotStore:
+    """The worker's recent visits; answers nothing (so reads use SQL) until loaded."""
+
+    def __init__(self, window_hours: float, max_bytes: int):
+        self.window = timedelta(hours=window_hours)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._codes: Dict[str, int] = {}  # URL -> its code in the url column
+        self._urls: List[str] = []
+        self._columns = _empty_columns()  # Sorted by url code, then newest first
+        self._ranges: Dict[int, Tuple[int, int]] = {}  # url code -> [start, end) in the columns
+        self._buffer: Dict[int, List[_Row]] = {}  # Visits not yet merged into the columns
+        self._buffered = 0
+        # (url code, id) of buffered rows; the buffer can grow large between merges
+        self._buffered_ids: Set[Tuple[int, int]] = set()
+        # url code -> visits before covered_since, rolled-up ones included
+        self._older: Dict[int, int] = {}
+        # Bumped whenever older counts may change, so a count read meanwhile is not kept
+        self._epoch = 0
+        self._late_ids: Set[int] = set()
+        self._late_order: Deque[int] = deque()
+        self._pending: Optional[List[Tuple[str, _Row]]] = None  # Visits added while loading
+        self.covered_since: Optional[int] = None  # Microseconds; every visit since is held
+        self.generation: Optional[int] = None  # Bridge generation the store was loaded under
+
+    @property
+    def ready(self) -> bool:
+        return self.covered_since is not None
+
+    @property
+    def rows(self) -> int:
+        return len(self._columns["id"]) + self._buffered
+
+    def add(self, visit_id: int, url: str, link_count: int, word_count: int, image_count: int,
+            visited: datetime) -> None:
+        """Hold a committed visit; one already held (by id) is ignored."""
+        row = (_micros(visited), visit_id, link_count, word_count, image_count)
+        with self._lock:
+            if self.covered_since is None:
+                if self._pending is not None:
+                    self._pending.append((url, row))
+                return
+            self._add(url, row)
+
+    def _add(self, url: str, row: _Row) -> None:
+        visited, visit_id = row[0], row[1]
+        code = self._codes.get(url)
+        if visited < self.covered_since:
+            # Too old to hold; only the URL's older count changes
+            if visit_id in self._late_ids:
+                return
+            self._late_ids.add(visit_id)
+            self._late_order.append(visit_id)
+            if len(self._late_order) > _LATE_IDS:
+                self._late_ids.discard(self._late_order.popleft())
+            if code in self._older:
+                self._older[code] += 1
+            self._epoch += 1
+            return
+        if code is None:
+            code = self._codes[url] = len(self._urls)
+            self._urls.append(url)
+        elif self._holds(code, visit_id):
+            return
+        self._buffer.setdefault(code, []).append(row)
+        self._buffered += 1
+        self._buffered_ids.add((code, visit_id))
+
+    def _holds(self, code: int, visit_id: int) -> bool:
+        if (code, visit_id) in self._buffered_ids:
+            return True
+        start, end = self._ranges.get(code, (0, 0))
+        return bool((self._columns["id"][start:end] == visit_id).any())
+
+    def _merge(self, cutoff: Optional[int] = None) -> None:
+        """Fold the buffer into the columns, evicting rows before `cutoff`, and re-sort."""
+        columns = self._columns
+        if self._buffered:
+            rows = np.array(
+                [(code, *row) for code, rows in self._buffer.items() for row in rows], dtype=np.int64
+            )
+            added = {
+                "url": rows[:, 0], "time": rows[:, 1], "id": rows[:, 2],
+                "link_count": rows[:, 3], "word_count": rows[:, 4], "image_count": rows[:, 5],
+            }
+            columns = {
+                name: np.concatenate([columns[name], added[name].astype(dtype)])
+                for name, dtype in _COLUMNS.items()
+            }
+            self._buffer, self._buffered = {}, 0
+            self._buffered_ids = set()
+        if cutoff is not None:
+            keep = columns["time"] >= cutoff
+            if not keep.all():
+                evicted = np.bincount(columns["url"][~keep])
+                for code in np.flatnonzero(evicted).tolist():
+                    if code in self._older:
+                        self._older[code] += int(evicted[code])
+                columns = {name: column[keep] for name, column in columns.items()}
+        # Last key sorts first: by url code, then newest, then highest id among equal times
+        order = np.lexsort((-columns["id"], -columns["time"], columns["url"]))
+        self._columns = {name: column[order] for name, column in columns.items()}
+        codes, starts, counts = np.unique(self._columns["url"], return_index=True, return_counts=True)
+        self._ranges = {
+            code: (start, start + count)
+            for code, start, count in zip(codes.tolist(), starts.tolist(), counts.tolist())
+        }
+
+    def _renumber(self) -> None:
+        """Drop the codes of URLs with no rows left, so codes stay dense; needs an empty buffer."""
+        live = np.fromiter(sorted(self._ranges), dtype=np.int64, count=len(self._ranges))
+        if len(live) == len(self._urls):
+            return
+        remap = np.full(len(self._urls), -1, dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+        # Monotonic, so the columns stay sorted
+        self._columns["url"] = remap[self._columns["url"]]
+        self._urls = [self._urls[code] for code in live.tolist()]
+        self._codes = {url: code for code, url in enumerate(self._urls)}
+        self._older = {int(remap[code]): count for code, count in self._older.items() if code in self._ranges}
+        self._ranges = {int(remap[code]): span for code, span in self._ranges.items()}
+        # Counts are keyed by codes now reassigned
+        self._epoch += 1
+
+    def load(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Load every shard's visits within the window, replacing the contents; returns the rows held."""
+        since = _micros(now or datetime.now(timezone.utc)) - self.window // _MICROSECOND
+        generation = visit_stream.bridge_generation()
+        with self._lock:
+            self.covered_since = None
+            self._pending = []  # Before the scan, so nothing committed meanwhile is missed
+        try:
+            stmt = _RECENT_STMTS[dedup.active()]
+            shard_rows = sharding.gather(db, lambda shard: shard.execute(stmt, {"since": _bound(shard, since)}).all())
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        codes: Dict[str, int] = {}
+        buffer: Dict[int, List[_Row]] = {}
+        loaded = 0
+        for rows in shard_rows:
+            for visit_id, url, link_count, word_count, image_count, visited in rows:
+                code = codes.setdefault(url, len(codes))
+                buffer.setdefault(code, []).append((_micros(visited), visit_id, link_count, word_count, image_count))
+                loaded += 1
+        with self._lock:
+            self._codes, self._urls = codes, list(codes)
+            self._columns, self._ranges = _empty_columns(), {}
+            self._buffer, self._buffered = buffer, loaded
+            self._older = {}
+            self._epoch += 1
+            self._merge()
+            self.covered_since = since
+            self.generation = generation
+            for url, row in self._pending:
+                self._add(url, row)
+            self._pending = None
+            held, urls = self.rows, len(self._urls)
+        logger.info(f"Hot store loaded: {held} visits of {urls} URLs, {held * ROW_BYTES // 1024} KiB")
+        return held
+
+    def maintain(self, now: Optional[datetime] = None) -> None:
+        """Evict rows older than the window or over the byte budget, and merge the buffer."""
+        now_micros = _micros(now or datetime.now(timezone.utc))
+        with self._lock:
+            if self.covered_since is None:
+                return
+            cutoff = max(self.covered_since, now_micros - self.window // _MICROSECOND)
+            budget = max(1, self.max_bytes // ROW_BYTES)
+            if self.rows > budget:
+                times = np.concatenate([
+                    self._columns["time"],
+                    np.array([row[0] for rows in self._buffer.values() for row in rows], dtype=np.int64),
+                ])
+                # Shorten the window to start at the oldest of the newest `budget` rows
+                cutoff = max(cutoff, int(np.partition(times, len(times) - budget)[len(times) - budget]))
+                logger.info(f"Hot store over {self.max_bytes} bytes; window now starts at {_datetime(cutoff)}")
+            self._merge(cutoff)
+            self.covered_since = cutoff
+            self._epoch += 1
+            self._renumber()
+
+    def _url_rows(self, url: str) -> Optional[Tuple[Dict[str, np.ndarray], Optional[int]]]:
+        """The URL's columns newest first and its older count (None if unknown); None if it has no rows."""
+        with self._lock:
+            code = self._codes.get(url)
+            if self.covered_since is None or code is None:
+                return None
+            start, end = self._ranges.get(code, (0, 0))
+            # Merges replace the arrays rather than writing into them, so the slices stay valid
+            columns = {name: column[start:end] for name, column in self._columns.items()}
+            buffered = list(self._buffer.get(code, ()))
+            older = self._older.get(code)
+        if buffered:
+            rows = np.array(buffered, dtype=np.int64)
+            added = {"time": rows[:, 0], "id": rows[:, 1], "link_count": rows[:, 2],
+                     "word_count": rows[:, 3], "image_count": rows[:, 4]}
+            columns = {name: np.concatenate([columns[name], added[name]]) for name in added}
+            order = np.lexsort((-columns["id"], -columns["time"]))
+            columns = {name: column[order] for name, column in columns.items()}
+        if not len(columns["id"]):
+            return None
+        return columns, older
+
+    def visits(self, url: str, limit: int, offset: int) -> Optional[List[HotVisit]]:
+        """A page of the URL's visits newest first, or None if it may reach past the window."""
+        found = self._url_rows(url)
+        if found is None:
+            return None
+        columns, older = found
+        if offset + limit > len(columns["id"]) and older != 0:
+            return None
+        page = slice(offset, offset + limit)
+        return [
+            HotVisit(visit_id, url, link_count, word_count, image_count, _datetime(visited))
+            for visit_id, link_count, word_count, image_count, visited in zip(
+                columns["id"][page].tolist(), columns["link_count"][page].tolist(),
+                columns["word_count"][page].tolist(), columns["image_count"][page].tolist(),
+                columns["time"][page].tolist(),
+            )
+        ]
+
+    def latest(self, db: Session, url: str) -> Optional[Tuple[HotVisit, int]]:
+        """The URL's newest visit and total visit count, or None if it has no recent visits."""
+        found = self._url_rows(url)
+        if found is None:
+            return None
+        columns, older = found
+        if older is None:
+            older = self._load_older(db, url)
+            if older is None:
+                return None
+        newest = HotVisit(
+            int(columns["id"][0]), url, int(columns["link_count"][0]), int(columns["word_count"][0]),
+            int(columns["image_count"][0]), _datetime(int(columns["time"][0])),
+        )
+        return newest, len(columns["id"]) + older
+
+    def _load_older(self, db: Session, url: str) -> Optional[int]:
+        """Count the URL's visits before the window; kept unless the counts changed meanwhile."""
+        with self._lock:
+            epoch, before = self._epoch, self.covered_since
+        shard = sharding.session_for_url(db, url)
+        count = shard.execute(
+            _OLDER_COUNT_STMTS[dedup.active()], {"value": url, "before": _bound(shard, before)}
+        ).scalar()
+        with self._lock:
+            if self._epoch != epoch:
+                return None
+            code = self._codes.get(url)
+            if code is not None:
+                self._older[code] = count
+        return count
+
+    def recent_counts(self, url: str, start: datetime, end: Optional[datetime]) -> Optional[np.ndarray]:
+        """
+        Link, word and image counts of the URL's visits in [start, end), one row per visit.
+
+        None if `start` is before the window, which then holds only part of the range.
+        """
+        with self._lock:
+            if self.covered_since is None or _micros(start) < self.covered_since:
+                return None
+        found = self._url_rows(url)
+        if found is None:
+            return np.empty((0, 3), dtype=np.float64)
+        columns, _ = found
+        times = columns["time"]
+        in_range = times >= _micros(start)
+        if end is not None:
+            in_range &= times < _micros(end)
+        return np.column_stack(
+            [columns[name][in_range] for name in ("link_count", "word_count", "image_count")]
+        ).astype(np.float64)
+
+
+store = HotStore(settings.HOT_STORE_WINDOW_HOURS, settings.HOT_STORE_MAX_BYTES)
+
+
+def _on_visit(event) -> None:
+    store.add(
+        event["id"], event["url"], event["link_count"], event["word_count"], event["image_count"],
+        event["datetime_visited"],
+    )
+
+
+def check_settings() -> None:
+    if settings.RETENTION_ENABLED and settings.HOT_STORE_WINDOW_HOURS >= settings.RETENTION_RAW_DAYS * 24:
+        raise ValueError("HOT_STORE_WINDOW_HOURS must be shorter than RETENTION_RAW_DAYS")
+    visit_stream.require_bridge("HOT_STORE_ENABLED")
+
+
+def enable(db: Session) -> HotStore:
+    """Load the store and follow visits recorded by other workers."""
+    check_settings()
+    # This worker's own visits come back too; the store ignores ids it already holds
+    visit_stream.hub.add_listener(_on_visit)
+    store.load(db)
+    return store
+
+
+def maintain() -> None:
+    store.maintain()
+
+
+def resync(db: Session) -> None:
+    """Reload if the bridge has reconnected since the last load, losing notifications in between."""
+    generation = visit_stream.bridge_generation()
+    if store.ready and generation is not None and generation != store.generation:
+        store.load(db)
+
+
+def _in_sync() -> bool:
+    # Other workers' visits stop arriving with the listener, and some are lost while it reconnects
+    generation = visit_stream.bridge_generation()
+    return generation is not None and generation == store.generation
+
+
+def record_visit(visit) -> None:
+    """Hold a committed visit (a PageMetric row or a compact-mode repeat)."""
+    if settings.HOT_STORE_ENABLED:
+        store.add(
+            visit.id, visit.url, visit.link_count, visit.word_count, visit.image_count, visit.datetime_visited
+        )
+
+
+def visits(url: str, limit: int, offset: int) -> Optional[List[HotVisit]]:
+    if not _in_sync():
+        return None
+    return store.visits(url, limit, offset)
+
+
+def latest(db: Session, url: str) -> Optional[Tuple[HotVisit, int]]:
+    if not _in_sync():
+        return None
+    return store.latest(db, url)
+
+
+def recent_counts(url: str, start: datetime, end: Optional[datetime]) -> Optional[np.ndarray]:
+    if not _in_sync():
+        return None
+    return store.recent_counts(url, start, end)
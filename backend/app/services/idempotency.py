@@ -0,0 +1,112 @@
+"""
+Replay cache for POST /visits keyed by the client's `Idempotency-Key` header.
+
+Each worker keeps recent keys in a bounded in-memory TTL store by default;
+`set_store` swaps in a shared backend (Redis, memcached, ...) implementing
+`IdempotencyStore`. The unique `page_metrics.idempotency_key` column is the
+last-resort guard when a retry misses the cache (other worker, evicted key).
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config.settings import settings
+from app.exceptions import IdempotencyKeyMismatchException, InvalidIdempotencyKeyException
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore(ABC):
+    """Interface for idempotency backends; values must be JSON-serializable."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The value stored under `key`, or None if absent or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store `value` under `key`, replacing any previous one."""
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Per-worker LRU store whose entries expire after `ttl_seconds`."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_store: IdempotencyStore = InMemoryIdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_MAX_KEYS,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+)
+
+
+def get_store() -> IdempotencyStore:
+    return _store
+
+
+def set_store(store: IdempotencyStore) -> None:
+    """Install a shared backend so retries landing on another worker also hit."""
+    global _store
+    _store = store
+
+
+def validate_key(key: str) -> str:
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise InvalidIdempotencyKeyException(MAX_KEY_LENGTH)
+    return key
+
+
+def fingerprint(payload: str) -> str:
+    """Hash of the request body, used to reject a key reused for a different request."""
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup(key: str, request_fingerprint: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the stored response for a repeated key, if any.
+
+    Raises:
+        IdempotencyKeyMismatchException: If the key was used for a different payload
+    """
+    entry = _store.get(key)
+    if entry is None:
+        return None
+    if entry["fingerprint"] != request_fingerprint:
+        raise IdempotencyKeyMismatchException()
+    return entry["response"]
+
+
+def remember(key: str, request_fingerprint: str, response: Dict[str, Any]) -> None:
+    _store.set(key, {"fingerprint": request_fingerprint, "response": response})
@@ -0,0 +1,193 @@
+"""
+In-memory Bloom filter of recorded URLs (KNOWN_URLS_FILTER_ENABLED).
+
+The extension asks for /metrics on every navigation, mostly for pages that
+were never recorded. With the filter on, a URL the filter has never seen is
+answered as unvisited without touching the database; a URL it may have seen
+(including KNOWN_URLS_FALSE_POSITIVE_RATE of the unseen ones) takes the usual
+query.
+
+The filter is built at startup from every URL with raw visits or rollups,
+and `create_page_visit` adds new URLs before committing them, so a URL is in
+this worker's filter before any read can find its row. Other workers' URLs
+arrive through the visit stream hub, which only hears them through
+VISIT_STREAM_PG_BRIDGE; startup fails without the bridge. While its listener
+is reconnecting, and after it reconnects until the filter is rebuilt
+(within VISIT_STREAM_RESYNC_SECONDS), notifications may have been lost, so
+every URL takes the query again rather than risk "never visited" for one
+another worker recorded. The filter is also rebuilt every
+KNOWN_URLS_REBUILD_SECONDS, resized to the current URL count.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+
+from app.config.logger import get_logger
+from app.config.settings import settings
+from app.models.page_metric_daily import PageMetricDaily
+from app.models.page_metrics import PageMetric
+from app.services import sharding, visit_stream
+
+logger = get_logger(__name__)
+
+_MASK64 = (1 << 64) - 1
+# A URL is recorded before its transaction commits; one recorded up to this long
+# before a rebuild's scan began may commit after the scan's snapshot
+_IN_FLIGHT_SECONDS = 60.0
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0  # Adds, including repeats; an upper bound on distinct items
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [((h1 + i * h2) & _MASK64) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class KnownUrls:
+    """The worker's URL filter; answers "maybe" until the first build finishes."""
+
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        self._pending: Optional[List[str]] = None  # URLs added while a build is scanning
+        self._recent: Deque[Tuple[float, str]] = deque()  # (monotonic time, URL) of recent adds
+        self._lock = threading.Lock()  # Bit updates are read-modify-write
+        self.generation: Optional[int] = None  # Bridge generation the filter was built under
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    @property
+    def nbytes(self) -> int:
+        current = self._filter
+        return len(current._bits) if current is not None else 0
+
+    def might_contain(self, url: str) -> bool:
+        """False only if `url` was certainly never recorded."""
+        current = self._filter
+        return current is None or url in current
+
+    def add(self, url: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(url)
+            if self._pending is not None:
+                self._pending.append(url)
+            self._recent.append((now, url))
+            while self._recent[0][0] < now - _IN_FLIGHT_SECONDS:
+                self._recent.popleft()
+
+    def build(self, db: Session) -> int:
+        """Rebuild from every shard, sized for the current URL count; returns that count."""
+        generation = visit_stream.bridge_generation()
+        with self._lock:
+            self._pending = []  # Before the scan, so nothing committed meanwhile is missed
+        try:
+            recorded = union(select(PageMetric.url), select(PageMetricDaily.url)).subquery()
+            count = sum(sharding.gather(db, lambda shard: shard.execute(
+                select(func.count()).select_from(recorded)
+            ).scalar()))
+            built = BloomFilter(
+                max(settings.KNOWN_URLS_MIN_CAPACITY, 2 * count), settings.KNOWN_URLS_FALSE_POSITIVE_RATE
+            )
+            build_lock = threading.Lock()
+
+            def load(shard: Session) -> None:
+                for url in shard.execute(select(recorded.c.url).execution_options(yield_per=10000)).scalars():
+                    with build_lock:
+                        built.add(url)
+
+            sharding.gather(db, load)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for url in self._pending:
+                built.add(url)
+            for _, url in self._recent:
+                built.add(url)
+            self._pending = None
+            self._filter = built
+            self.generation = generation
+        logger.info(f"Known-URL filter built: {count} URLs, {built.size // 8 // 1024} KiB, {built.hashes} hashes")
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._filter = None
+            self._pending = None
+            self._recent.clear()
+            self.generation = None
+
+
+urls = KnownUrls()
+
+
+def _on_visit(event) -> None:
+    urls.add(event["url"])
+
+
+def check_settings() -> None:
+    visit_stream.require_bridge("KNOWN_URLS_FILTER_ENABLED")
+
+
+def enable(db: Session) -> KnownUrls:
+    """Build the filter and follow visits announced by other workers."""
+    check_settings()
+    visit_stream.hub.add_listener(_on_visit)
+    urls.build(db)
+    return urls
+
+
+def rebuild(db: Session) -> None:
+    if urls.ready:
+        urls.build(db)
+
+
+def resync(db: Session) -> None:
+    """Rebuild if the bridge has reconnected since the last build, losing notifications in between."""
+    generation = visit_stream.bridge_generation()
+    if urls.ready and generation is not None and generation != urls.generation:
+        urls.build(db)
+
+
+def record(url: str) -> None:
+    """Note a URL about to be committed; call before the commit."""
+    if settings.KNOWN_URLS_FILTER_ENABLED:
+        urls.add(url)
+
+
+def might_contain(url: str) -> bool:
+    # Without the listener, or since it reconnected, another worker's new URL may be missing
+    generation = visit_stream.bridge_generation()
+    return generation is None or generation != urls.generation or urls.might_contain(url)
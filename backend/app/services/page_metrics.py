@@ -1,50 +1,54 @@
 from __future__ import annotations
 
+import heapq
+import time
+from functools import lru_cache
+from itertools import islice
 from datetime import datetime, timezone
-from typing import Optional, List
-from urllib.parse import urlparse, urlunparse
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
-from sqlalchemy import select, desc, func
+from sqlalchemy import Select, bindparam, select, desc, func, text, union_all
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 
-from app.models import page_metrics
+from app.config.settings import settings
+from app.models import page_metric_daily, page_metrics
+from app.models.page_visit_repeat import PageVisitRepeat
 from app.schemas import page_metric as page_metric_schemas
+from app.services import archive, dedup, heavy_hitters, hot_store, known_urls, search, sharding, visit_stream
 from app.utils.helpers import format_datetime
-from app.exceptions import DatabaseConnectionException
+from app.utils.urls import canonicalize_url, normalize_host, registrable_domain, split_host
+from app.exceptions import DatabaseConnectionException, IdempotencyKeyMismatchException, InvalidFieldsException
 
-# URL validation constants
-MAX_URL_LENGTH = 2048  # Standard max URL length
-MIN_URL_LENGTH = 1
+WARMUP_URL = "https://warmup.invalid"
 
+# Columns the history reads filter on; each gets its statements built once below
+LOOKUP_COLUMNS = ("url", "host", "domain")
 
-def _normalize_url(url: str) -> str:
-    """Normalize URL by removing trailing slash for consistent matching."""
-    return url.rstrip("/") if url != "/" else url
+VISIT_FIELDS = page_metric_schemas.VISIT_FIELDS
+METRICS_FIELDS = page_metric_schemas.METRICS_FIELDS
+# /metrics fields read from the latest visit row; visit_count comes from the count
+_METRICS_VISIT_COLUMNS = {
+    "url": "url", "link_count": "link_count", "word_count": "word_count",
+    "image_count": "image_count", "last_visited": "datetime_visited",
+}
 
 
-def _validate_url(url: str) -> None:
-    """Validate URL length and basic format."""
-    if not url or len(url) < MIN_URL_LENGTH:
-        raise ValueError(f"URL must be at least {MIN_URL_LENGTH} character long")
-    if len(url) > MAX_URL_LENGTH:
-        raise ValueError(f"URL exceeds maximum length of {MAX_URL_LENGTH} characters")
-    # Basic URL format validation
-    if not url.startswith(('http://', 'https://')):
-        raise ValueError("URL must start with http:// or https://")
+def _validate_tz_offset(tz_offset_hours: Optional[float]) -> None:
+    if tz_offset_hours is not None:
+        if not -12 <= tz_offset_hours <= 14:
+            raise ValueError("Timezone offset must be between -12 and +14 hours")
 
 
 def _format_page_visit(
     visit: page_metrics.PageMetric,
     tz_offset_hours: Optional[float] = None,
 ) -> page_metric_schemas.PageMetric:
-    # Ensure URL is normalized (without trailing slash)
-    url_normalized = str(visit.url).rstrip('/') or '/'
-    
+    # Stored URLs are canonical; the schema validator hits the canonicalization cache
     return page_metric_schemas.PageMetric.model_validate(
         {
             "id": visit.id,
-            "url": url_normalized,  # Pass normalized URL
+            "url": visit.url,
             "link_count": visit.link_count,
             "word_count": visit.word_count,
             "image_count": visit.image_count,
@@ -53,18 +57,69 @@ def _format_page_visit(
     )
 
 
+def _announce(db: Session, visit) -> None:
+    heavy_hitters.record_visit(visit)
+    hot_store.record_visit(visit)
+    search.record_visit(visit)
+    visit_stream.publish_visit(db, visit)
+
+
+def _record_repeat(
+    db: Session,
+    url: str,
+    host: Optional[str],
+    domain: Optional[str],
+    counts: dedup.Counts,
+    visited_at: datetime,
+) -> Optional[dedup.RepeatedVisit]:
+    """Store a timestamp-only repeat if `counts` match the URL's cached latest row."""
+    visit_id = dedup.cache.match(url, counts)
+    if visit_id is None:
+        return None
+    repeat = PageVisitRepeat(visit_id=visit_id, datetime_visited=visited_at)
+    db.add(repeat)
+    try:
+        db.commit()
+    except IntegrityError:
+        # The referenced row was rolled up by retention meanwhile; store a full row instead
+        db.rollback()
+        dedup.cache.forget(url)
+        return None
+    return dedup.RepeatedVisit(dedup.repeat_visit_id(repeat.id), url, host, domain, *counts, visited_at)
+
+
+def _stored_for_request(
+    visit: page_metrics.PageMetric,
+    url: str,
+    counts: dedup.Counts,
+    visited_at: Optional[datetime],
+) -> bool:
+    """Whether a stored row matches a request's URL, counts and (if it gave one) visit time."""
+    if (visit.url, visit.link_count, visit.word_count, visit.image_count) != (url, *counts):
+        return False
+    if visited_at is None:
+        return True  # The time was assigned server-side, so any stored time fits
+    stored = visit.datetime_visited
+    # Naive times are UTC, like stored visit times
+    if stored.tzinfo is None:
+        stored = stored.replace(tzinfo=timezone.utc)
+    if visited_at.tzinfo is None:
+        visited_at = visited_at.replace(tzinfo=timezone.utc)
+    return stored == visited_at
+
+
 def create_page_visit(
-    db: Session, visit_in: page_metric_schemas.PageMetricCreateDTO
+    db: Session,
+    visit_in: page_metric_schemas.PageMetricCreateDTO,
+    idempotency_key: Optional[str] = None,
 ) -> page_metric_schemas.PageMetric:
-    # Validate URL
-    url_str = str(visit_in.url)
-    _validate_url(url_str)
-    
-    # Validate timezone offset if provided
-    if visit_in.timezone_offset is not None:
-        if not -12 <= visit_in.timezone_offset <= 14:
-            raise ValueError("Timezone offset must be between -12 and +14 hours")
+    # Already canonical when it came through the DTO validator, so this is a cache hit
+    url_str = canonicalize_url(str(visit_in.url))
     
+    _validate_tz_offset(visit_in.timezone_offset)
+    # The URL's shard in sharded mode; announcements still go through `db`
+    store = sharding.session_for_url(db, url_str)
+
     try:
         # Parse the datetime string if provided
         if visit_in.datetime_visited:
@@ -79,92 +134,600 @@ def create_page_visit(
         else:
             dt_visited = datetime.now(timezone.utc)
         
+        host, domain = split_host(url_str)
+        counts = (visit_in.link_count, visit_in.word_count, visit_in.image_count)
+        # Retried requests always get a full row so their key is stored
+        if settings.VISIT_DEDUP_ENABLED and idempotency_key is None:
+            repeated = _record_repeat(store, url_str, host, domain, counts, dt_visited)
+            if repeated is not None:
+                _announce(db, repeated)
+                return _format_page_visit(repeated, visit_in.timezone_offset)
+
         visit = page_metrics.PageMetric(
-            url=url_str.rstrip('/') or '/',  # Remove trailing slash
+            url=url_str,
+            host=host,
+            domain=domain,
             datetime_visited=dt_visited,
             link_count=visit_in.link_count,
             word_count=visit_in.word_count,
             image_count=visit_in.image_count,
+            idempotency_key=idempotency_key,
         )
-        db.add(visit)
-        db.commit()
-        db.refresh(visit)
+        known_urls.record(url_str)
+        store.add(visit)
+        # Every column is set client-side and the id comes back from the flush,
+        # so no refresh round trip is needed
+        store.commit()
+        if settings.VISIT_DEDUP_ENABLED:
+            dedup.cache.remember(url_str, visit.id, counts)
+        _announce(db, visit)
         return _format_page_visit(visit, visit_in.timezone_offset)
+    except IntegrityError as e:
+        store.rollback()
+        existing = None
+        if idempotency_key is not None:
+            existing = store.execute(_BY_IDEMPOTENCY_KEY, {"key": idempotency_key}).scalar_one_or_none()
+        if existing is None:
+            # Not a duplicate key, so some other constraint failed
+            raise DatabaseConnectionException(f"Failed to create page visit: {str(e)}")
+        # A retry that missed the replay cache: return the row the first attempt stored,
+        # if it was stored for this same request
+        requested_time = dt_visited if visit_in.datetime_visited else None
+        if not _stored_for_request(existing, url_str, counts, requested_time):
+            raise IdempotencyKeyMismatchException()
+        return _format_page_visit(existing, visit_in.timezone_offset)
+    except OperationalError:
+        # Left for database_error_handler, which turns statement timeouts into a retryable 503
+        store.rollback()
+        raise
     except SQLAlchemyError as e:
-        db.rollback()
+        store.rollback()
         raise DatabaseConnectionException(f"Failed to create page visit: {str(e)}")
     except Exception as e:
-        db.rollback()
+        store.rollback()
         raise
 
 
+class _LatestVisit(NamedTuple):
+    url: str
+    link_count: int
+    word_count: int
+    image_count: int
+    datetime_visited: datetime
+    visit_count: int
+
+
+# Hot statements are built once with bound parameters instead of per call, so
+# each execution skips construct building and hits the compiled cache
+_BY_IDEMPOTENCY_KEY = select(page_metrics.PageMetric).where(
+    page_metrics.PageMetric.idempotency_key == bindparam("key")
+)
+
+
+def parse_fields(fields: Optional[str], allowed: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse a comma-separated `fields=` parameter into a subset of `allowed`.
+
+    Returns None (every field) when absent or empty; the subset keeps
+    `allowed`'s order, so equal selections share one cached statement.
+    """
+    names = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    if not names:
+        return None
+    unknown = sorted(names.difference(allowed))
+    if unknown:
+        raise InvalidFieldsException(unknown, allowed)
+    return tuple(name for name in allowed if name in names)
+
+
+def _visit_columns(fields: Tuple[str, ...] = VISIT_FIELDS) -> tuple:
+    """The columns a visit response needs; all in the covering url index, so reads skip the heap."""
+    raw = page_metrics.PageMetric
+    return tuple(getattr(raw, name) for name in fields)
+
+
+def _build_visits_stmt(column: str, fields: Tuple[str, ...] = VISIT_FIELDS) -> Select:
+    raw = page_metrics.PageMetric
+    return (
+        select(*_visit_columns(fields))
+        .where(getattr(raw, column) == bindparam("value"))
+        .order_by(desc(raw.datetime_visited))
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+
+def _build_logical_visits(column: str):
+    """Raw visits plus repeats expanded with their row's url and counts, as one subquery."""
+    raw = page_metrics.PageMetric
+    repeat = PageVisitRepeat
+    counts = (raw.link_count, raw.word_count, raw.image_count)
+    rows = select(*_visit_columns()).where(getattr(raw, column) == bindparam("value"))
+    repeats = (
+        select((-repeat.id).label("id"), raw.url, *counts, repeat.datetime_visited)
+        .join(raw, raw.id == repeat.visit_id)
+        .where(getattr(raw, column) == bindparam("value"))
+    )
+    return union_all(rows, repeats).subquery("visits")
+
+
+def _build_visits_with_repeats_stmt(column: str, fields: Tuple[str, ...] = VISIT_FIELDS) -> Select:
+    visits = _build_logical_visits(column)
+    return (
+        select(*(visits.c[name] for name in fields))
+        .order_by(desc(visits.c.datetime_visited))
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+
+def _build_latest_stmt(column: str, fields: Tuple[str, ...] = VISIT_FIELDS) -> Select:
+    raw = page_metrics.PageMetric
+    daily = page_metric_daily.PageMetricDaily
+    rolled_up_count = (
+        select(func.coalesce(func.sum(daily.visit_count), 0))
+        .where(getattr(daily, column) == bindparam("value"))
+        .scalar_subquery()
+    )
+    return (
+        select(
+            *_visit_columns(fields),
+            func.count(raw.id).over().label("visit_count"),
+            rolled_up_count.label("rolled_up_count"),
+        )
+        .where(getattr(raw, column) == bindparam("value"))
+        .order_by(desc(raw.datetime_visited))
+        .limit(1)
+    )
+
+
+def _build_latest_with_repeats_stmt(column: str, fields: Tuple[str, ...] = VISIT_FIELDS) -> Select:
+    raw = page_metrics.PageMetric
+    daily = page_metric_daily.PageMetricDaily
+    visits = _build_logical_visits(column)
+    rolled_up_count = (
+        select(func.coalesce(func.sum(daily.visit_count), 0))
+        .where(getattr(daily, column) == bindparam("value"))
+        .scalar_subquery()
+    )
+    return (
+        select(
+            *(visits.c[name] for name in fields),
+            func.count().over().label("visit_count"),
+            rolled_up_count.label("rolled_up_count"),
+        )
+        .select_from(visits)
+        .order_by(desc(visits.c.datetime_visited))
+        .limit(1)
+    )
+
+
+def _build_latest_rollup_stmt(column: str) -> Select:
+    daily = page_metric_daily.PageMetricDaily
+    return (
+        select(daily, func.sum(daily.visit_count).over().label("visit_count"))
+        .where(getattr(daily, column) == bindparam("value"))
+        .order_by(desc(daily.last_visited))
+        .limit(1)
+    )
+
+
+def _build_changes_stmt() -> Select:
+    raw = page_metrics.PageMetric
+    return (
+        select(raw)
+        .where(raw.id > bindparam("since"), raw.id <= bindparam("until"))
+        .order_by(raw.id)
+        .limit(bindparam("limit"))
+    )
+
+
+def _build_repeat_changes_stmt() -> Select:
+    raw = page_metrics.PageMetric
+    repeat = PageVisitRepeat
+    return (
+        select(
+            (-repeat.id).label("id"), raw.url, raw.link_count, raw.word_count, raw.image_count,
+            repeat.datetime_visited,
+        )
+        .join(raw, raw.id == repeat.visit_id)
+        .where(repeat.id > bindparam("since"), repeat.id <= bindparam("until"))
+        .order_by(repeat.id)
+        .limit(bindparam("limit"))
+    )
+
+
+_VISITS_STMTS: Dict[str, Select] = {c: _build_visits_stmt(c) for c in LOOKUP_COLUMNS}
+_LATEST_STMTS: Dict[str, Select] = {c: _build_latest_stmt(c) for c in LOOKUP_COLUMNS}
+_VISITS_WITH_REPEATS_STMTS: Dict[str, Select] = {
+    c: _build_visits_with_repeats_stmt(c) for c in LOOKUP_COLUMNS
+}
+_LATEST_WITH_REPEATS_STMTS: Dict[str, Select] = {
+    c: _build_latest_with_repeats_stmt(c) for c in LOOKUP_COLUMNS
+}
+_LATEST_ROLLUP_STMTS: Dict[str, Select] = {c: _build_latest_rollup_stmt(c) for c in LOOKUP_COLUMNS}
+_CHANGES_STMT = _build_changes_stmt()
+_REPEAT_CHANGES_STMT = _build_repeat_changes_stmt()
+
+# Ids any writer could still commit below; see _settled_ids
+_LAST_IDS = text(
+    "SELECT coalesce(pg_sequence_last_value(pg_get_serial_sequence('page_metrics', 'id')::regclass), 0), "
+    "coalesce(pg_sequence_last_value(pg_get_serial_sequence('page_visit_repeats', 'id')::regclass), 0)"
+)
+_ID_HOLDERS = text(
+    "SELECT virtualtransaction FROM pg_locks "
+    "WHERE locktype = 'relation' AND mode = 'RowExclusiveLock' AND granted "
+    "AND relation IN ('page_metrics'::regclass, 'page_visit_repeats'::regclass) "
+    "AND pid <> pg_backend_pid()"
+)
+_SETTLE_POLL_SECONDS = 0.01
+_UNBOUNDED = 2**63 - 1
+
+
+@lru_cache(maxsize=None)
+def _projected_stmt(
+    builder: Callable[[str, Tuple[str, ...]], Select], column: str, fields: Tuple[str, ...]
+) -> Select:
+    """A hot statement narrowed to a `fields=` subset; built once per subset, like the full ones."""
+    return builder(column, fields)
+
+
+def _fetch_visits(
+    db: Session, column: str, value: str, limit: int, offset: int, fields: Optional[Tuple[str, ...]] = None
+) -> List:
+    params = {"value": value, "limit": limit, "offset": offset}
+    if dedup.active():
+        if fields is not None:
+            return db.execute(_projected_stmt(_build_visits_with_repeats_stmt, column, fields), params).all()
+        return db.execute(_VISITS_WITH_REPEATS_STMTS[column], params).all()
+    if fields is not None:
+        return db.execute(_projected_stmt(_build_visits_stmt, column, fields), params).all()
+    return db.execute(_VISITS_STMTS[column], params).all()
+
+
+def _project(row, fields: Tuple[str, ...], tz_offset_hours: Optional[float]) -> Dict[str, Any]:
+    """The `fields` of a visit row as a response dict, skipping schema validation."""
+    projected = {}
+    for name in fields:
+        value = getattr(row, name)
+        projected[name] = format_datetime(value, tz_offset_hours) if name == "datetime_visited" else value
+    return projected
+
+
+def _query_visits(
+    db: Session,
+    column: str,
+    value: str,
+    limit: int,
+    offset: int,
+    tz_offset_hours: Optional[float],
+) -> List[page_metric_schemas.PageMetric]:
+    """Most recent raw visits whose `column` equals `value`, newest first."""
+    if column == "url" or not sharding.enabled():
+        visits = _fetch_visits(sharding.session_for_url(db, value), column, value, limit, offset)
+    else:
+        # The page lies within the first limit + offset visits of each shard
+        pages = sharding.gather(db, lambda shard: _fetch_visits(shard, column, value, limit + offset, 0))
+        newest_first = heapq.merge(*pages, key=lambda visit: visit.datetime_visited, reverse=True)
+        visits = list(islice(newest_first, offset, offset + limit))
+    return [_format_page_visit(visit, tz_offset_hours) for visit in visits]
+
+
+def _query_latest_with_count(
+    db: Session, column: str, value: str, fields: Optional[Tuple[str, ...]] = None
+) -> Optional[_LatestVisit]:
+    """Latest visit whose `column` equals `value` and the total number of visits, across shards."""
+    if column == "url":
+        return _query_shard_latest(sharding.session_for_url(db, value), column, value, fields)
+    found = [
+        latest for latest in sharding.gather(db, lambda shard: _query_shard_latest(shard, column, value))
+        if latest is not None
+    ]
+    if not found:
+        return None
+    latest = max(found, key=lambda visit: visit.datetime_visited)
+    return latest._replace(visit_count=sum(visit.visit_count for visit in found))
+
+
+def _query_shard_latest(
+    db: Session, column: str, value: str, fields: Optional[Tuple[str, ...]] = None
+) -> Optional[_LatestVisit]:
+    """
+    Latest visit whose `column` equals `value` and the total number of visits.
+
+    With compact storage active, repeats count as visits and the latest
+    one may be a repeat (carrying its referenced row's counts).
+
+    The total includes visits the retention job has rolled up into
+    `page_metric_daily`; if every raw row is gone, the latest visit comes
+    from the newest rollup.
+
+    `fields` narrows the visit columns read; the ones left out are None.
+    """
+    if fields is None:
+        stmt = (_LATEST_WITH_REPEATS_STMTS if dedup.active() else _LATEST_STMTS)[column]
+    else:
+        builder = _build_latest_with_repeats_stmt if dedup.active() else _build_latest_stmt
+        stmt = _projected_stmt(builder, column, fields)
+    result = db.execute(stmt, {"value": value}).first()
+    if result is not None:
+        row = result._mapping
+        return _LatestVisit(
+            row.get("url"), row.get("link_count"), row.get("word_count"), row.get("image_count"),
+            row.get("datetime_visited"), result.visit_count + result.rolled_up_count,
+        )
+
+    result = db.execute(_LATEST_ROLLUP_STMTS[column], {"value": value}).first()
+    if result is None:
+        return None
+    rollup, visit_count = result
+    return _LatestVisit(
+        rollup.url, rollup.last_link_count, rollup.last_word_count, rollup.last_image_count,
+        rollup.last_visited, visit_count,
+    )
+
+
+def _domain_key(name: str) -> Tuple[str, str]:
+    """
+    Match a registrable domain with all its subdomains, or one exact host.
+
+    "example.com" covers www.example.com and blog.example.com;
+    "blog.example.com" covers only that host.
+    """
+    host = normalize_host(name)
+    if registrable_domain(host) == host:
+        return "domain", host
+    return "host", host
+
+
 def get_visits_for_url(
     db: Session, 
     url: str, 
     limit: int = 50, 
     offset: int = 0,
-    tz_offset_hours: Optional[float] = None
-) -> List[page_metric_schemas.PageMetric]:
-    # Validate URL
-    _validate_url(url)
-    
-    # Validate timezone offset if provided
-    if tz_offset_hours is not None:
-        if not -12 <= tz_offset_hours <= 14:
-            raise ValueError("Timezone offset must be between -12 and +14 hours")
-    
-    normalized_url = str(url).rstrip('/') or '/'
-    stmt = (
-        select(page_metrics.PageMetric)
-        .where(page_metrics.PageMetric.url == normalized_url)
-        .order_by(desc(page_metrics.PageMetric.datetime_visited))
-        .limit(limit)
-        .offset(offset)
-    )
-    visits = db.execute(stmt).scalars().all()
-    return [_format_page_visit(visit, tz_offset_hours) for visit in visits]
+    tz_offset_hours: Optional[float] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Union[List[page_metric_schemas.PageMetric], List[Dict[str, Any]]]:
+    """
+    Visits to `url`, newest first.
 
+    With `fields` (see `parse_fields`), only those columns are read and each
+    visit is a plain dict of them instead of a validated schema object.
+    A page within the URL's recent visits comes from the hot store, if on.
+    """
+    normalized_url = canonicalize_url(url)
+    _validate_tz_offset(tz_offset_hours)
+    if not known_urls.might_contain(normalized_url):
+        return []
 
-def get_latest_metrics_for_url(
-    db: Session, url: str, tz_offset_hours: Optional[float] = None
-) -> Optional[page_metric_schemas.PageMetrics]:
-    # Validate URL
-    _validate_url(url)
-    
-    # Validate timezone offset if provided
-    if tz_offset_hours is not None:
-        if not -12 <= tz_offset_hours <= 14:
-            raise ValueError("Timezone offset must be between -12 and +14 hours")
-    
-    normalized_url = str(url).rstrip('/') or '/'
-    
-    # Replace deprecated db.query() with db.execute(select())
-    stmt = (
-        select(
-            page_metrics.PageMetric,
-            func.count(page_metrics.PageMetric.id)
-            .over(partition_by=page_metrics.PageMetric.url)
-            .label("visit_count"),
-        )
-        .where(page_metrics.PageMetric.url == normalized_url)
-        .order_by(desc(page_metrics.PageMetric.datetime_visited))
-        .limit(1)
+    recent = hot_store.visits(normalized_url, limit, offset)
+    if recent is not None:
+        if fields is not None:
+            return [_project(visit, fields, tz_offset_hours) for visit in recent]
+        return [_format_page_visit(visit, tz_offset_hours) for visit in recent]
+
+    session = sharding.session_for_url(db, normalized_url)
+    if settings.ARCHIVE_ENABLED:
+        rows = _with_archived(session, normalized_url, limit, offset, fields)
+    else:
+        rows = _fetch_visits(session, "url", normalized_url, limit, offset, fields)
+    if fields is not None:
+        return [_project(row, fields, tz_offset_hours) for row in rows]
+    return [_format_page_visit(row, tz_offset_hours) for row in rows]
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes that were stored as UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _with_archived(
+    db: Session,
+    url: str,
+    limit: int,
+    offset: int,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> List:
+    """
+    A page of the URL's database and archived visits together, newest first.
+
+    Retention keeps a raw row while repeats still refer to it, so an archived
+    visit can be newer than one still in the database; the page is a merge of
+    both by visit time, unless the archive holds nothing newer than the page.
+    """
+    if fields is not None:
+        # The merge orders by these, whatever the response includes
+        fields = tuple(name for name in VISIT_FIELDS if name in fields or name in ("id", "datetime_visited"))
+    rows = _fetch_visits(db, "url", url, limit, offset, fields)
+    newest_archived = archive.store.newest()
+    if newest_archived is None or (len(rows) == limit and _as_utc(rows[-1].datetime_visited) > newest_archived):
+        return rows
+    wanted = offset + limit
+    stored = rows if offset == 0 else _fetch_visits(db, "url", url, wanted, 0, fields)
+    archived = archive.store.visits_for_url(url, wanted, 0)
+    newest_first = heapq.merge(
+        stored, archived, key=lambda visit: _as_utc(visit.datetime_visited), reverse=True
     )
-    result = db.execute(stmt).first()
+    return list(islice(newest_first, offset, wanted))
 
-    if result is None:
+
+def get_latest_metrics_for_url(
+    db: Session,
+    url: str,
+    tz_offset_hours: Optional[float] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Union[page_metric_schemas.PageMetrics, Dict[str, Any], None]:
+    """
+    Latest metrics and visit count for `url`, or None if it was never visited.
+
+    With `fields` (see `parse_fields`), only the columns those need are read
+    and the result is a plain dict of them. A URL with recent visits is
+    answered from the hot store, if on.
+    """
+    normalized_url = canonicalize_url(url)
+    _validate_tz_offset(tz_offset_hours)
+    if not known_urls.might_contain(normalized_url):
+        return None  # Never recorded, so no rows or rollups either
+
+    recent = hot_store.latest(db, normalized_url)
+    if recent is not None:
+        visit, visit_count = recent
+        latest = _LatestVisit(*visit[1:], visit_count)
+    elif fields is None:
+        latest = _query_latest_with_count(db, "url", normalized_url)
+    else:
+        needed = {_METRICS_VISIT_COLUMNS[name] for name in fields if name in _METRICS_VISIT_COLUMNS}
+        columns = tuple(name for name in VISIT_FIELDS if name in needed)
+        latest = _query_latest_with_count(db, "url", normalized_url, columns)
+    if latest is None:
         return None
 
-    visit_obj, visit_count = result
-    last_visited_str = format_datetime(visit_obj.datetime_visited, tz_offset_hours)
+    if fields is not None:
+        values = latest._asdict()
+        projected = {name: values[_METRICS_VISIT_COLUMNS.get(name, name)] for name in fields}
+        if "last_visited" in projected:
+            projected["last_visited"] = format_datetime(latest.datetime_visited, tz_offset_hours)
+        return projected
+
+    last_visited_str = format_datetime(latest.datetime_visited, tz_offset_hours)
 
     return page_metric_schemas.PageMetrics.model_validate(
         {
-            "url": visit_obj.url,
-            "link_count": visit_obj.link_count,
-            "word_count": visit_obj.word_count,
-            "image_count": visit_obj.image_count,
+            "url": latest.url,
+            "link_count": latest.link_count,
+            "word_count": latest.word_count,
+            "image_count": latest.image_count,
             "last_visited": last_visited_str,
-            "visit_count": visit_count,
+            "visit_count": latest.visit_count,
         }
     )
+
+
+def get_visits_for_domain(
+    db: Session,
+    name: str,
+    limit: int = 50,
+    offset: int = 0,
+    tz_offset_hours: Optional[float] = None,
+) -> List[page_metric_schemas.PageMetric]:
+    column, value = _domain_key(name)
+    _validate_tz_offset(tz_offset_hours)
+
+    return _query_visits(db, column, value, limit, offset, tz_offset_hours)
+
+
+def get_latest_metrics_for_domain(
+    db: Session, name: str, tz_offset_hours: Optional[float] = None
+) -> Optional[page_metric_schemas.DomainMetrics]:
+    column, value = _domain_key(name)
+    _validate_tz_offset(tz_offset_hours)
+
+    latest = _query_latest_with_count(db, column, value)
+    if latest is None:
+        return None
+
+    return page_metric_schemas.DomainMetrics.model_validate(
+        {
+            "domain": value,
+            "last_url": latest.url,
+            "last_visited": format_datetime(latest.datetime_visited, tz_offset_hours),
+            "visit_count": latest.visit_count,
+        }
+    )
+
+
+def _settled_ids(db: Session) -> Optional[Tuple[int, int]]:
+    """
+    Visit and repeat ids up to which no lower id can still commit, or None if
+    the writes holding one are still open after VISIT_CHANGES_SETTLE_SECONDS.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        # SQLite has a single writer, so ids become visible in order
+        return _UNBOUNDED, _UNBOUNDED
+    # A writer holds its table lock from before nextval() to commit; it has no xid, and so
+    # does not hold back a snapshot xmin, until its row is written. Every open transaction
+    # that drew an id up to these is among the holders listed after them
+    last_visit, last_repeat = db.execute(_LAST_IDS).one()
+    holders = set(db.execute(_ID_HOLDERS).scalars())
+    deadline = time.monotonic() + settings.VISIT_CHANGES_SETTLE_SECONDS
+    while holders:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(_SETTLE_POLL_SECONDS)
+        holders &= set(db.execute(_ID_HOLDERS).scalars())
+    return last_visit, last_repeat
+
+
+def get_visit_changes(
+    db: Session,
+    since: int = 0,
+    limit: int = 500,
+    tz_offset_hours: Optional[float] = None,
+    since_repeat: int = 0,
+) -> page_metric_schemas.VisitChanges:
+    """
+    Visits recorded after cursors `since` and `since_repeat`, across all URLs.
+
+    The cursors are the id watermarks of the last visit and of the last
+    compact-mode repeat returned; repeats have their own ids, so each table
+    is followed by its own cursor, and a page merges both oldest visit first.
+    On Postgres a page ends at the ids drawn before the call, once every
+    write that held one of them has finished, so a lower id committing later
+    is never skipped; if those writes are still open after
+    VISIT_CHANGES_SETTLE_SECONDS the page is empty and the cursors stay.
+    Visits already rolled up by retention are not in the feed.
+    """
+    if since < 0 or since_repeat < 0:
+        raise ValueError("Cursor must be non-negative")
+    if sharding.enabled():
+        # Ids are not assigned in insert order across shards, so one watermark cannot work
+        raise ValueError("The change feed is not available with DATABASE_SHARD_URLS")
+    _validate_tz_offset(tz_offset_hours)
+
+    settled = _settled_ids(db)
+    if settled is None:
+        return page_metric_schemas.VisitChanges(
+            changes=[], next_cursor=since, next_repeat_cursor=since_repeat, has_more=False
+        )
+    until, until_repeat = settled
+    visits = db.execute(_CHANGES_STMT, {"since": since, "until": until, "limit": limit + 1}).all()
+    repeats = []
+    if dedup.active():
+        repeats = db.execute(
+            _REPEAT_CHANGES_STMT, {"since": since_repeat, "until": until_repeat, "limit": limit + 1}
+        ).all()
+
+    changes = []
+    next_cursor, next_repeat_cursor = since, since_repeat
+    # Each table stays in id order, so the cursors cover exactly what was returned
+    merged = heapq.merge(
+        ((row[0], False) for row in visits),
+        ((row, True) for row in repeats),
+        key=lambda entry: entry[0].datetime_visited,
+    )
+    for visit, repeated in islice(merged, limit):
+        changes.append(_format_page_visit(visit, tz_offset_hours))
+        if repeated:
+            next_repeat_cursor = -visit.id
+        else:
+            next_cursor = visit.id
+    has_more = len(visits) + len(repeats) > limit
+    return page_metric_schemas.VisitChanges(
+        changes=changes, next_cursor=next_cursor, next_repeat_cursor=next_repeat_cursor, has_more=has_more
+    )
+
+
+def warm_up(db: Session) -> None:
+    """Run the hot read queries once so their compiled forms are cached before traffic."""
+    # Decides which statement variants the reads use, so it runs first
+    dedup.detect_repeats(db)
+    get_latest_metrics_for_url(db, WARMUP_URL)
+    get_visits_for_url(db, WARMUP_URL, limit=1)
+    get_latest_metrics_for_domain(db, "warmup.invalid")
+    get_visits_for_domain(db, "warmup.invalid", limit=1)
+    if not sharding.enabled():
+        get_visit_changes(db, since=2**31 - 1, limit=1, since_repeat=2**31 - 1)
+    for session in sharding.all_sessions(db):
+        session.rollback()
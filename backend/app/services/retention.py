@@ -0,0 +1,269 @@
+"""
+Retention: roll raw visits older than RETENTION_RAW_DAYS into daily rollups.
+
+Runs from the lifespan scheduler when RETENTION_ENABLED is set, or by hand:
+
+    python -m app.services.retention --days 90 --batch-size 1000
+
+Each batch deletes up to `batch_size` raw rows (RETURNING their values) and
+folds exactly those rows into `page_metric_daily` in the same transaction,
+so concurrent runs on several workers never count a visit twice and locks
+are held only briefly.
+
+Compact-mode repeats are rolled up the same way, using the counts of the row
+they refer to; a raw row is only removed once no repeats refer to it.
+
+With ARCHIVE_ENABLED the removed visits are also kept in the cold archive
+(see app.services.archive), committed together with each batch.
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config.logger import get_logger
+from app.config.settings import settings
+from app.models.page_metric_daily import PageMetricDaily
+from app.models.page_metrics import PageMetric
+from app.models.page_visit_repeat import PageVisitRepeat
+from app.services import archive, dedup, sharding
+
+logger = get_logger(__name__)
+
+METRICS = ("link_count", "word_count", "image_count")
+MAX_CONFLICT_RETRIES = 3
+
+
+class RetentionResult(NamedTuple):
+    rows_rolled_up: int
+    batches: int
+
+
+class _RepeatRow(NamedTuple):
+    id: int  # Public (negative) id of the repeat
+    url: str
+    host: Optional[str]
+    domain: Optional[str]
+    datetime_visited: datetime
+    link_count: int
+    word_count: int
+    image_count: int
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes that were stored as UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _fold(rollup: PageMetricDaily, row) -> None:
+    """Add one raw visit to a rollup row."""
+    rollup.visit_count += 1
+    for metric in METRICS:
+        value = getattr(row, metric)
+        setattr(rollup, f"{metric}_min", min(getattr(rollup, f"{metric}_min"), value))
+        setattr(rollup, f"{metric}_max", max(getattr(rollup, f"{metric}_max"), value))
+        setattr(rollup, f"{metric}_sum", getattr(rollup, f"{metric}_sum") + value)
+    visited = _as_utc(row.datetime_visited)
+    if visited >= _as_utc(rollup.last_visited):
+        rollup.last_visited = visited
+        rollup.last_link_count = row.link_count
+        rollup.last_word_count = row.word_count
+        rollup.last_image_count = row.image_count
+
+
+def _new_rollup(row, day: date) -> PageMetricDaily:
+    values = {"url": row.url, "host": row.host, "domain": row.domain, "day": day, "visit_count": 1}
+    for metric in METRICS:
+        value = getattr(row, metric)
+        values.update({f"{metric}_min": value, f"{metric}_max": value, f"{metric}_sum": value})
+    return PageMetricDaily(
+        **values,
+        last_visited=_as_utc(row.datetime_visited),
+        last_link_count=row.link_count,
+        last_word_count=row.word_count,
+        last_image_count=row.image_count,
+    )
+
+
+def _fold_rows(db: Session, rows) -> None:
+    rollups: Dict[Tuple[str, date], PageMetricDaily] = {}
+    for row in rows:
+        key = (row.url, _as_utc(row.datetime_visited).date())
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = db.execute(
+                select(PageMetricDaily)
+                .where(PageMetricDaily.url == key[0], PageMetricDaily.day == key[1])
+                .with_for_update()
+            ).scalar_one_or_none()
+            if rollup is None:
+                rollups[key] = _new_rollup(row, key[1])
+                db.add(rollups[key])
+                continue
+            rollups[key] = rollup
+        _fold(rollup, row)
+
+
+def _archived(rows) -> list:
+    return [
+        archive.ArchivedVisit(
+            row.id, row.url, row.link_count, row.word_count, row.image_count, row.datetime_visited
+        )
+        for row in rows
+    ]
+
+
+def _roll_up_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    ids = db.execute(
+        select(PageMetric.id)
+        .where(
+            PageMetric.datetime_visited < cutoff,
+            ~exists().where(PageVisitRepeat.visit_id == PageMetric.id),
+        )
+        .order_by(PageMetric.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    # Only rows this transaction actually deleted are folded in
+    deleted = db.execute(
+        delete(PageMetric)
+        .where(PageMetric.id.in_(ids))
+        .returning(
+            PageMetric.id, PageMetric.url, PageMetric.host, PageMetric.domain, PageMetric.datetime_visited,
+            PageMetric.link_count, PageMetric.word_count, PageMetric.image_count,
+        )
+    ).all()
+    _fold_rows(db, deleted)
+    archive.commit_archiving(db, _archived(deleted))
+    return len(deleted)
+
+
+def _roll_up_repeats_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    ids = db.execute(
+        select(PageVisitRepeat.id)
+        .where(PageVisitRepeat.datetime_visited < cutoff)
+        .order_by(PageVisitRepeat.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    deleted = db.execute(
+        delete(PageVisitRepeat)
+        .where(PageVisitRepeat.id.in_(ids))
+        .returning(PageVisitRepeat.id, PageVisitRepeat.visit_id, PageVisitRepeat.datetime_visited)
+    ).all()
+    # The referenced rows cannot go away while these repeats still existed
+    visit_ids = {visit_id for _, visit_id, _ in deleted}
+    referenced = {
+        row.id: row
+        for row in db.execute(
+            select(
+                PageMetric.id, PageMetric.url, PageMetric.host, PageMetric.domain,
+                PageMetric.link_count, PageMetric.word_count, PageMetric.image_count,
+            ).where(PageMetric.id.in_(visit_ids))
+        ).all()
+    }
+    rows = []
+    for repeat_id, visit_id, visited in deleted:
+        base = referenced[visit_id]
+        rows.append(_RepeatRow(
+            dedup.repeat_visit_id(repeat_id), base.url, base.host, base.domain, visited,
+            base.link_count, base.word_count, base.image_count,
+        ))
+    _fold_rows(db, rows)
+    archive.commit_archiving(db, _archived(rows))
+    return len(deleted)
+
+
+def roll_up_old_visits(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> RetentionResult:
+    """
+    Move raw visits from before the retention cutoff into daily rollups.
+
+    The cutoff is aligned to midnight UTC so a day is only ever rolled up
+    once it is entirely outside the raw window.
+    """
+    older_than_days = older_than_days if older_than_days is not None else settings.RETENTION_RAW_DAYS
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    if older_than_days < 1:
+        raise ValueError("Retention must keep at least 1 day of raw visits")
+
+    now = now or datetime.now(timezone.utc)
+    cutoff_day = now.astimezone(timezone.utc).date() - timedelta(days=older_than_days)
+    cutoff = datetime.combine(cutoff_day, time.min, tzinfo=timezone.utc)
+
+    # Each batch selects its rows before deleting them
+    db.info["read_then_write"] = True
+    total = batches = conflicts = 0
+    while True:
+        try:
+            # Repeats first, so the rows they refer to become eligible
+            rolled = _roll_up_repeats_batch(db, cutoff, batch_size)
+            if not rolled:
+                rolled = _roll_up_batch(db, cutoff, batch_size)
+        except IntegrityError:
+            # Another worker created the same (url, day) rollup first, or a new repeat
+            # now refers to a row in this batch; retry the batch
+            db.rollback()
+            conflicts += 1
+            if conflicts > MAX_CONFLICT_RETRIES:
+                raise
+            continue
+        except Exception:
+            db.rollback()
+            raise
+        if not rolled:
+            break
+        total += rolled
+        batches += 1
+
+    if total:
+        logger.info(f"Rolled up {total} visits older than {cutoff_day} in {batches} batches")
+    return RetentionResult(total, batches)
+
+
+def roll_up_all(db: Session, **options) -> RetentionResult:
+    """Run `roll_up_old_visits` on every shard, after settling interrupted archive batches."""
+    if settings.ARCHIVE_ENABLED:
+        archive.store.recover(db)
+    results = sharding.gather(db, lambda shard: roll_up_old_visits(shard, **options))
+    return RetentionResult(
+        sum(result.rows_rolled_up for result in results), sum(result.batches for result in results)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Roll old raw visits into daily aggregates.")
+    parser.add_argument("--days", type=int, default=settings.RETENTION_RAW_DAYS,
+                        help="Keep raw visits for this many days")
+    parser.add_argument("--batch-size", type=int, default=settings.RETENTION_BATCH_SIZE,
+                        help="Rows deleted per transaction")
+    args = parser.parse_args()
+
+    from app.config.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        result = roll_up_all(db, older_than_days=args.days, batch_size=args.batch_size)
+    finally:
+        sharding.close_sessions(db)
+        db.close()
+    print(f"Rolled up {result.rows_rolled_up} visits in {result.batches} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Prefix and substring search over visited URLs.
+
+On Postgres the SQL path is served by the `text_pattern_ops` (prefix) and
+`pg_trgm` GIN (substring) indexes on `page_metrics.url`. SQLite has neither,
+so deployments there can enable SEARCH_IN_PROCESS_INDEX to answer searches
+from an in-memory sorted URL list plus trigram postings instead.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import desc, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.constants import MAX_URL_LENGTH
+from app.models import page_metrics
+from app.schemas import search as search_schemas
+from app.services import sharding
+from app.utils.helpers import format_datetime
+
+MODE_PREFIX = "prefix"
+MODE_SUBSTRING = "substring"
+MODES = (MODE_PREFIX, MODE_SUBSTRING)
+LIKE_ESCAPE = "\\"
+
+# (url, visit_count, last_visited)
+SearchRow = Tuple[str, int, datetime]
+
+
+def _as_utc_naive(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _escape_like(value: str) -> str:
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", LIKE_ESCAPE + "%")
+        .replace("_", LIKE_ESCAPE + "_")
+    )
+
+
+def _prefix_candidates(query: str) -> List[str]:
+    """
+    Expand a typed prefix into the stored URL prefixes it may refer to.
+
+    Stored URLs are canonical (lowercase scheme and host), so the host part is
+    lowercased; a prefix without a scheme is tried under http(s) and www.
+    """
+    scheme, sep, rest = query.partition("://")
+    if not sep:
+        scheme, rest = "", query
+    host, slash, path = rest.partition("/")
+    rest = host.lower() + slash + path
+    if scheme:
+        return [f"{scheme.lower()}://{rest}"]
+    prefixes = [f"https://{rest}", f"http://{rest}"]
+    if not rest.startswith("www."):
+        prefixes += [f"https://www.{rest}", f"http://www.{rest}"]
+    return prefixes
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UrlIndex:
+    """In-process prefix/substring index of distinct visited URLs with visit stats."""
+
+    def __init__(self):
+        self._sorted_urls: List[str] = []
+        self._stats: Dict[str, List] = {}  # url -> [visit_count, last_visited]
+        self._postings: Dict[str, Set[str]] = {}  # trigram of lowercased url -> urls
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def add(self, url: str, visited_at: datetime, count: int = 1) -> None:
+        visited_at = _as_utc_naive(visited_at)
+        with self._lock:
+            stats = self._stats.get(url)
+            if stats is not None:
+                stats[0] += count
+                stats[1] = max(stats[1], visited_at)
+                return
+            self._stats[url] = [count, visited_at]
+            bisect.insort(self._sorted_urls, url)
+            for gram in _trigrams(url.lower()):
+                self._postings.setdefault(gram, set()).add(url)
+
+    def load(self, db: Session) -> None:
+        """Rebuild from the table (one aggregate scan per shard)."""
+        stmt = select(
+            page_metrics.PageMetric.url,
+            func.count(page_metrics.PageMetric.id),
+            func.max(page_metrics.PageMetric.datetime_visited),
+        ).group_by(page_metrics.PageMetric.url)
+        shards = sharding.gather(db, lambda shard: shard.execute(stmt).all())
+        with self._lock:
+            self._sorted_urls, self._stats, self._postings = [], {}, {}
+        for rows in shards:
+            for url, count, last_visited in rows:
+                self.add(url, last_visited, count)
+
+    def _prefix_matches(self, prefixes: Iterable[str]) -> Set[str]:
+        matches: Set[str] = set()
+        for prefix in prefixes:
+            start = bisect.bisect_left(self._sorted_urls, prefix)
+            for url in self._sorted_urls[start:]:
+                if not url.startswith(prefix):
+                    break
+                matches.add(url)
+        return matches
+
+    def _substring_matches(self, query: str) -> Iterable[str]:
+        needle = query.lower()
+        grams = _trigrams(needle)
+        if not grams:
+            return (url for url in self._stats if needle in url.lower())
+        postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+        candidates = set.intersection(*postings) if postings[0] else set()
+        return (url for url in candidates if needle in url.lower())
+
+    def search(self, query: str, mode: str, limit: int) -> List[SearchRow]:
+        with self._lock:
+            if mode == MODE_PREFIX:
+                matches: Iterable[str] = self._prefix_matches(_prefix_candidates(query))
+            else:
+                matches = self._substring_matches(query)
+            ranked = heapq.nlargest(
+                limit, matches, key=lambda url: (self._stats[url][1], self._stats[url][0])
+            )
+            return [(url, self._stats[url][0], self._stats[url][1]) for url in ranked]
+
+
+# Set by enable_index() when SEARCH_IN_PROCESS_INDEX is on
+index: Optional[UrlIndex] = None
+
+
+def enable_index(db: Session) -> UrlIndex:
+    global index
+    built = UrlIndex()
+    built.load(db)
+    index = built
+    return built
+
+
+def record_visit(visit) -> None:
+    if index is not None:
+        index.add(visit.url, visit.datetime_visited)
+
+
+def _search_sql(db: Session, query: str, mode: str, limit: int) -> List[SearchRow]:
+    url_col = page_metrics.PageMetric.url
+    if mode == MODE_PREFIX:
+        condition = or_(
+            *(url_col.like(_escape_like(p) + "%", escape=LIKE_ESCAPE) for p in _prefix_candidates(query))
+        )
+    else:
+        condition = url_col.ilike(f"%{_escape_like(query)}%", escape=LIKE_ESCAPE)
+
+    last_visited = func.max(page_metrics.PageMetric.datetime_visited)
+    visit_count = func.count(page_metrics.PageMetric.id)
+    stmt = (
+        select(url_col, visit_count, last_visited)
+        .where(condition)
+        .group_by(url_col)
+        .order_by(desc(last_visited), desc(visit_count))
+        .limit(limit)
+    )
+    # A URL lives on one shard, so each shard's top rows are final and only need merging
+    shards = sharding.gather(db, lambda shard: [tuple(row) for row in shard.execute(stmt).all()])
+    return heapq.nlargest(limit, (row for rows in shards for row in rows), key=lambda row: (row[2], row[1]))
+
+
+def search_urls(
+    db: Session,
+    query: str,
+    mode: str = MODE_PREFIX,
+    limit: int = 20,
+    tz_offset_hours: Optional[float] = None,
+) -> List[search_schemas.SearchResult]:
+    """Visited URLs matching `query`, most recently visited (then most visited) first."""
+    query = query.strip()
+    if not query or len(query) > MAX_URL_LENGTH:
+        raise ValueError(f"Query must be between 1 and {MAX_URL_LENGTH} characters")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    if tz_offset_hours is not None:
+        if not -12 <= tz_offset_hours <= 14:
+            raise ValueError("Timezone offset must be between -12 and +14 hours")
+
+    if index is not None:
+        rows = index.search(query, mode, limit)
+    else:
+        rows = _search_sql(db, query, mode, limit)
+
+    return [
+        search_schemas.SearchResult.model_validate(
+            {
+                "url": url,
+                "visit_count": visit_count,
+                "last_visited": format_datetime(last_visited, tz_offset_hours),
+            }
+        )
+        for url, visit_count, last_visited in rows
+    ]
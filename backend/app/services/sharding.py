@@ -0,0 +1,300 @@
+"""
+Horizontal sharding of the per-URL tables (DATABASE_SHARD_URLS).
+
+With shard URLs configured, `page_metrics`, `page_visit_repeats` and
+`page_metric_daily` rows live on the shard chosen by a stable hash of the
+canonical URL, so every single-URL read or write touches one shard. Domain
+reads and search scatter to all shards in parallel and merge the results.
+DATABASE_URL keeps the remaining tables (heavy hitter checkpoints, which
+already serve the global top-N) and carries visit stream notifications.
+
+Shards are chosen with jump consistent hashing (Lamping & Veach) over a
+64-bit blake2b digest: appending a shard moves about 1/N of the URLs, all of
+them onto the new shard. Shards may only be appended, never reordered.
+
+Ids must stay unique across shards, so each shard's id sequences step by
+SHARD_ID_STRIDE from an offset equal to the shard's index. Adding a shard:
+
+    alembic -x db_url=<new shard url> upgrade head
+    python -m app.services.sharding init        # every shard; idempotent
+    python -m app.services.sharding rebalance   # copies misplaced URLs, app on the old list
+    (deploy with the new shard appended to DATABASE_SHARD_URLS)
+    python -m app.services.sharding rebalance   # moves visits written meanwhile
+
+Rebalancing copies a URL's rows to its new shard before deleting them from
+the old one. Visits and repeats keep their ids and are never overwritten,
+so it can be interrupted and rerun; a daily rollup is merged into the one
+the new shard may already hold for that day, so a move interrupted between
+the new shard's commit and the old one's would count its rollups twice on
+the rerun.
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, TypeVar
+
+from sqlalchemy import case, delete, func, select, text, union
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import db as db_config
+from app.config.logger import get_logger
+from app.config.settings import settings
+from app.models.page_metric_daily import PageMetricDaily
+from app.models.page_metrics import PageMetric
+from app.models.page_visit_repeat import PageVisitRepeat
+from app.utils.urls import url_hash
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+SHARD_ID_STRIDE = 1024  # Upper bound on the number of shards
+SEQUENCE_TABLES = ("page_metrics", "page_visit_repeats")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def enabled() -> bool:
+    return bool(db_config.ShardSessionLocals)
+
+
+def shard_count() -> int:
+    return len(db_config.ShardSessionLocals)
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash of a 64-bit key into [0, buckets)."""
+    if buckets < 1:
+        raise ValueError("buckets must be positive")
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_for_url(url: str, buckets: Optional[int] = None) -> int:
+    """Shard index of a canonical URL."""
+    return jump_hash(url_hash(url), buckets if buckets is not None else shard_count())
+
+
+def _shard_session(db: Session, index: int) -> Session:
+    """The request's session on shard `index`, opened on first use."""
+    sessions: Dict[int, Session] = db.info.setdefault("shard_sessions", {})
+    session = sessions.get(index)
+    if session is None:
+        session = sessions[index] = db_config.ShardSessionLocals[index]()
+        if "statement_timeout_ms" in db.info:
+            session.info["statement_timeout_ms"] = db.info["statement_timeout_ms"]
+    return session
+
+
+def session_for_url(db: Session, url: str) -> Session:
+    """Session holding `url`'s rows: `db` itself unless sharded."""
+    if not enabled():
+        return db
+    return _shard_session(db, shard_for_url(url))
+
+
+def all_sessions(db: Session) -> List[Session]:
+    """One session per shard, or just `db` unless sharded."""
+    if not enabled():
+        return [db]
+    return [_shard_session(db, index) for index in range(shard_count())]
+
+
+def close_sessions(db: Session) -> None:
+    """Close the shard sessions opened for `db`; call before closing `db`."""
+    for session in db.info.pop("shard_sessions", {}).values():
+        session.close()
+
+
+def gather(db: Session, query: Callable[[Session], T]) -> List[T]:
+    """Run `query` against every shard in parallel; results in shard order."""
+    sessions = all_sessions(db)
+    if len(sessions) == 1:
+        return [query(sessions[0])]
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(settings.DB_SHARD_GATHER_THREADS, thread_name_prefix="shard-gather")
+    # Each session is used by exactly one thread at a time
+    return list(_executor.map(query, sessions))
+
+
+def init_sequences(db: Session, index: int) -> None:
+    """Step shard `index`'s id sequences by SHARD_ID_STRIDE from offset `index`."""
+    for table in SEQUENCE_TABLES:
+        sequence = db.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+        max_id = db.execute(text(f"SELECT coalesce(max(id), 0) FROM {table}")).scalar()
+        start = (max_id // SHARD_ID_STRIDE + 1) * SHARD_ID_STRIDE + index
+        db.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_ID_STRIDE}"))
+        db.execute(text("SELECT setval(:sequence, :start, false)"), {"sequence": sequence, "start": start})
+    db.commit()
+
+
+class RebalanceResult(NamedTuple):
+    urls_moved: int
+    rows_moved: int
+
+
+# Keeps each INSERT under the oldest SQLite bind-parameter limit (999)
+MOVE_BATCH_PARAMETERS = 900
+_SUMMED = ("visit_count", "link_count_sum", "word_count_sum", "image_count_sum")
+_LATEST = ("last_visited", "last_link_count", "last_word_count", "last_image_count")
+
+
+def _dialect(db: Session):
+    return postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert_rows(db: Session, model, rows: List[dict], merge_rollups: bool = False) -> None:
+    """Insert `rows` in batches; existing ids are skipped, or a (url, day) rollup is merged."""
+    if not rows:
+        return
+    dialect = _dialect(db)
+    per_statement = max(1, MOVE_BATCH_PARAMETERS // len(rows[0]))
+    for batch in _chunks(rows, per_statement):
+        stmt = dialect.insert(model).values(batch)
+        if not merge_rollups:
+            db.execute(stmt.on_conflict_do_nothing())
+            continue
+        moved, kept = stmt.excluded, model.__table__.c
+        least, greatest = (func.least, func.greatest) if dialect is postgresql else (func.min, func.max)
+        newer = moved.last_visited > kept.last_visited
+        merged = {name: kept[name] + moved[name] for name in _SUMMED}
+        for metric in ("link_count", "word_count", "image_count"):
+            merged[f"{metric}_min"] = least(kept[f"{metric}_min"], moved[f"{metric}_min"])
+            merged[f"{metric}_max"] = greatest(kept[f"{metric}_max"], moved[f"{metric}_max"])
+        for name in _LATEST:
+            merged[name] = case((newer, moved[name]), else_=kept[name])
+        db.execute(stmt.on_conflict_do_update(index_elements=["url", "day"], set_=merged))
+
+
+def _rows(db: Session, stmt, exclude=()) -> List[dict]:
+    return [
+        {key: value for key, value in row._mapping.items() if key not in exclude}
+        for row in db.execute(stmt)
+    ]
+
+
+def move_url(source: Session, target: Session, url: str, batch_size: int = 1000) -> int:
+    """
+    Copy `url`'s rows from `source` to `target`, then delete them from `source`.
+
+    Visits are read and copied `batch_size` at a time, with their repeats, and
+    keep their (public) ids. A day's rollup the target already holds (from
+    visits written there and rolled up since) is merged with the moved one.
+    The target commits once, before anything is deleted from the source.
+    """
+    visits, repeats = PageMetric.__table__, PageVisitRepeat.__table__
+    visit_ids: List[int] = []
+    repeat_ids: List[int] = []
+    copied = 0
+    while True:
+        batch = _rows(source, select(visits).where(
+            visits.c.url == url, visits.c.id > (visit_ids[-1] if visit_ids else 0)
+        ).order_by(visits.c.id).limit(batch_size))
+        if not batch:
+            break
+        ids = [row["id"] for row in batch]
+        batch_repeats = _rows(source, select(repeats).where(repeats.c.visit_id.in_(ids)))
+        _insert_rows(target, PageMetric, batch)
+        _insert_rows(target, PageVisitRepeat, batch_repeats)
+        copied += target.execute(
+            select(func.count()).where(visits.c.id.in_(ids), visits.c.url == url)
+        ).scalar()
+        for chunk in _chunks([row["id"] for row in batch_repeats], batch_size):
+            copied += target.execute(
+                select(func.count()).where(repeats.c.id.in_(chunk), repeats.c.visit_id.in_(ids))
+            ).scalar()
+        visit_ids += ids
+        repeat_ids += [row["id"] for row in batch_repeats]
+    if copied != len(visit_ids) + len(repeat_ids):
+        target.rollback()
+        raise RuntimeError(f"Id collision moving {url}; run `init` on every shard first")
+
+    rollups = PageMetricDaily.__table__
+    rollup_ids = source.execute(select(rollups.c.id).where(rollups.c.url == url)).scalars().all()
+    for chunk in _chunks(rollup_ids, batch_size):
+        # Rollups get new ids on the target
+        _insert_rows(target, PageMetricDaily, _rows(
+            source, select(rollups).where(rollups.c.id.in_(chunk)), exclude=("id",)
+        ), merge_rollups=True)
+    target.commit()
+
+    for chunk in _chunks(repeat_ids, batch_size):
+        source.execute(delete(PageVisitRepeat).where(PageVisitRepeat.id.in_(chunk)))
+    for chunk in _chunks(visit_ids, batch_size):
+        source.execute(delete(PageMetric).where(PageMetric.id.in_(chunk)))
+    for chunk in _chunks(rollup_ids, batch_size):
+        source.execute(delete(PageMetricDaily).where(PageMetricDaily.id.in_(chunk)))
+    source.commit()
+    return len(visit_ids) + len(repeat_ids) + len(rollup_ids)
+
+
+def _stored_urls(db: Session, after: str, batch_size: int) -> List[str]:
+    urls = union(select(PageMetric.url), select(PageMetricDaily.url)).subquery()
+    return db.execute(
+        select(urls.c.url).where(urls.c.url > after).order_by(urls.c.url).limit(batch_size)
+    ).scalars().all()
+
+
+def rebalance(sessions: List[Session], batch_size: int = 500, dry_run: bool = False) -> RebalanceResult:
+    """Move every URL stored on the wrong shard (for `len(sessions)` shards) to its own."""
+    urls_moved = rows_moved = 0
+    for index, source in enumerate(sessions):
+        after = ""
+        while True:
+            urls = _stored_urls(source, after, batch_size)
+            if not urls:
+                break
+            after = urls[-1]
+            source.rollback()  # Don't hold a snapshot across moves
+            for url in urls:
+                target_index = shard_for_url(url, len(sessions))
+                if target_index == index:
+                    continue
+                urls_moved += 1
+                if dry_run:
+                    continue
+                rows_moved += move_url(source, sessions[target_index], url)
+        logger.info(f"Shard {index}: {urls_moved} misplaced URLs so far")
+    return RebalanceResult(urls_moved, rows_moved)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage sharded page_metrics storage.")
+    parser.add_argument("command", choices=("init", "rebalance"))
+    parser.add_argument("--batch-size", type=int, default=500, help="URLs listed per query when rebalancing")
+    parser.add_argument("--dry-run", action="store_true", help="Only count misplaced URLs")
+    args = parser.parse_args()
+
+    if not enabled():
+        parser.error("DATABASE_SHARD_URLS is not set")
+    sessions = [factory() for factory in db_config.ShardSessionLocals]
+    try:
+        if args.command == "init":
+            for index, session in enumerate(sessions):
+                if session.get_bind().dialect.name != "postgresql":
+                    parser.error("init needs Postgres shards")
+                init_sequences(session, index)
+            print(f"Initialized id sequences on {len(sessions)} shards")
+        else:
+            result = rebalance(sessions, batch_size=args.batch_size, dry_run=args.dry_run)
+            verb = "Found" if args.dry_run else "Moved"
+            print(f"{verb} {result.urls_moved} URLs ({result.rows_moved} rows)")
+    finally:
+        for session in sessions:
+            session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Distribution statistics of a URL's link/word/image counts over a time range.
+
+On Postgres everything is computed in one aggregate query (percentiles via
+the `percentile_cont` ordered-set aggregate). SQLite has no such aggregates,
+so the three count columns are fetched as plain rows and reduced with NumPy.
+No ORM objects are loaded on either path.
+
+Only raw visits are covered: days the retention job has rolled up keep
+min/max/sum, from which percentiles cannot be recovered.
+
+With the hot store on, a range starting within its window is reduced in
+process from the store's columns, without a query.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import Select, func, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.page_metrics import PageMetric
+from app.models.page_visit_repeat import PageVisitRepeat
+from app.schemas import stats as stats_schemas
+from app.services import dedup, hot_store, sharding
+from app.utils.helpers import format_datetime
+from app.utils.urls import canonicalize_url
+
+METRICS = ("link_count", "word_count", "image_count")
+PERCENTILES = (50, 90, 99)
+STAT_FIELDS = ("min", "max", "mean", "stddev") + tuple(f"p{p}" for p in PERCENTILES)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # Naive bounds are taken as UTC, like stored visit times
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _visit_source(url: str, start: Optional[datetime], end: Optional[datetime], naive: bool, repeats: bool):
+    """Subquery of the count columns of the URL's visits in [start, end)."""
+    def in_range(column) -> List:
+        conditions = []
+        for bound, op in ((start, "__ge__"), (end, "__lt__")):
+            if bound is not None:
+                # SQLite stores UTC wall-clock strings; Postgres compares timestamptz
+                value = bound.replace(tzinfo=None) if naive else bound
+                conditions.append(getattr(column, op)(value))
+        return conditions
+
+    counts = [getattr(PageMetric, metric) for metric in METRICS]
+    source = select(*counts).where(PageMetric.url == url, *in_range(PageMetric.datetime_visited))
+    if repeats:
+        # Compact-mode repeats are visits with their referenced row's counts
+        source = union_all(
+            source,
+            select(*counts)
+            .join(PageVisitRepeat, PageVisitRepeat.visit_id == PageMetric.id)
+            .where(PageMetric.url == url, *in_range(PageVisitRepeat.datetime_visited)),
+        )
+    return source.subquery("visits")
+
+
+def _stats_stmt(source) -> Select:
+    """One row: visit count, then STAT_FIELDS for each metric in METRICS order."""
+    columns = [func.count()]
+    for metric in METRICS:
+        col = source.c[metric]
+        columns += [func.min(col), func.max(col), func.avg(col), func.stddev_samp(col)]
+        columns += [func.percentile_cont(p / 100).within_group(col) for p in PERCENTILES]
+    return select(*columns).select_from(source)
+
+
+def _stats_sql(db: Session, source) -> tuple:
+    row = db.execute(_stats_stmt(source)).one()
+    visit_count, values = row[0], row[1:]
+    per_metric = len(STAT_FIELDS)
+    return visit_count, {
+        metric: dict(zip(STAT_FIELDS, values[i * per_metric:(i + 1) * per_metric]))
+        for i, metric in enumerate(METRICS)
+    }
+
+
+def _stats_numpy(db: Session, source) -> tuple:
+    import numpy as np  # Only needed on backends without ordered-set aggregates
+
+    rows: Sequence = db.execute(select(*(source.c[metric] for metric in METRICS))).all()
+    return _reduce(np.array(rows, dtype=np.float64).reshape(-1, len(METRICS)))
+
+
+def _reduce(values) -> tuple:
+    """Visit count and STAT_FIELDS per metric of a (visits, metrics) float array."""
+    import numpy as np
+
+    if not len(values):
+        return 0, {metric: dict.fromkeys(STAT_FIELDS) for metric in METRICS}
+    percentiles = np.percentile(values, PERCENTILES, axis=0)  # linear, as percentile_cont
+    stddev = values.std(axis=0, ddof=1) if len(values) > 1 else [None] * len(METRICS)
+    columns = (values.min(axis=0), values.max(axis=0), values.mean(axis=0), stddev, *percentiles)
+    return len(values), {
+        metric: dict(zip(STAT_FIELDS, (column[i] for column in columns)))
+        for i, metric in enumerate(METRICS)
+    }
+
+
+def _distribution(values: Dict[str, object]) -> stats_schemas.MetricDistribution:
+    return stats_schemas.MetricDistribution.model_validate(
+        {field: None if value is None else float(value) for field, value in values.items()}
+    )
+
+
+def get_metric_stats(
+    db: Session,
+    url: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    tz_offset_hours: Optional[float] = None,
+) -> stats_schemas.PageMetricStats:
+    """Min, max, mean, stddev and p50/p90/p99 of each count for visits in [start, end)."""
+    normalized_url = canonicalize_url(url)
+    if tz_offset_hours is not None:
+        if not -12 <= tz_offset_hours <= 14:
+            raise ValueError("Timezone offset must be between -12 and +14 hours")
+    start = _as_utc(start) if start is not None else None
+    end = _as_utc(end) if end is not None else None
+    if start is not None and end is not None and start >= end:
+        raise ValueError("start must be before end")
+
+    recent = hot_store.recent_counts(normalized_url, start, end) if start is not None else None
+    if recent is not None:
+        visit_count, per_metric = _reduce(recent)
+    else:
+        db = sharding.session_for_url(db, normalized_url)
+        dialect = db.get_bind().dialect.name
+        source = _visit_source(normalized_url, start, end, naive=dialect == "sqlite", repeats=dedup.active())
+        if dialect == "postgresql":
+            visit_count, per_metric = _stats_sql(db, source)
+        else:
+            visit_count, per_metric = _stats_numpy(db, source)
+
+    return stats_schemas.PageMetricStats.model_validate(
+        {
+            "url": normalized_url,
+            "start": format_datetime(start, tz_offset_hours) if start else None,
+            "end": format_datetime(end, tz_offset_hours) if end else None,
+            "visit_count": visit_count,
+            **{metric: _distribution(per_metric[metric]) for metric in METRICS},
+        }
+    )
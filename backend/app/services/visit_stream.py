@@ -0,0 +1,306 @@
+"""
+In-process fan-out of newly recorded visits to live subscribers.
+
+`create_page_visit` publishes every stored visit to the module-level `hub`;
+SSE connections subscribe to one or more URLs and receive matching events
+through a bounded per-connection queue. When the Postgres bridge is enabled,
+visits are announced with NOTIFY instead and every worker re-publishes what
+it hears on LISTEN, so subscribers see writes from all workers.
+
+If the bridge's connection fails it reconnects with backoff. Notifications
+sent while it was down are lost, so each connection gets a new generation
+number: per-worker copies of visit data (the known-URL filter, the hot
+store) note the generation they were built under and are not used once it
+changes, until they are rebuilt.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import select
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func, select as sa_select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config.logger import get_logger
+from app.config.settings import settings
+
+logger = get_logger(__name__)
+
+NOTIFY_CHANNEL = "page_visits"
+
+
+class Subscription:
+    """A single subscriber's bounded event queue, bound to its event loop."""
+
+    def __init__(self, urls: Iterable[str], buffer_size: int):
+        self.urls: Set[str] = set(urls)
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        """Enqueue an event, dropping the oldest one if the consumer is behind."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class VisitHub:
+    """Thread-safe registry of subscriptions keyed by normalized URL."""
+
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Call `listener` with every published event, whatever its URL (once per listener)."""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def subscribe(self, urls: Iterable[str], buffer_size: Optional[int] = None) -> Subscription:
+        """Register a subscription; must be called from within the consumer's event loop."""
+        subscription = Subscription(urls, buffer_size or self.buffer_size)
+        with self._lock:
+            for url in subscription.urls:
+                self._subscribers.setdefault(url, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for url in subscription.urls:
+                subscribers = self._subscribers.get(url)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[url]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({sub for subs in self._subscribers.values() for sub in subs})
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """
+        Deliver an event to every subscriber of its URL.
+
+        Safe to call from worker threads (sync routes run in the threadpool);
+        delivery is scheduled onto each subscriber's own loop.
+
+        Returns:
+            int: Number of subscriptions the event was handed to
+        """
+        with self._lock:
+            targets = list(self._subscribers.get(event["url"], ()))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            # The visit is already stored, and the bridge thread must keep listening
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Visit listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # Loop already closed; the subscription is being torn down
+                self.unsubscribe(subscription)
+        return len(targets)
+
+
+def visit_to_event(visit: Any) -> Dict[str, Any]:
+    """Build a stream event from a PageMetric ORM row."""
+    return {
+        "id": visit.id,
+        "url": visit.url,
+        "link_count": visit.link_count,
+        "word_count": visit.word_count,
+        "image_count": visit.image_count,
+        "datetime_visited": visit.datetime_visited,
+    }
+
+
+def _encode_event(event: Dict[str, Any]) -> str:
+    payload = dict(event)
+    if isinstance(payload["datetime_visited"], datetime):
+        payload["datetime_visited"] = payload["datetime_visited"].isoformat()
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def _decode_event(payload: str) -> Dict[str, Any]:
+    event = json.loads(payload)
+    event["datetime_visited"] = datetime.fromisoformat(event["datetime_visited"])
+    return event
+
+
+class PostgresNotifyBridge:
+    """
+    Relays NOTIFY payloads on `NOTIFY_CHANNEL` into the local hub.
+
+    Runs a daemon thread holding one dedicated autocommit psycopg2 connection,
+    replaced with backoff whenever it fails.
+    """
+
+    POLL_TIMEOUT = 1.0  # Seconds between checks of the stop flag
+    RECONNECT_MIN_SECONDS = 1.0
+    RECONNECT_MAX_SECONDS = 30.0
+
+    def __init__(self, hub: VisitHub, dsn: str, channel: str = NOTIFY_CHANNEL):
+        self.hub = hub
+        self.dsn = dsn
+        self.channel = channel
+        self.generation = 0  # Connections made so far; the current one while listening
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self):
+        import psycopg2  # Only needed when the bridge is enabled
+
+        conn = psycopg2.connect(self.dsn)
+        try:
+            conn.set_session(autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+        except Exception:
+            conn.close()
+            raise
+        self.generation += 1
+        return conn
+
+    def start(self) -> None:
+        # The first connection is made here, so an unreachable database fails startup
+        self._conn = self._connect()
+        self._thread = threading.Thread(target=self._run, name="visit-stream-listener", daemon=True)
+        self._thread.start()
+        logger.info(f"Listening for visit notifications on '{self.channel}'")
+
+    @property
+    def running(self) -> bool:
+        """Whether notifications are being heard; False while reconnecting and once stopped."""
+        return self._conn is not None and self._thread is not None and self._thread.is_alive()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.POLL_TIMEOUT * 2)
+            self._thread = None
+
+    def _run(self) -> None:
+        delay = self.RECONNECT_MIN_SECONDS
+        while not self._stop.is_set():
+            if self._conn is None:
+                try:
+                    self._conn = self._connect()
+                except Exception as e:
+                    logger.warning(f"Visit notification listener reconnect failed, retrying in {delay:.0f}s: {e}")
+                    self._stop.wait(delay)
+                    delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+                    continue
+                logger.info(f"Visit notification listener reconnected on '{self.channel}'")
+                delay = self.RECONNECT_MIN_SECONDS
+            try:
+                self._listen(self._conn)
+            except Exception as e:
+                logger.error(f"Visit notification listener lost its connection: {e}")
+            conn, self._conn = self._conn, None
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _listen(self, conn) -> None:
+        """Relay notifications until stopped; raises when the connection fails."""
+        while not self._stop.is_set():
+            ready, _, _ = select.select([conn], [], [], self.POLL_TIMEOUT)
+            if not ready:
+                continue
+            conn.poll()
+            while conn.notifies:
+                notification = conn.notifies.pop(0)
+                try:
+                    self.hub.publish(_decode_event(notification.payload))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring malformed visit notification: {e}")
+
+
+hub = VisitHub(buffer_size=settings.VISIT_STREAM_BUFFER_SIZE)
+_bridge: Optional[PostgresNotifyBridge] = None
+
+
+def libpq_dsn(database_url: str) -> str:
+    """The database URL without the SQLAlchemy driver suffix (+psycopg, +psycopg2), as libpq takes it."""
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def start_bridge(dsn: str) -> None:
+    """Start relaying cross-worker notifications into the local hub."""
+    global _bridge
+    if _bridge is not None:
+        return
+    _bridge = PostgresNotifyBridge(hub, libpq_dsn(dsn))
+    _bridge.start()
+
+
+def stop_bridge() -> None:
+    global _bridge
+    if _bridge is not None:
+        _bridge.stop()
+        _bridge = None
+
+
+def bridge_running() -> bool:
+    """Whether this worker is currently hearing every worker's visits."""
+    return _bridge is not None and _bridge.running
+
+
+def bridge_generation() -> Optional[int]:
+    """
+    The bridge connection this worker is hearing visits through; None if none is.
+
+    A copy of visit data built under one generation has missed visits once the
+    generation changes.
+    """
+    bridge = _bridge
+    if bridge is None or not bridge.running:
+        return None
+    return bridge.generation
+
+
+def require_bridge(setting: str) -> None:
+    """Refuse to start a per-worker copy of visit data the other workers' writes would not reach."""
+    if not settings.VISIT_STREAM_PG_BRIDGE:
+        raise ValueError(f"{setting} needs VISIT_STREAM_PG_BRIDGE, so every worker hears every new visit")
+
+
+def publish_visit(db: Session, visit: Any) -> None:
+    """
+    Announce a committed visit to live subscribers.
+
+    With the bridge running the visit goes out through NOTIFY, and this worker
+    receives it back on LISTEN like every other one; otherwise it is delivered
+    to the local hub directly.
+    """
+    event = visit_to_event(visit)
+    if _bridge is None:
+        hub.publish(event)
+        return
+    try:
+        db.execute(sa_select(func.pg_notify(NOTIFY_CHANNEL, _encode_event(event))))
+        db.commit()
+    except SQLAlchemyError as e:
+        # The visit itself is already committed; a lost notification only delays clients
+        db.rollback()
+        logger.warning(f"Failed to announce visit {event['id']}: {e}")
@@ -0,0 +1,151 @@
+"""
+Memory diagnostics: process size, tracemalloc snapshots and per-route allocation counts.
+
+`Snapshots` keeps the previous tracemalloc snapshot, so each new one is
+reported with the allocation sites that grew since; tracing starts with the
+first snapshot (or at startup) and slows every allocation while it runs.
+
+`RouteAllocations` sums what sampled requests left allocated when their
+response started, per route. The counters are process-wide, so allocations
+by concurrent requests and background threads land in whichever sampled
+request is running; a route that keeps a positive mean over many samples is
+the one retaining memory.
+"""
+from __future__ import annotations
+
+import gc
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Frames of the tracer itself and of imports are noise in a leak hunt
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_stats() -> Dict[str, Any]:
+    """Process-level memory figures that need no tracing."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "rss_bytes": rss_bytes(),
+        # KiB on Linux, bytes on macOS
+        "max_rss_bytes": max_rss if sys.platform == "darwin" else max_rss * 1024,
+        "allocated_blocks": sys.getallocatedblocks(),
+        "gc": {"counts": list(gc.get_count()), "objects": len(gc.get_objects()), "garbage": len(gc.garbage)},
+    }
+
+
+def _location(frame: tracemalloc.Frame) -> str:
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class Snapshots:
+    """tracemalloc control and the previous snapshot to diff the next one against."""
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._started: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def start(self, frames: int) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._started = datetime.now(timezone.utc)
+
+    def stop(self) -> None:
+        """Stop tracing and drop the previous snapshot."""
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+            self._started = None
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        """Traced and peak bytes since tracing started; None when not tracing."""
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "since": self._started.isoformat() if self._started else None,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        }
+
+    def take(self, top: int, frames: int) -> Dict[str, Any]:
+        """
+        The `top` allocation sites by size, and by growth since the previous snapshot.
+
+        Starts tracing first if needed; growth is then None, as it is for
+        any first snapshot.
+        """
+        self.start(frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+        largest: List[Dict[str, Any]] = [
+            {"location": _location(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:top]
+        ]
+        growth = None
+        if previous is not None:
+            growth = [
+                {
+                    "location": _location(stat.traceback[0]),
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in snapshot.compare_to(previous, "lineno")[:top]
+            ]
+        return {"tracing": self.status(), "top": largest, "growth": growth}
+
+
+class RouteAllocations:
+    """Per-route sums of the blocks (and traced bytes, while tracing) sampled requests left allocated."""
+
+    def __init__(self):
+        self._routes: Dict[str, List[int]] = {}  # root -> [samples, blocks, traced samples, bytes]
+        self._lock = threading.Lock()
+
+    def add(self, root: str, blocks: int, traced_bytes: Optional[int]) -> None:
+        with self._lock:
+            totals = self._routes.setdefault(root, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += blocks
+            if traced_bytes is not None:
+                totals[2] += 1
+                totals[3] += traced_bytes
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            routes = {root: list(totals) for root, totals in self._routes.items()}
+        return {
+            root: {
+                "samples": samples,
+                "mean_retained_blocks": round(blocks / samples, 1),
+                "mean_retained_bytes": round(traced / traced_samples) if traced_samples else None,
+            }
+            for root, (samples, blocks, traced_samples, traced) in sorted(routes.items())
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
@@ -0,0 +1,153 @@
+"""
+Wall-clock stack sampling for profiling individual requests.
+
+A `Profile` collects collapsed stacks ("caller;callee count", the input
+format of flamegraph.pl and speedscope) from the threads attached to it. One
+shared sampler thread walks `sys._current_frames()` every interval while any
+profile is active and sleeps otherwise, so profiling costs nothing between
+profiled requests.
+
+A request runs on two threads: middleware on the event loop thread, and sync
+endpoints (with the services they call) on a threadpool worker. The
+middleware attaches the loop thread; `ProfiledRoute` attaches the worker for
+the duration of the endpoint call, found through the `active_profile`
+context variable that the threadpool copies. Other requests' async work on
+the loop can show up in a profile; worker samples are the request's own.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set
+
+from fastapi.routing import APIRoute
+
+_MAX_DEPTH = 256
+
+
+class Profile:
+    """Sampled stacks from a set of threads."""
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.threads: Set[int] = set()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+
+def collapsed(stacks: Counter, root: Optional[str] = None) -> str:
+    """Render stack counts one per line, most frequent first, optionally under a `root` frame."""
+    prefix = f"{root};" if root else ""
+    return "".join(f"{prefix}{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+active_profile: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+
+
+def _is_idle(frame) -> bool:
+    # The event loop blocked in select() is waiting for I/O, not working for any request
+    return frame.f_code.co_name == "select" and frame.f_code.co_filename.endswith("selectors.py")
+
+
+def collapse(frame) -> Optional[str]:
+    """The stack ending at `frame` as "outermost;...;innermost", or None if idle."""
+    if _is_idle(frame):
+        return None
+    names = []
+    while frame is not None and len(names) < _MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples the threads of every registered profile from one background thread."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self._profiles: Set[Profile] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, profile: Profile) -> None:
+        with self._cond:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self, profile: Profile) -> None:
+        """Stop sampling `profile`; waits out a pass in progress, so its stacks are final on return."""
+        with self._cond:
+            self._profiles.discard(profile)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            # Passes run under the lock so stop() cannot return while one still writes to a profile
+            with self._cond:
+                while not self._profiles:
+                    self._cond.wait()
+                frames = sys._current_frames()
+                stacks: Dict[int, Optional[str]] = {}  # Concurrent profiles share the loop thread
+                for profile in self._profiles:
+                    for ident in tuple(profile.threads):
+                        frame = frames.get(ident)
+                        if frame is None or ident == own:
+                            continue
+                        if ident not in stacks:
+                            stacks[ident] = collapse(frame)
+                        if stacks[ident] is not None:
+                            profile.stacks[stacks[ident]] += 1
+                del frames
+            time.sleep(self.interval)
+
+
+def profiled_endpoint(endpoint: Callable) -> Callable:
+    """Attach the worker thread running a sync endpoint to the request's active profile."""
+    if inspect.iscoroutinefunction(endpoint):
+        return endpoint  # Runs on the loop thread, which the middleware attaches
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.threads.add(ident)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.threads.discard(ident)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoint joins the request's profile; pass as a router's route_class."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, profiled_endpoint(endpoint), **kwargs)
+
+
+def write_collapsed(path: Path, stacks: Counter, root: Optional[str] = None) -> None:
+    """Write `stacks` in collapsed format, replacing `path` atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(collapsed(stacks, root), encoding="utf-8")
+    os.replace(tmp, path)
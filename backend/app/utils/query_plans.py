@@ -0,0 +1,76 @@
+"""
+EXPLAIN helpers for checking which indexes a statement's plan uses.
+
+`explain_plan` runs EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (FORMAT JSON)
+(Postgres) for a statement with its parameters filled in, and reduces the
+plan to the indexes it scans, which of those are index-only (covering), and
+the tables it reads in full. Used by the plan tests to pin the hot queries
+to their intended indexes.
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterator, Mapping, NamedTuple, Optional, Set
+
+from sqlalchemy import Executable
+from sqlalchemy.orm import Session
+
+_SQLITE_INDEX = re.compile(r"USING (COVERING )?INDEX (\w+)")
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+class PlanSummary(NamedTuple):
+    indexes: Set[str]  # Every index the plan scans
+    index_only: Set[str]  # Indexes answering without visiting the table
+    full_scans: Set[str]  # Tables read sequentially
+
+
+def _sqlite_summary(rows) -> PlanSummary:
+    summary = PlanSummary(set(), set(), set())
+    # Subqueries are planned as co-routines; scanning one reads its rows, not a table
+    coroutines = {row[-1].split(" ", 1)[1] for row in rows if row[-1].startswith("CO-ROUTINE ")}
+    for row in rows:
+        detail = row[-1]
+        index = _SQLITE_INDEX.search(detail)
+        if index:
+            summary.indexes.add(index.group(2))
+            if index.group(1):
+                summary.index_only.add(index.group(2))
+            continue
+        scan = _SQLITE_SCAN.match(detail)
+        # A bare "SCAN t" without USING is a full table scan
+        if scan and scan.group(1) not in coroutines:
+            summary.full_scans.add(scan.group(1))
+    return summary
+
+
+def _plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _plan_nodes(child)
+
+
+def _postgres_summary(plan: dict) -> PlanSummary:
+    summary = PlanSummary(set(), set(), set())
+    for node in _plan_nodes(plan["Plan"]):
+        node_type = node["Node Type"]
+        if "Index Name" in node:
+            summary.indexes.add(node["Index Name"])
+            if node_type == "Index Only Scan":
+                summary.index_only.add(node["Index Name"])
+        elif node_type == "Seq Scan":
+            summary.full_scans.add(node["Relation Name"])
+    return summary
+
+
+def explain_plan(db: Session, stmt: Executable, params: Optional[Mapping] = None) -> PlanSummary:
+    """Plan `stmt` with `params` bound (without running it) and summarize index use."""
+    bind = db.get_bind()
+    compiled = stmt.compile(dialect=bind.dialect)
+    values = compiled.construct_params(params or {})
+    args = tuple(values[name] for name in compiled.positiontup) if compiled.positional else values
+    connection = db.connection()
+    if bind.dialect.name == "postgresql":
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", args).scalar()
+        return _postgres_summary(plan[0])
+    return _sqlite_summary(connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", args).all())
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, List
+
+from app.config.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Scheduler:
+    """
+    Minimal periodic job runner owned by the application lifespan.
+
+    Jobs are plain sync callables; each run is pushed to a worker thread so
+    blocking database work never stalls the event loop.
+    """
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+
+    def every(self, seconds: float, job: Callable[[], None], name: str) -> None:
+        self._tasks.append(asyncio.create_task(self._loop(seconds, job, name), name=name))
+
+    async def _loop(self, seconds: float, job: Callable[[], None], name: str) -> None:
+        while True:
+            await asyncio.sleep(seconds)
+            try:
+                await asyncio.to_thread(job)
+            except Exception as e:
+                logger.error(f"Scheduled job '{name}' failed: {e}")
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from sqlalchemy import Engine, text
+
+from app.config.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class StartupTimer:
+    """Records how long each boot phase takes, measured from package import."""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.phases: Dict[str, float] = {}
+        self._last = started_at
+
+    def mark(self, name: str) -> None:
+        """Attribute the time since the previous mark to `name`."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+            self._last = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started_at
+
+    def report(self, budget_seconds: float) -> None:
+        breakdown = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        message = f"Startup took {self.total * 1000:.0f}ms ({breakdown})"
+        if self.total > budget_seconds:
+            logger.warning(f"{message}; over the {budget_seconds:.1f}s budget")
+        else:
+            logger.info(message)
+
+
+def prefill_pool(engine: Engine, connections: int) -> int:
+    """
+    Open up to `connections` pooled connections at once and return them to the pool.
+
+    Doubles as the startup connectivity check; raises if the database is unreachable.
+
+    Returns:
+        int: Number of connections opened
+    """
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        connections = min(connections, size())
+    opened = []
+    try:
+        for _ in range(max(connections, 1)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
@@ -0,0 +1,69 @@
+"""
+Statement compilation cache instrumentation.
+
+SQLAlchemy compiles each statement once per cache key and reuses the compiled
+form on later executions. `StatementCacheStats` counts those reuses per
+engine so the hit rate of the prebuilt hot-path statements is observable.
+"""
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Dict
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+
+class StatementCacheStats:
+    """Hit/miss counters for an engine's compiled statement cache."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0  # Statements with no cache key (raw SQL, DDL)
+        self._lock = threading.Lock()
+
+    def record(self, context) -> None:
+        cache_hit = getattr(context, "cache_hit", None)
+        with self._lock:
+            if cache_hit is CACHE_HIT:
+                self.hits += 1
+            elif cache_hit is CACHE_MISS:
+                self.misses += 1
+            else:
+                self.uncached += 1
+
+    @property
+    def hit_rate(self) -> float:
+        cached = self.hits + self.misses
+        return self.hits / cached if cached else 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.uncached = 0
+
+
+_stats: "weakref.WeakKeyDictionary[Engine, StatementCacheStats]" = weakref.WeakKeyDictionary()
+
+
+def instrument(engine: Engine) -> StatementCacheStats:
+    """Attach a StatementCacheStats to `engine` (idempotent) and return it."""
+    stats = _stats.get(engine)
+    if stats is None:
+        stats = _stats[engine] = StatementCacheStats()
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                stats.record(context)
+
+    return stats
@@ -0,0 +1,200 @@
+"""
+Replay a traffic capture (TRAFFIC_CAPTURE_ENABLED) against a running backend.
+
+    python -m app.utils.traffic_replay logs/traffic.jsonl \\
+        --base-url http://localhost:8000 --speed 4x --concurrency 32
+
+Requests keep their captured spacing scaled by `--speed` ("1x", "4x", ...),
+or go out back to back with "max". At most `--concurrency` are in flight;
+when that limit is reached, later requests start late rather than piling up.
+Reports request count, error rate and latency percentiles per endpoint
+(method and route template).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+PERCENTILES = (50, 90, 99)
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """"max" -> None (no pacing), "4x" or "4" -> 4.0."""
+    if value.strip().lower() == "max":
+        return None
+    try:
+        speed = float(value.strip().lower().rstrip("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Speed must be like 1x, 2.5x or max, got {value!r}")
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("Speed must be positive")
+    return speed
+
+
+def load_records(path: str) -> List[dict]:
+    """Capture records in arrival order; malformed lines are skipped."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "method" in record and "path" in record:
+                records.append(record)
+    records.sort(key=lambda record: record.get("ts", 0))
+    return records
+
+
+class EndpointStats:
+    """Latencies and outcomes of the replayed requests for one endpoint."""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors = 0  # 5xx or no response
+        self.client_errors = 0  # 4xx
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies_ms)
+
+    def record(self, latency_ms: float, status: Optional[int]) -> None:
+        self.latencies_ms.append(latency_ms)
+        if status is None or status >= 500:
+            self.errors += 1
+        elif status >= 400:
+            self.client_errors += 1
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile of the latencies, in ms."""
+        ordered = sorted(self.latencies_ms)
+        if not ordered:
+            return 0.0
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "error_rate": round(self.errors / self.count, 4) if self.count else 0.0,
+            "client_error_rate": round(self.client_errors / self.count, 4) if self.count else 0.0,
+            **{f"p{p}_ms": round(self.percentile(p), 2) for p in PERCENTILES},
+            "max_ms": round(max(self.latencies_ms, default=0.0), 2),
+        }
+
+
+def endpoint_key(record: dict) -> str:
+    return f"{record['method']} {record.get('route') or record['path']}"
+
+
+async def _send(client: httpx.AsyncClient, record: dict) -> Optional[int]:
+    try:
+        response = await client.request(
+            record["method"],
+            record["path"] + (f"?{record['query']}" if record.get("query") else ""),
+            json=record.get("body"),
+        )
+    except httpx.HTTPError:
+        return None
+    return response.status_code
+
+
+async def replay(
+    records: Iterable[dict],
+    client: httpx.AsyncClient,
+    speed: Optional[float] = 1.0,
+    concurrency: int = 16,
+) -> Dict[str, EndpointStats]:
+    """Play `records` through `client`; see module docstring for pacing."""
+    stats: Dict[str, EndpointStats] = {}
+    slots = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first_ts: Optional[float] = None
+
+    async def run(record: dict) -> None:
+        try:
+            sent = time.perf_counter()
+            status = await _send(client, record)
+            latency_ms = (time.perf_counter() - sent) * 1000
+            stats.setdefault(endpoint_key(record), EndpointStats()).record(latency_ms, status)
+        finally:
+            slots.release()
+
+    for record in records:
+        if speed is not None:
+            ts = record.get("ts", 0)
+            first_ts = ts if first_ts is None else first_ts
+            delay = started + (ts - first_ts) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await slots.acquire()
+        task = asyncio.create_task(run(record))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return stats
+
+
+def format_report(stats: Dict[str, EndpointStats], elapsed: float) -> str:
+    header = f"{'endpoint':<40} {'count':>7} {'err%':>6} {'4xx%':>6}" + "".join(
+        f" {f'p{p}':>8}" for p in PERCENTILES
+    ) + f" {'max':>8}"
+    lines = [header]
+    total = 0
+    for key in sorted(stats):
+        s = stats[key].summary()
+        total += s["count"]
+        lines.append(
+            f"{key:<40} {s['count']:>7} {s['error_rate']:>6.1%} {s['client_error_rate']:>6.1%}"
+            + "".join(f" {s[f'p{p}_ms']:>8.1f}" for p in PERCENTILES)
+            + f" {s['max_ms']:>8.1f}"
+        )
+    rate = total / elapsed if elapsed > 0 else 0.0
+    lines.append(f"{total} requests in {elapsed:.1f}s ({rate:.0f} req/s); latencies in ms")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and report per-endpoint latency.")
+    parser.add_argument("capture", help="JSONL file written by the traffic capture middleware")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1x, Nx or max (default 1x)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at most")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    try:
+        records = load_records(args.capture)
+    except OSError as e:
+        parser.error(f"Cannot read {args.capture}: {e}")
+    if not records:
+        parser.error(f"No requests in {args.capture}")
+
+    async def run() -> Dict[str, EndpointStats]:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            return await replay(records, client, speed=args.speed, concurrency=args.concurrency)
+
+    started = time.perf_counter()
+    stats = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps({key: s.summary() for key, s in sorted(stats.items())}, indent=2))
+    else:
+        print(format_report(stats, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import re
+from functools import lru_cache
+from typing import Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.config.settings import settings
+from app.constants import (
+    DEFAULT_PORTS,
+    MAX_HOST_LENGTH,
+    MAX_URL_LENGTH,
+    MIN_URL_LENGTH,
+    MULTI_LABEL_SUFFIXES,
+    TRACKING_PARAM_PREFIXES,
+    TRACKING_PARAMS,
+)
+
+_HOST_RE = re.compile(r"^[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?(\.[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?)*$")
+
+
+def _is_tracking_param(name: str) -> bool:
+    lowered = name.lower()
+    return lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def _canonicalize(url: str, strip_tracking: bool) -> str:
+    url = url.strip()
+    if not url or len(url) < MIN_URL_LENGTH:
+        raise ValueError(f"URL must be at least {MIN_URL_LENGTH} character long")
+    if len(url) > MAX_URL_LENGTH:
+        raise ValueError(f"URL exceeds maximum length of {MAX_URL_LENGTH} characters")
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        raise ValueError("URL must start with http:// or https://")
+    host = parts.hostname
+    if not host:
+        raise ValueError(f"Invalid URL: {url}")
+    try:
+        port = parts.port
+    except ValueError:
+        raise ValueError(f"Invalid URL: {url}")
+
+    netloc = f"[{host}]" if ":" in host else host
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    if parts.username is not None:
+        userinfo = parts.netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{netloc}"
+
+    query = parts.query
+    if strip_tracking and query:
+        query = urlencode(
+            [(k, v) for k, v in parse_qsl(query, keep_blank_values=True) if not _is_tracking_param(k)]
+        )
+
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+@lru_cache(maxsize=settings.URL_CACHE_SIZE)
+def canonicalize_url(url: str) -> str:
+    """
+    Return the canonical form of a page URL, as stored and queried.
+
+    Lowercases scheme and host, drops default ports, the fragment and the
+    trailing slash, and (when URL_STRIP_TRACKING_PARAMS is set) tracking query
+    parameters. Results are memoized per raw string, so the schema, service
+    and router layers can all call this without repeating the work.
+
+    Raises:
+        ValueError: If the URL is too long, not http(s), or has no host
+    """
+    return _canonicalize(url, settings.URL_STRIP_TRACKING_PARAMS)
+
+
+def url_hash(url: str) -> int:
+    """Stable 64-bit hash of a canonical URL (same in every process, unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def registrable_domain(host: str) -> str:
+    """
+    Best-effort registrable domain ("eTLD+1") of a lowercase hostname.
+
+    Uses a short list of common multi-label public suffixes rather than the
+    full Public Suffix List; IP addresses and single-label hosts are returned
+    unchanged.
+    """
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split(".")
+    if len(labels) <= 2:
+        return host
+    suffix_labels = 2 if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 1
+    return ".".join(labels[-(suffix_labels + 1):])
+
+
+@lru_cache(maxsize=settings.URL_CACHE_SIZE)
+def split_host(url: str) -> Tuple[str, str]:
+    """Return (host, registrable domain) of a canonical URL."""
+    host = urlsplit(url).hostname or ""
+    return host, registrable_domain(host)
+
+
+def normalize_host(name: str) -> str:
+    """
+    Validate and lowercase a hostname given on its own (e.g. a path parameter).
+
+    Raises:
+        ValueError: If the name is empty, too long or not a valid hostname
+    """
+    host = name.strip().lower().rstrip(".")
+    if not host or len(host) > MAX_HOST_LENGTH:
+        raise ValueError(f"Host must be between 1 and {MAX_HOST_LENGTH} characters")
+    if not _HOST_RE.match(host):
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            raise ValueError(f"Invalid host: {name}")
+    return host
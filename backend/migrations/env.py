@@ -13,7 +13,10 @@ from app import models  # Import all models for autogenerate
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
-config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+# `alembic -x db_url=...` migrates another database, e.g. a shard from DATABASE_SHARD_URLS
+config.set_main_option(
+    "sqlalchemy.url", context.get_x_argument(as_dictionary=True).get("db_url", settings.DATABASE_URL)
+)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -69,7 +72,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite cannot ALTER most constraints in place; autogenerate copy-and-move batches
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
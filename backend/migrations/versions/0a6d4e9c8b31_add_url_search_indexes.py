@@ -0,0 +1,46 @@
+"""add url search indexes
+
+Revision ID: 0a6d4e9c8b31
+Revises: f17b3d58e2a6
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6d4e9c8b31'
+down_revision: Union[str, None] = 'f17b3d58e2a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - add prefix (text_pattern_ops) and trigram (GIN) indexes on url.
+
+    Postgres only; SQLite deployments use the in-process search index instead.
+    Built CONCURRENTLY so writes are not blocked on large tables.
+    """
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_page_metrics_url_pattern "
+            "ON page_metrics (url text_pattern_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_page_metrics_url_trgm "
+            "ON page_metrics USING gin (url gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema - drop the url search indexes."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_page_metrics_url_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_page_metrics_url_pattern")
@@ -0,0 +1,54 @@
+"""add page_metric_daily rollups
+
+Revision ID: 1b8e5f2a7c40
+Revises: 0a6d4e9c8b31
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b8e5f2a7c40'
+down_revision: Union[str, None] = '0a6d4e9c8b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - add per-URL daily rollups written by the retention job."""
+    op.create_table('page_metric_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('host', sa.String(), nullable=True),
+    sa.Column('domain', sa.String(), nullable=True),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('visit_count', sa.Integer(), nullable=False),
+    sa.Column('link_count_min', sa.Integer(), nullable=False),
+    sa.Column('link_count_max', sa.Integer(), nullable=False),
+    sa.Column('link_count_sum', sa.Integer(), nullable=False),
+    sa.Column('word_count_min', sa.Integer(), nullable=False),
+    sa.Column('word_count_max', sa.Integer(), nullable=False),
+    sa.Column('word_count_sum', sa.Integer(), nullable=False),
+    sa.Column('image_count_min', sa.Integer(), nullable=False),
+    sa.Column('image_count_max', sa.Integer(), nullable=False),
+    sa.Column('image_count_sum', sa.Integer(), nullable=False),
+    sa.Column('last_visited', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_link_count', sa.Integer(), nullable=False),
+    sa.Column('last_word_count', sa.Integer(), nullable=False),
+    sa.Column('last_image_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('url', 'day', name='uq_page_metric_daily_url_day')
+    )
+    op.create_index('ix_page_metric_daily_host_day', 'page_metric_daily', ['host', 'day'], unique=False)
+    op.create_index('ix_page_metric_daily_domain_day', 'page_metric_daily', ['domain', 'day'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema - drop page_metric_daily."""
+    op.drop_index('ix_page_metric_daily_domain_day', table_name='page_metric_daily')
+    op.drop_index('ix_page_metric_daily_host_day', table_name='page_metric_daily')
+    op.drop_table('page_metric_daily')
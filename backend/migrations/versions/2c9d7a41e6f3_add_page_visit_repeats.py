@@ -0,0 +1,36 @@
+"""add page_visit_repeats for deduplicated visits
+
+Revision ID: 2c9d7a41e6f3
+Revises: 1b8e5f2a7c40
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c9d7a41e6f3'
+down_revision: Union[str, None] = '1b8e5f2a7c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - add timestamp-only records for visits with unchanged metrics."""
+    op.create_table('page_visit_repeats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('visit_id', sa.Integer(), nullable=False),
+    sa.Column('datetime_visited', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['visit_id'], ['page_metrics.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_page_visit_repeats_visit_datetime', 'page_visit_repeats', ['visit_id', 'datetime_visited'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema - drop page_visit_repeats."""
+    op.drop_index('ix_page_visit_repeats_visit_datetime', table_name='page_visit_repeats')
+    op.drop_table('page_visit_repeats')
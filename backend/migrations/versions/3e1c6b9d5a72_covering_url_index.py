@@ -0,0 +1,75 @@
+"""replace redundant page_metrics indexes with a covering url index
+
+Revision ID: 3e1c6b9d5a72
+Revises: 2c9d7a41e6f3
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e1c6b9d5a72'
+down_revision: Union[str, None] = '2c9d7a41e6f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COVERING_INDEX = 'ix_page_metrics_url_datetime_covering'
+# ix_page_metrics_id duplicates the primary key; the other two are prefixes of the covering index
+REDUNDANT_INDEXES = {
+    'ix_page_metrics_id': '(id)',
+    'ix_page_metrics_url': '(url)',
+    'ix_page_metrics_url_datetime': '(url, datetime_visited)',
+}
+
+
+def _drop_if_invalid(name: str) -> None:
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind,
+    # which IF NOT EXISTS would then keep
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name},
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY {name}")
+
+
+def upgrade() -> None:
+    """Upgrade schema - add (url, datetime_visited) INCLUDE (id, counts), drop the indexes it makes redundant.
+
+    On Postgres the new index is built and the old ones dropped CONCURRENTLY,
+    so writes continue throughout. The covering index is in place before
+    anything is dropped, so reads never lose their index.
+    """
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index(COVERING_INDEX, 'page_metrics', ['url', 'datetime_visited'], unique=False)
+        for name in REDUNDANT_INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+        return
+
+    with op.get_context().autocommit_block():
+        _drop_if_invalid(COVERING_INDEX)
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {COVERING_INDEX} "
+            "ON page_metrics (url, datetime_visited) INCLUDE (id, link_count, word_count, image_count)"
+        )
+        for name in REDUNDANT_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def downgrade() -> None:
+    """Downgrade schema - restore the id, url and (url, datetime_visited) indexes, drop the covering one."""
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, columns in REDUNDANT_INDEXES.items():
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON page_metrics {columns}")
+        op.drop_index(COVERING_INDEX, table_name='page_metrics')
+        return
+
+    with op.get_context().autocommit_block():
+        for name, columns in REDUNDANT_INDEXES.items():
+            _drop_if_invalid(name)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON page_metrics {columns}")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {COVERING_INDEX}")
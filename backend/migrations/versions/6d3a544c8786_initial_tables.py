@@ -24,7 +24,7 @@ def upgrade() -> None:
     op.create_table('page_metrics',
     sa.Column('id', sa.Integer(), nullable=False),
     sa.Column('url', sa.String(), nullable=False),
-    sa.Column('datetime_visited', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('datetime_visited', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
     sa.Column('link_count', sa.Integer(), nullable=False),
     sa.Column('word_count', sa.Integer(), nullable=False),
     sa.Column('image_count', sa.Integer(), nullable=False),
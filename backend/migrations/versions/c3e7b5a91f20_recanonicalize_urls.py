@@ -0,0 +1,97 @@
+"""re-canonicalize stored urls
+
+Revision ID: c3e7b5a91f20
+Revises: a8f9c2e1d4b3
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config.settings import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e7b5a91f20'
+down_revision: Union[str, None] = 'a8f9c2e1d4b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Frozen copy of app.utils.urls.canonicalize_url as of this revision, so later
+# changes to the live helper do not change what this migration writes
+MAX_URL_LENGTH = 2048
+MIN_URL_LENGTH = 1
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+TRACKING_PARAMS = frozenset({"gclid", "dclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_ga", "yclid"})
+
+
+def _is_tracking_param(name: str) -> bool:
+    lowered = name.lower()
+    return lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def canonicalize_url(url: str, strip_tracking: bool) -> str:
+    url = url.strip()
+    if not url or len(url) < MIN_URL_LENGTH:
+        raise ValueError(f"URL must be at least {MIN_URL_LENGTH} character long")
+    if len(url) > MAX_URL_LENGTH:
+        raise ValueError(f"URL exceeds maximum length of {MAX_URL_LENGTH} characters")
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        raise ValueError("URL must start with http:// or https://")
+    host = parts.hostname
+    if not host:
+        raise ValueError(f"Invalid URL: {url}")
+    try:
+        port = parts.port
+    except ValueError:
+        raise ValueError(f"Invalid URL: {url}")
+
+    netloc = f"[{host}]" if ":" in host else host
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    if parts.username is not None:
+        userinfo = parts.netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{netloc}"
+
+    query = parts.query
+    if strip_tracking and query:
+        query = urlencode(
+            [(k, v) for k, v in parse_qsl(query, keep_blank_values=True) if not _is_tracking_param(k)]
+        )
+
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def upgrade() -> None:
+    """Upgrade data - rewrite stored URLs into canonical form so index lookups match."""
+    bind = op.get_bind()
+    urls = bind.execute(sa.text("SELECT DISTINCT url FROM page_metrics")).scalars().all()
+
+    renames = []
+    for url in urls:
+        try:
+            canonical = canonicalize_url(url, settings.URL_STRIP_TRACKING_PARAMS)
+        except ValueError:
+            # Leave rows we cannot parse untouched rather than failing the upgrade
+            continue
+        if canonical != url:
+            renames.append({"old": url, "new": canonical})
+
+    update = sa.text("UPDATE page_metrics SET url = :new WHERE url = :old")
+    for start in range(0, len(renames), BATCH_SIZE):
+        bind.execute(update, renames[start:start + BATCH_SIZE])
+
+
+def downgrade() -> None:
+    """Downgrade data - no-op, the original spellings are not recoverable."""
+    pass
@@ -0,0 +1,36 @@
+"""add idempotency key to page_metrics
+
+Revision ID: d41f8a6c2b97
+Revises: c3e7b5a91f20
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8a6c2b97'
+down_revision: Union[str, None] = 'c3e7b5a91f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - add nullable idempotency_key with a unique index."""
+    op.add_column('page_metrics', sa.Column('idempotency_key', sa.String(length=255), nullable=True))
+    # NULLs are distinct, so rows recorded without a key are unaffected
+    op.create_index(
+        'ix_page_metrics_idempotency_key',
+        'page_metrics',
+        ['idempotency_key'],
+        unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema - remove idempotency_key."""
+    op.drop_index('ix_page_metrics_idempotency_key', table_name='page_metrics')
+    op.drop_column('page_metrics', 'idempotency_key')
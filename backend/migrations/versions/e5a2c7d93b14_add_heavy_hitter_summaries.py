@@ -0,0 +1,36 @@
+"""add heavy hitter summaries
+
+Revision ID: e5a2c7d93b14
+Revises: d41f8a6c2b97
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c7d93b14'
+down_revision: Union[str, None] = 'd41f8a6c2b97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - add checkpoint table for top domains/URLs summaries."""
+    op.create_table('heavy_hitter_summaries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('counters', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'kind', name='uq_heavy_hitter_summaries_day_kind')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema - drop heavy hitter summaries."""
+    op.drop_table('heavy_hitter_summaries')
@@ -0,0 +1,98 @@
+"""add host and domain columns
+
+Revision ID: f17b3d58e2a6
+Revises: e5a2c7d93b14
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+import ipaddress
+from typing import Sequence, Tuple, Union
+from urllib.parse import urlsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f17b3d58e2a6'
+down_revision: Union[str, None] = 'e5a2c7d93b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+# Frozen copy of app.utils.urls.split_host as of this revision, so later changes
+# to the live helper or its suffix list do not change what this migration writes
+MULTI_LABEL_SUFFIXES = frozenset({
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "ltd.uk", "plc.uk", "me.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au",
+    "co.nz", "org.nz", "co.jp", "ne.jp", "or.jp", "ac.jp", "co.kr", "or.kr",
+    "com.br", "com.cn", "net.cn", "org.cn", "com.hk", "com.sg", "com.tw",
+    "co.in", "net.in", "org.in", "co.za", "com.mx", "com.ar", "com.tr", "com.ng",
+    "github.io", "gitlab.io", "herokuapp.com", "vercel.app", "netlify.app", "pages.dev",
+    "blogspot.com", "appspot.com", "cloudfront.net", "azurewebsites.net",
+})
+
+
+def registrable_domain(host: str) -> str:
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split(".")
+    if len(labels) <= 2:
+        return host
+    suffix_labels = 2 if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 1
+    return ".".join(labels[-(suffix_labels + 1):])
+
+
+def split_host(url: str) -> Tuple[str, str]:
+    host = urlsplit(url).hostname or ""
+    return host, registrable_domain(host)
+
+
+def upgrade() -> None:
+    """Upgrade schema - add host/domain, backfill them in id-ordered batches, then index."""
+    op.add_column('page_metrics', sa.Column('host', sa.String(), nullable=True))
+    op.add_column('page_metrics', sa.Column('domain', sa.String(), nullable=True))
+
+    bind = op.get_bind()
+    select_batch = sa.text(
+        "SELECT id, url FROM page_metrics WHERE id > :last_id ORDER BY id LIMIT :batch_size"
+    )
+    update = sa.text("UPDATE page_metrics SET host = :host, domain = :domain WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = bind.execute(select_batch, {"last_id": last_id, "batch_size": BATCH_SIZE}).all()
+        if not rows:
+            break
+        params = []
+        for row_id, url in rows:
+            host, domain = split_host(url)
+            # Legacy rows without a parseable host keep NULLs
+            params.append({"id": row_id, "host": host or None, "domain": domain or None})
+        bind.execute(update, params)
+        last_id = rows[-1][0]
+
+    # Build indexes after the backfill so each update does not maintain them
+    op.create_index(
+        'ix_page_metrics_host_datetime',
+        'page_metrics',
+        ['host', 'datetime_visited'],
+        unique=False
+    )
+    op.create_index(
+        'ix_page_metrics_domain_datetime',
+        'page_metrics',
+        ['domain', 'datetime_visited'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema - drop host/domain and their indexes."""
+    op.drop_index('ix_page_metrics_domain_datetime', table_name='page_metrics')
+    op.drop_index('ix_page_metrics_host_datetime', table_name='page_metrics')
+    op.drop_column('page_metrics', 'domain')
+    op.drop_column('page_metrics', 'host')
@@ -0,0 +1,78 @@
+#!/bin/bash
+set -e
+
+# Compare a stock SQLite engine with the tuned embedded mode (pragmas + writer lock):
+# sequential inserts, latest-metrics reads, and concurrent writers.
+# Usage: ./scripts/bench-sqlite.sh [visits] [writer-threads]
+cd "$(dirname "$0")/.."
+
+VISITS=${1:-2000} THREADS=${2:-8} DATABASE_URL=${DATABASE_URL:-sqlite://} python - <<'PY'
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import Base
+from app.config.db import _create_engine
+from app.schemas.page_metric import PageMetricCreateDTO
+from app.services import page_metrics
+
+visits = int(os.environ["VISITS"])
+threads = int(os.environ["THREADS"])
+
+
+def dto(i):
+    return PageMetricCreateDTO(url=f"https://bench{i % 50}.example.com/", link_count=i, word_count=1, image_count=1)
+
+
+def run(label, make_engine):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+        db = Session()
+        start = time.perf_counter()
+        for i in range(visits):
+            page_metrics.create_page_visit(db, dto(i))
+        insert_rate = visits / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(visits):
+            page_metrics.get_latest_metrics_for_url(db, f"https://bench{i % 50}.example.com/")
+        read_rate = visits / (time.perf_counter() - start)
+        db.close()
+
+        errors = []
+        per_thread = visits // threads
+
+        def writer(worker):
+            session = Session()
+            try:
+                for i in range(per_thread):
+                    try:
+                        page_metrics.create_page_visit(session, dto(worker * per_thread + i))
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                session.close()
+
+        workers = [threading.Thread(target=writer, args=(w,)) for w in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        concurrent_rate = per_thread * threads / (time.perf_counter() - start)
+        engine.dispose()
+
+    print(f"{label:<10} {insert_rate:>10.0f} {read_rate:>10.0f} {concurrent_rate:>12.0f} {len(errors):>8}")
+
+
+print(f"{'engine':<10} {'inserts/s':>10} {'reads/s':>10} {'conc. wr/s':>12} {'errors':>8}")
+run("stock", lambda url: create_engine(url, connect_args={"check_same_thread": False}))
+run("tuned", _create_engine)
+PY
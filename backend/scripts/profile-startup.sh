@@ -0,0 +1,18 @@
+#!/bin/bash
+set -e
+
+# Show the slowest imports on the worker boot path (python -X importtime).
+# Usage: ./scripts/profile-startup.sh [top-n]
+cd "$(dirname "$0")/.."
+
+TOP=${1:-25}
+LOG=$(mktemp)
+trap 'rm -f "$LOG"' EXIT
+
+python -X importtime -c "import app.main" 2> "$LOG"
+
+echo "⏱️  Slowest imports (cumulative µs, self µs, module):"
+grep '^import time:' "$LOG" \
+    | awk -F'|' 'NR > 1 { self = $1; sub(/^import time: */, "", self); gsub(/^ +| +$/, "", $3); printf "%10d %10d  %s\n", $2, self, $3 }' \
+    | sort -rn \
+    | head -n "$TOP"
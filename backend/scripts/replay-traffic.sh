@@ -0,0 +1,9 @@
+#!/bin/bash
+set -e
+
+# Replay a traffic capture (TRAFFIC_CAPTURE_ENABLED=true writes logs/traffic.jsonl)
+# against a running backend and report latency percentiles and error rates per endpoint.
+# Usage: ./scripts/replay-traffic.sh logs/traffic.jsonl [--base-url URL] [--speed 1x|4x|max] [--concurrency N]
+cd "$(dirname "$0")/.."
+
+exec python -m app.utils.traffic_replay "$@"
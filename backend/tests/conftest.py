@@ -2,13 +2,17 @@
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.config import Base, get_db
 import app.config.db as db_config
+from app.models import PageMetric
+from app.schemas.page_metric import PageMetricCreateDTO
+from app.services import page_metrics
+from app.utils.urls import split_host
 
 
 @pytest.fixture(scope="function")
@@ -70,3 +74,57 @@ def client(db):
 def client_session():
     """Session-scoped test client (use sparingly)."""
     return TestClient(app)
+
+
+@pytest.fixture
+def record_visit(db):
+    """
+    Record a visit through page_metrics.create_page_visit.
+    Only the URL is required; the counts default to small fixed values.
+    """
+    def record(url, visited=None, link_count=5, word_count=50, image_count=2, key=None):
+        dto = PageMetricCreateDTO(
+            url=url, link_count=link_count, word_count=word_count, image_count=image_count,
+            datetime_visited=visited,
+        )
+        return page_metrics.create_page_visit(db, dto, idempotency_key=key)
+
+    return record
+
+
+@pytest.fixture
+def add_visit_row(db):
+    """
+    Add a stored visit row directly, bypassing create_page_visit (no dedup,
+    caches or commit), to seed history. Commit once the rows are added.
+    """
+    def add(url, visited, link_count=5, word_count=50, image_count=2):
+        host, domain = split_host(url)
+        row = PageMetric(
+            url=url, host=host, domain=domain, datetime_visited=visited,
+            link_count=link_count, word_count=word_count, image_count=image_count,
+        )
+        db.add(row)
+        return row
+
+    return add
+
+
+@pytest.fixture
+def capture_statements(db):
+    """
+    Start recording the SQL sent on the test engine from the call onwards.
+    Returns the list the statements are appended to.
+    """
+    captured = []
+
+    def append(conn, cursor, statement, *args):
+        captured.append(statement)
+
+    def capture():
+        event.listen(db.get_bind(), "before_cursor_execute", append)
+        return captured
+
+    yield capture
+    if event.contains(db.get_bind(), "before_cursor_execute", append):
+        event.remove(db.get_bind(), "before_cursor_execute", append)
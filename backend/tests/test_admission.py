@@ -0,0 +1,125 @@
+"""Tests for admission control and statement timeouts."""
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.config.db import statement_timeout_for
+from app.middleware import admission
+from app.middleware.admission import QUERY_CANCELED, AdmissionBudget, AdmissionMiddleware, database_error_handler
+from app.schemas.page_metric import PageMetricCreateDTO
+from app.services import page_metrics
+
+
+class TestAdmissionBudget:
+    """Tests for AdmissionBudget."""
+
+    def test_queued_request_gets_released_slot(self):
+        """Test a waiter is admitted as soon as an active request releases."""
+        async def scenario():
+            budget = AdmissionBudget("read", limit=1, max_queue=1, timeout=1.0)
+            assert await budget.acquire()
+            waiter = asyncio.create_task(budget.acquire())
+            await asyncio.sleep(0)
+            assert budget.waiting == 1
+            budget.release()
+            assert await waiter
+            return budget
+
+        budget = asyncio.run(scenario())
+        assert budget.active == 1 and budget.waiting == 0
+
+    def test_full_queue_rejects_immediately(self):
+        """Test requests beyond the wait queue are rejected without waiting."""
+        async def scenario():
+            budget = AdmissionBudget("write", limit=1, max_queue=0, timeout=10.0)
+            assert await budget.acquire()
+            assert not await asyncio.wait_for(budget.acquire(), 0.1)
+            return budget
+
+        assert asyncio.run(scenario()).rejected == 1
+
+    def test_wait_times_out(self):
+        """Test a queued request is rejected after the queue timeout."""
+        async def scenario():
+            budget = AdmissionBudget("read", limit=1, max_queue=5, timeout=0.01)
+            await budget.acquire()
+            admitted = await budget.acquire()
+            return budget, admitted
+
+        budget, admitted = asyncio.run(scenario())
+        assert not admitted
+        assert budget.waiting == 0 and budget.active == 1
+
+
+class TestAdmissionMiddleware:
+    """Tests for AdmissionMiddleware responses."""
+
+    def _app(self):
+        app = FastAPI()
+        app.add_middleware(AdmissionMiddleware)
+
+        @app.get("/visits")
+        def visits():
+            return []
+
+        @app.get("/health")
+        def health():
+            return {"status": "ok"}
+
+        return app
+
+    def test_exhausted_budget_returns_503_with_retry_after(self, monkeypatch):
+        """Test shed requests get a fast 503 and Retry-After, while /health still answers."""
+        monkeypatch.setattr(admission, "read_budget", AdmissionBudget("read", 0, 0, 0.1))
+        client = TestClient(self._app())
+
+        response = client.get("/visits")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert client.get("/health").status_code == 200
+
+
+class TestStatementTimeout:
+    """Tests for per-endpoint statement_timeout selection."""
+
+    def test_longest_prefix_wins(self, monkeypatch):
+        """Test the most specific configured prefix sets the timeout."""
+        from app.config.settings import settings
+
+        monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+        monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUTS_MS", {"/metrics": 1000, "/metrics/stats": 15000})
+
+        assert statement_timeout_for("/metrics/stats") == 15000
+        assert statement_timeout_for("/metrics") == 1000
+        assert statement_timeout_for("/visits") == 5000
+
+
+class _Canceled(Exception):
+    pgcode = QUERY_CANCELED
+
+
+class TestWriteTimeout:
+    """Tests for statement timeouts on the write path."""
+
+    def test_timed_out_insert_is_a_retryable_503(self, db, monkeypatch):
+        """Test a cancelled POST /visits insert reaches the 503 handler instead of becoming a 500."""
+        def canceled_commit():
+            raise OperationalError("INSERT", {}, _Canceled())
+
+        monkeypatch.setattr(db, "commit", canceled_commit)
+        app = FastAPI()
+        app.add_exception_handler(OperationalError, database_error_handler)
+
+        @app.post("/visits")
+        def create():
+            dto = PageMetricCreateDTO(url="https://example.com", link_count=1, word_count=2, image_count=3)
+            return page_metrics.create_page_visit(db, dto)
+
+        response = TestClient(app).post("/visits")
+
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
@@ -0,0 +1,190 @@
+"""Tests for the cold visit archive."""
+
+import fcntl
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config.settings import settings
+from app.models import PageMetric, PageVisitRepeat
+from app.services import archive, dedup, page_metrics, retention
+from app.services.archive import Archive, ArchivedVisit
+from app.utils.urls import url_hash
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+URL = "https://archive.example.com/a"
+
+
+def _archived(visit_id, url=URL, hours_ago=0, link_count=1):
+    return ArchivedVisit(visit_id, url, link_count, 100, 2, NOW - timedelta(hours=hours_ago))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return Archive(str(tmp_path / "archive"), block_rows=4)
+
+
+@pytest.fixture
+def archiving(store, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_ENABLED", True)
+    monkeypatch.setattr(archive, "store", store)
+    return store
+
+
+class TestSegments:
+    """Tests for writing and reading segments."""
+
+    def test_pending_segment_is_invisible_until_published(self, store):
+        """Test staged visits are read only after publish."""
+        pending = store.stage([_archived(1), _archived(2, hours_ago=1)])
+        assert store.visits_for_url(URL, 10, 0) == []
+
+        pending.publish()
+        assert [v.id for v in store.visits_for_url(URL, 10, 0)] == [1, 2]
+
+    def test_pages_newest_first_across_segments(self, store):
+        """Test limit/offset page through several segments in visit order."""
+        store.stage([_archived(i, hours_ago=i) for i in range(0, 10, 2)]).publish()
+        store.stage([_archived(i, hours_ago=i) for i in range(1, 10, 2)]).publish()
+
+        assert [v.id for v in store.visits_for_url(URL, 4, 0)] == [0, 1, 2, 3]
+        assert [v.id for v in store.visits_for_url(URL, 4, 8)] == [8, 9]
+        assert store.visits_for_url("https://archive.example.com/other", 4, 0) == []
+
+    def test_lookup_reads_only_matching_blocks(self, store):
+        """Test a URL lookup decompresses only blocks whose hash range holds it."""
+        urls = [f"https://archive.example.com/{i}" for i in range(40)]
+        store.stage([_archived(i, url=url) for i, url in enumerate(urls)]).publish()
+        segment = store.segments()[0]
+
+        assert len(segment.index["blocks"]) == 10
+        assert len(segment._blocks_for(url_hash(urls[7]))) == 1
+        assert [v.id for v in store.visits_for_url(urls[7], 10, 0)] == [7]
+
+    def test_lookup_skips_segments_without_the_url(self, store, monkeypatch):
+        """Test only the segment holding a URL is decompressed, though every block spans its hash."""
+        urls = sorted((f"https://archive.example.com/{i}" for i in range(6)), key=url_hash)
+        for i in range(4):
+            # With the lowest and highest hash in it, each segment's one block spans every URL
+            store.stage([_archived(i, url=urls[0]), _archived(10 + i, url=urls[5]),
+                         _archived(20 + i, url=urls[i + 1])]).publish()
+        decompressed = []
+        real_decompress = archive.zlib.decompress
+        monkeypatch.setattr(archive.zlib, "decompress", lambda data: decompressed.append(1) or real_decompress(data))
+
+        assert [v.id for v in store.visits_for_url(urls[3], 10, 0)] == [22]
+        assert len(decompressed) == 1
+        assert store.visits_for_url("https://archive.example.com/never", 10, 0) == []
+        assert len(decompressed) == 1
+
+    def test_compaction_merges_segments_without_changing_reads(self, store):
+        """Test compaction leaves one segment with the same visits."""
+        for i in range(5):
+            store.stage([_archived(i, hours_ago=i)]).publish()
+        before = store.visits_for_url(URL, 10, 0)
+
+        assert store.compact(target_rows=100) == 5
+        assert len(store.segments()) == 1
+        assert store.visits_for_url(URL, 10, 0) == before
+
+    def test_one_compactor_at_a_time(self, store):
+        """Test a compaction finds the lock held by another compactor and leaves the segments alone."""
+        for i in range(3):
+            store.stage([_archived(i, hours_ago=i)]).publish()
+
+        with open(store.directory / archive.COMPACT_LOCK, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            other = Archive(str(store.directory), block_rows=4)
+            assert other.compact(target_rows=100) == 0
+        assert len(store.segments()) == 3
+        assert store.compact(target_rows=100) == 3
+
+
+class TestRecover:
+    """Tests for settling pending segments after a crash."""
+
+    def test_publishes_when_rows_were_deleted(self, db, store):
+        """Test a pending segment whose rows are gone from the database is published."""
+        store.stage([_archived(1)])
+
+        assert store.recover(db, min_age_seconds=0) == 1
+        assert [v.id for v in store.visits_for_url(URL, 10, 0)] == [1]
+
+    def test_discards_when_rows_remain(self, db, store, add_visit_row):
+        """Test a pending segment whose batch rolled back is discarded."""
+        add_visit_row(URL, NOW - timedelta(days=40), link_count=1)
+        db.commit()
+        row = db.query(PageMetric).one()
+        store.stage([_archived(row.id)])
+
+        assert store.recover(db, min_age_seconds=0) == 1
+        assert store.visits_for_url(URL, 10, 0) == []
+        assert list(store.directory.iterdir()) == []
+
+    def test_leaves_recent_pending_segments(self, db, store):
+        """Test a pending segment that may still be committing is not touched."""
+        store.stage([_archived(1)])
+
+        assert store.recover(db) == 0
+        assert len(list(store.directory.iterdir())) == 2
+
+
+class TestRetentionArchiving:
+    """Tests for archiving rolled-up visits and reading them back."""
+
+    def test_visits_page_falls_through_to_archive(self, db, archiving, add_visit_row):
+        """Test /visits continues from the archive once the database rows run out."""
+        for days_ago in (1, 2, 40, 41, 42):
+            add_visit_row(URL, NOW - timedelta(days=days_ago), link_count=days_ago)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        assert db.query(PageMetric).count() == 2
+        counts = lambda **page: [v.link_count for v in page_metrics.get_visits_for_url(db, URL, **page)]
+        assert counts() == [1, 2, 40, 41, 42]
+        assert counts(limit=2, offset=1) == [2, 40]
+        assert counts(limit=2, offset=3) == [41, 42]
+        assert page_metrics.get_latest_metrics_for_url(db, URL).visit_count == 5
+
+    def test_page_merges_archived_visits_newer_than_kept_rows(self, db, archiving, monkeypatch, record_visit, add_visit_row):
+        """Test an old row kept for its repeats is paged after the newer visits already archived."""
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", True)
+        monkeypatch.setattr(dedup, "cache", dedup.LatestMetricsCache(100))
+        add_visit_row(URL, NOW - timedelta(days=45), link_count=45)
+        add_visit_row(URL, NOW - timedelta(days=40), link_count=40)
+        db.commit()
+        kept = record_visit(URL, NOW - timedelta(days=50), link_count=50)
+        # A recent repeat keeps the 50-day-old row in the database
+        db.add(PageVisitRepeat(visit_id=kept.id, datetime_visited=NOW - timedelta(days=1)))
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+        assert [row.link_count for row in db.query(PageMetric)] == [50]
+
+        counts = lambda **page: [v.link_count for v in page_metrics.get_visits_for_url(db, URL, **page)]
+        assert counts() == [50, 40, 45, 50]
+        assert counts(limit=2) == [50, 40]
+        assert counts(limit=2, offset=2) == [45, 50]
+        ids = page_metrics.get_visits_for_url(db, URL, fields=("id",))
+        assert len(ids) == 4 and set(ids[0]) == {"id"}
+
+    def test_repeats_are_archived(self, db, archiving, monkeypatch, record_visit):
+        """Test rolled-up repeats keep their public (negative) ids in the archive."""
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", True)
+        monkeypatch.setattr(dedup, "cache", dedup.LatestMetricsCache(100))
+        for hours in (0, 1):
+            record_visit(URL, NOW - timedelta(days=40, hours=-hours))
+        repeat_id = db.query(PageVisitRepeat).one().id
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        assert [v.id for v in archiving.visits_for_url(URL, 10, 0)][0] == -repeat_id
+        assert len(page_metrics.get_visits_for_url(db, URL)) == 2
+
+    def test_disabled_archive_is_not_read(self, db, store, monkeypatch, add_visit_row):
+        """Test nothing is written or read with ARCHIVE_ENABLED off."""
+        monkeypatch.setattr(archive, "store", store)
+        add_visit_row(URL, NOW - timedelta(days=40), link_count=1)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        assert store.segments() == []
+        assert page_metrics.get_visits_for_url(db, URL) == []
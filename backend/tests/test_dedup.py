@@ -0,0 +1,151 @@
+"""Tests for compact storage of repeated visits."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config.settings import settings
+from app.models import PageMetric, PageMetricDaily, PageVisitRepeat
+from app.services import dedup, page_metrics, retention, stats
+
+URL = "https://dedup.example.com/page"
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def compact(monkeypatch):
+    monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", True)
+    monkeypatch.setattr(dedup, "cache", dedup.LatestMetricsCache(100))
+
+
+class TestCompactStorage:
+    """Tests for repeat records on create and their expansion on read."""
+
+    def test_unchanged_revisit_stores_repeat(self, db, compact, record_visit):
+        """Test a revisit with the same counts writes a repeat, not a full row."""
+        first = record_visit(URL, NOW)
+        second = record_visit(URL, NOW + timedelta(hours=1))
+
+        assert db.query(PageMetric).count() == 1
+        assert db.query(PageVisitRepeat).count() == 1
+        assert second.id < 0 and second.id != first.id
+        assert second.link_count == first.link_count
+
+    def test_changed_or_keyed_visit_stores_full_row(self, db, compact, record_visit):
+        """Test changed counts or an Idempotency-Key store a full row."""
+        record_visit(URL, NOW)
+        record_visit(URL, NOW + timedelta(hours=1), link_count=6)
+        record_visit(URL, NOW + timedelta(hours=2), link_count=6, key="k-1")
+
+        assert db.query(PageMetric).count() == 3
+        assert db.query(PageVisitRepeat).count() == 0
+
+    def test_reads_match_uncompacted_history(self, db, compact, record_visit):
+        """Test /visits and /metrics see repeats as ordinary visits."""
+        record_visit(URL, NOW)
+        record_visit(URL, NOW + timedelta(hours=1))
+        record_visit(URL, NOW + timedelta(hours=2), link_count=7)
+        record_visit(URL, NOW + timedelta(hours=3), link_count=7)
+
+        visits = page_metrics.get_visits_for_url(db, URL)
+        metrics = page_metrics.get_latest_metrics_for_url(db, URL)
+
+        assert [v.link_count for v in visits] == [7, 7, 5, 5]
+        assert len({v.id for v in visits}) == 4
+        assert metrics.visit_count == 4
+        assert metrics.link_count == 7
+        assert metrics.last_visited == visits[0].datetime_visited
+        assert stats.get_metric_stats(db, URL).visit_count == 4
+
+    def test_reads_expand_repeats_after_disabling(self, db, compact, monkeypatch, record_visit):
+        """Test stored repeats are still read once the setting is turned off."""
+        record_visit(URL, NOW)
+        record_visit(URL, NOW + timedelta(hours=1))
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", False)
+        monkeypatch.setattr(dedup, "_repeats_stored", False)
+
+        page_metrics.warm_up(db)
+
+        assert dedup.active()
+        assert len(page_metrics.get_visits_for_url(db, URL)) == 2
+
+    def test_repeats_written_later_are_picked_up(self, db, monkeypatch, record_visit):
+        """Test a worker with dedup off starts expanding repeats another worker writes after startup."""
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", False)
+        monkeypatch.setattr(dedup, "_repeats_stored", False)
+        visit = record_visit(URL, NOW)
+        page_metrics.warm_up(db)
+        assert not dedup.active()
+
+        db.add(PageVisitRepeat(visit_id=visit.id, datetime_visited=NOW + timedelta(hours=1)))
+        db.commit()
+        dedup.recheck_repeats(db)
+
+        assert dedup.active()
+        assert len(page_metrics.get_visits_for_url(db, URL)) == 2
+
+    def test_announced_repeat_switches_reads_at_once(self, monkeypatch):
+        """Test a repeat heard on the visit stream turns on repeat expansion without a query."""
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", False)
+        monkeypatch.setattr(dedup, "_repeats_stored", False)
+
+        dedup.note_visit({"id": 7})
+        assert not dedup.active()
+        dedup.note_visit({"id": -7})
+        assert dedup.active()
+
+    def test_change_feed_includes_repeats(self, db, compact, record_visit):
+        """Test following both cursors returns every visit once, repeats included, oldest first."""
+        created = [
+            record_visit(URL, NOW + timedelta(hours=hour), link_count=link_count).id
+            for hour, link_count in enumerate([5, 5, 6, 6, 6])
+        ]
+        assert sum(visit_id < 0 for visit_id in created) == 3
+
+        seen, since, since_repeat, has_more = [], 0, 0, True
+        while has_more:
+            page = page_metrics.get_visit_changes(db, since=since, limit=2, since_repeat=since_repeat)
+            seen += [v.id for v in page.changes]
+            since, since_repeat, has_more = page.next_cursor, page.next_repeat_cursor, page.has_more
+
+        assert seen == created
+        caught_up = page_metrics.get_visit_changes(db, since=since, since_repeat=since_repeat)
+        assert caught_up.changes == [] and caught_up.next_repeat_cursor == since_repeat
+
+    def test_retention_rolls_up_repeats_first(self, db, compact, record_visit):
+        """Test old repeats are folded in and their row goes once none refer to it."""
+        record_visit(URL, NOW - timedelta(days=41))
+        record_visit(URL, NOW - timedelta(days=40))
+        record_visit(URL, NOW - timedelta(days=1))
+
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+        # A recent repeat still refers to the old row, so it stays
+        assert db.query(PageMetric).count() == 1
+        assert db.query(PageVisitRepeat).count() == 1
+        assert page_metrics.get_latest_metrics_for_url(db, URL).visit_count == 3
+
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW + timedelta(days=30))
+        assert db.query(PageMetric).count() == 0
+        assert db.query(PageVisitRepeat).count() == 0
+        assert sum(r.visit_count for r in db.query(PageMetricDaily)) == 3
+
+
+class TestLatestMetricsCache:
+    """Tests for LatestMetricsCache."""
+
+    def test_match_requires_equal_counts(self):
+        """Test only identical counts match the cached row."""
+        cache = dedup.LatestMetricsCache(10)
+        cache.remember(URL, 1, (1, 2, 3))
+        assert cache.match(URL, (1, 2, 3)) == 1
+        assert cache.match(URL, (1, 2, 4)) is None
+
+    def test_evicts_least_recently_used(self):
+        """Test the cache is bounded, dropping the least recently used URL."""
+        cache = dedup.LatestMetricsCache(2)
+        cache.remember("https://a.com", 1, (0, 0, 0))
+        cache.remember("https://b.com", 2, (0, 0, 0))
+        cache.match("https://a.com", (0, 0, 0))
+        cache.remember("https://c.com", 3, (0, 0, 0))
+        assert len(cache) == 2
+        assert cache.match("https://b.com", (0, 0, 0)) is None
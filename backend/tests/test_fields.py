@@ -0,0 +1,96 @@
+"""Tests for sparse `fields=` projection on /metrics and /visits."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config.settings import settings
+from app.exceptions import InvalidFieldsException
+from app.schemas.page_metric import METRICS_FIELDS, VISIT_FIELDS
+from app.services import dedup, page_metrics, retention
+from app.utils.query_plans import explain_plan
+
+URL = "https://fields.example.com/page"
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+
+class TestParseFields:
+    """Tests for parse_fields."""
+
+    def test_keeps_schema_order_and_drops_duplicates(self):
+        """Test equal selections normalize to the same tuple."""
+        assert page_metrics.parse_fields("visit_count, last_visited,visit_count", METRICS_FIELDS) == (
+            "last_visited", "visit_count",
+        )
+
+    @pytest.mark.parametrize("raw", [None, "", " , "])
+    def test_absent_selects_everything(self, raw):
+        """Test a missing or empty parameter means the full response."""
+        assert page_metrics.parse_fields(raw, VISIT_FIELDS) is None
+
+    def test_unknown_field_is_rejected(self):
+        """Test unknown names raise a 400 listing the allowed fields."""
+        with pytest.raises(InvalidFieldsException) as error:
+            page_metrics.parse_fields("id,password", VISIT_FIELDS)
+        assert error.value.status_code == 400
+        assert "password" in error.value.detail
+
+
+class TestProjectedReads:
+    """Tests for projected service reads."""
+
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_visits_match_full_response(self, db, monkeypatch, compact, record_visit):
+        """Test each projected visit equals the full visit narrowed to the fields."""
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", compact)
+        monkeypatch.setattr(dedup, "cache", dedup.LatestMetricsCache(100))
+        record_visit(URL, NOW)
+        record_visit(URL, NOW + timedelta(hours=1))
+        record_visit(URL, NOW + timedelta(hours=2), link_count=7)
+        fields = ("id", "datetime_visited")
+
+        full = page_metrics.get_visits_for_url(db, URL, tz_offset_hours=0)
+        projected = page_metrics.get_visits_for_url(db, URL, tz_offset_hours=0, fields=fields)
+
+        assert projected == [visit.model_dump(include=set(fields)) for visit in full]
+
+    def test_metrics_count_includes_rolled_up_visits(self, db, record_visit):
+        """Test visit_count alone still counts raw and rolled-up visits."""
+        record_visit(URL, NOW - timedelta(hours=24 * 100))
+        record_visit(URL, NOW)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        assert page_metrics.get_latest_metrics_for_url(db, URL, fields=("visit_count",)) == {"visit_count": 2}
+
+    def test_metrics_match_full_response(self, db, record_visit):
+        """Test the side panel's selection equals the full metrics narrowed to it."""
+        record_visit(URL, NOW)
+        record_visit(URL, NOW + timedelta(hours=1), link_count=9)
+        fields = ("link_count", "last_visited", "visit_count")
+
+        full = page_metrics.get_latest_metrics_for_url(db, URL, tz_offset_hours=0)
+        projected = page_metrics.get_latest_metrics_for_url(db, URL, tz_offset_hours=0, fields=fields)
+
+        assert projected == full.model_dump(include=set(fields))
+        assert page_metrics.get_latest_metrics_for_url(db, "https://never.example.com/", fields=fields) is None
+
+    def test_projected_statement_reads_only_the_index(self, db):
+        """Test a narrowed /metrics read is answered from the url index alone."""
+        stmt = page_metrics._projected_stmt(page_metrics._build_latest_stmt, "url", ("datetime_visited",))
+
+        plan = explain_plan(db, stmt, {"value": URL})
+        assert "ix_page_metrics_url_datetime_covering" in plan.index_only
+        assert "page_metrics" not in plan.full_scans
+
+
+class TestEndpoints:
+    """Tests for the fields parameter on the routes."""
+
+    @pytest.mark.parametrize("path", ["/metrics", "/visits"])
+    def test_unknown_field_returns_400(self, client, path):
+        """Test a bad selection is a client error, not a 500."""
+        response = client.get(path, params={"url": URL, "fields": "nope"})
+
+        assert response.status_code == 400
+        assert "nope" in response.json()["detail"]
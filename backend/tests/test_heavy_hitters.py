@@ -0,0 +1,109 @@
+"""Tests for the top domains/URLs summaries."""
+
+from datetime import date, datetime, timezone
+
+from app.models import HeavyHitterSummary
+from app.services.heavy_hitters import HeavyHitters, SpaceSaving
+
+TODAY = date(2026, 1, 10)
+NOW = datetime(2026, 1, 10, 12, tzinfo=timezone.utc)
+
+
+class TestSpaceSaving:
+    """Tests for the Space-Saving summary."""
+
+    def test_exact_when_under_capacity(self):
+        """Test counts are exact while distinct items fit in capacity."""
+        summary = SpaceSaving(capacity=10)
+        for item in ["a", "b", "a", "c", "a", "b"]:
+            summary.offer(item)
+        assert summary.top(2) == [("a", 3, 0), ("b", 2, 0)]
+
+    def test_heavy_hitter_survives_eviction(self):
+        """Test a frequent item stays on top despite a long tail."""
+        summary = SpaceSaving(capacity=5)
+        for i in range(200):
+            summary.offer("hot")
+            summary.offer(f"tail-{i}")
+        item, count, error = summary.top(1)[0]
+        assert item == "hot"
+        assert count - error <= 200 <= count
+        assert len(summary.counters) == 5
+
+    def test_eviction_takes_the_current_smallest(self):
+        """Test the evicted counter is the smallest now, not when it was last pushed."""
+        summary = SpaceSaving(capacity=3)
+        for item in ["a", "b", "c", "a", "a", "a", "a", "c", "c"]:
+            summary.offer(item)
+        summary.offer("d")
+        assert summary.to_dict() == {"a": [5, 0], "c": [3, 0], "d": [2, 1]}
+
+        summary.offer("e")
+        assert summary.to_dict() == {"a": [5, 0], "c": [3, 0], "e": [3, 2]}
+
+    def test_merge_sums_counts(self):
+        """Test merging two summaries adds counts per item."""
+        left = SpaceSaving.from_dict(10, {"a": [2, 0], "b": [1, 0]})
+        right = SpaceSaving.from_dict(10, {"a": [3, 0]})
+        assert left.merge(right).top(2) == [("a", 5, 0), ("b", 1, 0)]
+
+    def test_merge_charges_absent_items_the_other_floor(self):
+        """Test an item one full summary lacks gets that summary's smallest count as count and error."""
+        left = SpaceSaving.from_dict(2, {"a": [10, 0], "b": [4, 1]})
+        right = SpaceSaving.from_dict(2, {"a": [3, 0], "c": [6, 2]})
+
+        assert left.merge(right).to_dict() == {"a": [13, 0], "c": [10, 6]}
+        assert left.merge(right).to_dict() == right.merge(left).to_dict()
+
+    def test_merged_counts_stay_upper_bounds(self):
+        """Test every merged count bounds the item's true count over both streams from above."""
+        # The second summary sees "a" five times, then evicts it
+        streams = [["a"] * 10 + ["b"] * 2, ["a"] * 5 + ["c"] * 6 + ["d"] * 6]
+        summaries = []
+        for stream in streams:
+            summary = SpaceSaving(capacity=2)
+            for item in stream:
+                summary.offer(item)
+            summaries.append(summary)
+
+        merged = summaries[0].merge(summaries[1])
+        assert [item for item, _, _ in merged.top(2)] == ["a", "d"]
+        for item, count, error in merged.top(2):
+            true_count = sum(stream.count(item) for stream in streams)
+            assert count - error <= true_count <= count
+
+
+class TestHeavyHitters:
+    """Tests for windowed tracking and checkpointing."""
+
+    def test_top_domains_over_window(self):
+        """Test visits outside the window are not counted."""
+        tracker = HeavyHitters(capacity=10, retention_days=30)
+        tracker.record("https://example.com/a", NOW)
+        tracker.record("https://example.com/b", NOW)
+        tracker.record("https://other.com", datetime(2025, 12, 1, tzinfo=timezone.utc))
+
+        assert tracker.top("domain", days=7, k=5, today=TODAY) == [("example.com", 2, 0)]
+        assert tracker.top("url", days=7, k=1, today=TODAY)[0][1] == 1
+
+    def test_checkpoint_merges_workers(self, db):
+        """Test two workers' checkpoints combine into the shared row."""
+        first = HeavyHitters(capacity=10, retention_days=3650)
+        second = HeavyHitters(capacity=10, retention_days=3650)
+        first.record("https://example.com", NOW)
+        second.record("https://example.com", NOW)
+        second.record("https://other.com", NOW)
+
+        first.checkpoint(db)
+        second.checkpoint(db)
+
+        row = db.query(HeavyHitterSummary).filter_by(day=TODAY, kind="domain").one()
+        assert row.counters == {"example.com": [2, 0], "other.com": [1, 0]}
+        assert second.top("domain", days=1, k=1, today=TODAY) == [("example.com", 2, 0)]
+
+        restarted = HeavyHitters(capacity=10, retention_days=3650)
+        restarted.load(db)
+        assert restarted.top("domain", days=1, k=2, today=TODAY) == [
+            ("example.com", 2, 0),
+            ("other.com", 1, 0),
+        ]
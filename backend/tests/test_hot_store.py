@@ -0,0 +1,217 @@
+"""Tests for the in-process hot store of recent visits."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config.settings import settings
+from app.models import PageMetric
+from app.services import dedup, hot_store, page_metrics, retention, stats, visit_stream
+from app.services.hot_store import ROW_BYTES, HotStore
+
+URL = "https://hot.example.com/page"
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+@pytest.fixture
+def hot(db, monkeypatch):
+    monkeypatch.setattr(settings, "HOT_STORE_ENABLED", True)
+    monkeypatch.setattr(visit_stream, "bridge_generation", lambda: 1)
+    monkeypatch.setattr(hot_store, "store", HotStore(window_hours=24, max_bytes=1 << 20))
+    return hot_store.store
+
+
+def _from_sql(monkeypatch, read):
+    with monkeypatch.context() as patch:
+        patch.setattr(hot_store, "store", HotStore(window_hours=24, max_bytes=1 << 20))
+        return read()
+
+
+class TestReads:
+    """Tests for reads answered from the store."""
+
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_recent_page_is_served_without_a_query(
+        self, db, hot, monkeypatch, compact, record_visit, capture_statements
+    ):
+        """Test a page within the window, repeats included, matches SQL and runs no query."""
+        monkeypatch.setattr(settings, "VISIT_DEDUP_ENABLED", compact)
+        monkeypatch.setattr(dedup, "cache", dedup.LatestMetricsCache(100))
+        record_visit(URL, NOW - timedelta(hours=48))
+        for hour in range(5):
+            record_visit(URL, NOW - timedelta(hours=hour), link_count=hour // 2)
+        hot.load(db, now=NOW)
+        statements = capture_statements()
+
+        served = page_metrics.get_visits_for_url(db, URL, limit=3, offset=1, tz_offset_hours=0)
+        assert statements == []
+        assert served == _from_sql(
+            monkeypatch, lambda: page_metrics.get_visits_for_url(db, URL, limit=3, offset=1, tz_offset_hours=0)
+        )
+
+    def test_page_reaching_past_the_window_falls_back(self, db, hot, record_visit):
+        """Test a page needing older visits is read from the database."""
+        record_visit(URL, NOW - timedelta(hours=48))
+        record_visit(URL, NOW)
+        hot.load(db, now=NOW)
+
+        visits = page_metrics.get_visits_for_url(db, URL, limit=5, fields=("id",))
+        assert len(visits) == 2
+
+    def test_metrics_count_older_and_rolled_up_visits(self, db, hot, monkeypatch, record_visit, capture_statements):
+        """Test visit_count adds visits before the window, rolled up or not, read once."""
+        record_visit(URL, NOW - timedelta(hours=24 * 100))
+        retention.roll_up_old_visits(db, older_than_days=30)
+        record_visit(URL, NOW - timedelta(hours=48))
+        record_visit(URL, NOW, link_count=9)
+        hot.load(db, now=NOW)
+
+        served = page_metrics.get_latest_metrics_for_url(db, URL, tz_offset_hours=0)
+        assert served.visit_count == 3
+        assert served == _from_sql(monkeypatch, lambda: page_metrics.get_latest_metrics_for_url(db, URL, tz_offset_hours=0))
+
+        statements = capture_statements()
+        assert page_metrics.get_latest_metrics_for_url(db, URL, fields=("visit_count",)) == {"visit_count": 3}
+        assert statements == []
+
+    def test_new_visits_are_read_back_immediately(self, db, hot, record_visit):
+        """Test a recorded visit is in the next read, and older ones update the count."""
+        hot.load(db, now=NOW)
+        record_visit(URL, NOW - timedelta(hours=1))
+        assert page_metrics.get_latest_metrics_for_url(db, URL).visit_count == 1
+
+        created = record_visit(URL, NOW, link_count=8)
+        record_visit(URL, NOW - timedelta(hours=48))
+        latest = page_metrics.get_latest_metrics_for_url(db, URL)
+        assert (latest.link_count, latest.visit_count) == (8, 3)
+        assert page_metrics.get_visits_for_url(db, URL, limit=1)[0].id == created.id
+
+    def test_writes_only_buffer_until_maintenance(self, db, hot):
+        """Test adds never re-sort the columns in the caller's thread; maintenance merges them."""
+        hot.load(db, now=NOW)
+        for i in range(5000):
+            hot.add(i + 1, URL, i, 0, 0, NOW - timedelta(seconds=i))
+
+        assert len(hot._columns["id"]) == 0
+        assert [visit.id for visit in hot.visits(URL, limit=2, offset=0)] == [1, 2]
+
+        hot.maintain(now=NOW)
+        assert len(hot._columns["id"]) == 5000
+        assert [visit.id for visit in hot.visits(URL, limit=2, offset=4998)] == [4999, 5000]
+
+    def test_repeated_announcement_is_ignored(self, db, hot, record_visit):
+        """Test a visit heard twice (directly and over the bridge) is held once."""
+        hot.load(db, now=NOW)
+        created = record_visit(URL, NOW)
+        hot_store._on_visit({
+            "id": created.id, "url": URL, "link_count": 5, "word_count": 50, "image_count": 2,
+            "datetime_visited": NOW,
+        })
+
+        assert hot.rows == 1
+
+    def test_stats_match_the_database(self, db, hot, monkeypatch, record_visit, capture_statements):
+        """Test a range inside the window is reduced in process to the SQL answer."""
+        for hour, links in enumerate([3, 1, 4, 1, 5, 9]):
+            record_visit(URL, NOW - timedelta(hours=hour), link_count=links)
+        hot.load(db, now=NOW)
+        start, end = NOW - timedelta(hours=4), NOW
+
+        statements = capture_statements()
+        served = stats.get_metric_stats(db, URL, start=start, end=end)
+        assert statements == []
+        assert served.visit_count == 4
+        assert served == _from_sql(monkeypatch, lambda: stats.get_metric_stats(db, URL, start=start, end=end))
+
+
+class TestMaintenance:
+    """Tests for loading and eviction."""
+
+    def test_eviction_keeps_counts(self, db, hot, record_visit):
+        """Test rows leaving the window move into the URL's older count."""
+        record_visit(URL, NOW - timedelta(hours=10))
+        record_visit(URL, NOW)
+        hot.load(db, now=NOW)
+        assert page_metrics.get_latest_metrics_for_url(db, URL).visit_count == 2
+
+        hot.maintain(now=NOW + timedelta(hours=20))
+        assert hot.rows == 1
+        assert page_metrics.get_latest_metrics_for_url(db, URL).visit_count == 2
+
+    def test_byte_budget_shortens_the_window(self, db, hot, record_visit):
+        """Test a store over its budget keeps only the newest rows that fit."""
+        for hour in range(6):
+            record_visit(URL, NOW - timedelta(hours=hour))
+        hot.load(db, now=NOW)
+        hot.max_bytes = 4 * ROW_BYTES
+
+        hot.maintain(now=NOW)
+        assert hot.rows == 4
+        assert hot.covered_since == hot_store._micros(NOW - timedelta(hours=3))
+        assert len(page_metrics.get_visits_for_url(db, URL, limit=10)) == 6
+
+    def test_evicted_urls_release_their_codes(self, db, hot, record_visit):
+        """Test URLs with no rows left are dropped and the rest still resolve."""
+        record_visit("https://hot.example.com/old", NOW - timedelta(hours=10))
+        record_visit(URL, NOW)
+        hot.load(db, now=NOW)
+
+        hot.maintain(now=NOW + timedelta(hours=20))
+        assert hot._urls == [URL]
+        assert hot.visits(URL, limit=1, offset=0)[0].link_count == 5
+
+    def test_load_keeps_visits_added_during_the_scan(self, db, hot, monkeypatch):
+        """Test a visit committed while loading is held afterwards."""
+        gather = hot_store.sharding.gather
+
+        def gather_with_concurrent_add(db, query):
+            hot.add(10**9, URL, 1, 2, 3, NOW)
+            return gather(db, query)
+
+        monkeypatch.setattr(hot_store.sharding, "gather", gather_with_concurrent_add)
+        hot.load(db, now=NOW)
+
+        assert [visit.id for visit in hot.visits(URL, limit=1, offset=0)] == [10**9]
+
+    def test_window_must_be_shorter_than_retention(self, db, monkeypatch):
+        """Test enabling refuses a window retention would roll up rows from."""
+        monkeypatch.setattr(settings, "RETENTION_ENABLED", True)
+        monkeypatch.setattr(settings, "RETENTION_RAW_DAYS", 2)
+        monkeypatch.setattr(settings, "HOT_STORE_WINDOW_HOURS", 48)
+        monkeypatch.setattr(settings, "VISIT_STREAM_PG_BRIDGE", True)
+
+        with pytest.raises(ValueError, match="RETENTION_RAW_DAYS"):
+            hot_store.enable(db)
+
+    def test_enabling_requires_the_bridge(self, db, monkeypatch):
+        """Test the store refuses to start when other workers' visits could not reach it."""
+        monkeypatch.setattr(settings, "VISIT_STREAM_PG_BRIDGE", False)
+        monkeypatch.setattr(hot_store, "store", HotStore(window_hours=24, max_bytes=1 << 20))
+
+        with pytest.raises(ValueError, match="VISIT_STREAM_PG_BRIDGE"):
+            hot_store.enable(db)
+
+    def test_stopped_bridge_sends_reads_to_the_database(
+        self, db, hot, monkeypatch, record_visit, capture_statements
+    ):
+        """Test reads stop using the store once the listener is gone, as its visits may be missed."""
+        record_visit(URL, NOW)
+        hot.load(db, now=NOW)
+        monkeypatch.setattr(visit_stream, "bridge_generation", lambda: None)
+        statements = capture_statements()
+
+        assert len(page_metrics.get_visits_for_url(db, URL)) == 1
+        assert statements
+
+    def test_reconnected_bridge_reads_the_database_until_resynced(self, db, hot, monkeypatch):
+        """Test reads skip the store after a reconnect, as visits may have been missed, until resync reloads it."""
+        hot.load(db)
+        # Committed by another worker while no notification could arrive
+        db.add(PageMetric(url=URL, link_count=1, word_count=1, image_count=1, datetime_visited=NOW))
+        db.commit()
+        monkeypatch.setattr(visit_stream, "bridge_generation", lambda: 2)
+        assert hot_store.visits(URL, limit=1, offset=0) is None
+
+        hot_store.resync(db)
+        assert hot.generation == 2
+        assert [visit.link_count for visit in hot_store.visits(URL, limit=1, offset=0)] == [1]
@@ -0,0 +1,103 @@
+"""Tests for Idempotency-Key handling on visit creation."""
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.exceptions import (
+    DatabaseConnectionException,
+    IdempotencyKeyMismatchException,
+    InvalidIdempotencyKeyException,
+)
+from app.models import PageMetric
+from app.services import idempotency
+from app.services.idempotency import InMemoryIdempotencyStore
+
+URL = "https://example.com"
+
+
+class TestInMemoryIdempotencyStore:
+    """Tests for the per-worker TTL store."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the store never holds more than max_entries keys."""
+        store = InMemoryIdempotencyStore(max_entries=2, ttl_seconds=60)
+        store.set("a", {"v": 1})
+        store.set("b", {"v": 2})
+        store.get("a")
+        store.set("c", {"v": 3})
+
+        assert len(store) == 2
+        assert store.get("b") is None
+        assert store.get("a") == {"v": 1}
+
+    def test_expired_entries_are_misses(self):
+        """Test entries past their TTL are not returned."""
+        store = InMemoryIdempotencyStore(max_entries=10, ttl_seconds=0)
+        store.set("a", {"v": 1})
+        assert store.get("a") is None
+
+
+class TestIdempotencyLookup:
+    """Tests for key validation and fingerprint checks."""
+
+    def test_reused_key_with_different_body_rejected(self):
+        """Test a key replayed with a different payload raises 422."""
+        idempotency.remember("key-mismatch", "fp-1", {"id": 1})
+        with pytest.raises(IdempotencyKeyMismatchException):
+            idempotency.lookup("key-mismatch", "fp-2")
+
+    def test_blank_key_rejected(self):
+        """Test an empty key raises 400."""
+        with pytest.raises(InvalidIdempotencyKeyException):
+            idempotency.validate_key("   ")
+
+
+class TestCreatePageVisitIdempotency:
+    """Tests for the unique-key guard in create_page_visit."""
+
+    def test_duplicate_key_returns_original_row(self, db, record_visit):
+        """Test a retry that bypasses the cache does not insert a second row."""
+        first = record_visit(URL, key="retry-1")
+        second = record_visit(URL, key="retry-1")
+
+        assert second.id == first.id
+        assert db.query(PageMetric).count() == 1
+
+    def test_visits_without_key_are_independent(self, db, record_visit):
+        """Test requests without a key still insert every time."""
+        record_visit(URL)
+        record_visit(URL)
+
+        assert db.query(PageMetric).count() == 2
+
+    def test_reused_key_with_different_body_rejected_without_cache(self, db, record_visit):
+        """Test a key reused for another visit is rejected even when the replay cache missed."""
+        record_visit(URL, key="retry-2")
+
+        with pytest.raises(IdempotencyKeyMismatchException):
+            record_visit(URL, link_count=11, key="retry-2")
+        with pytest.raises(IdempotencyKeyMismatchException):
+            record_visit(URL, "2020-01-01T00:00:00Z", key="retry-2")
+        assert db.query(PageMetric).count() == 1
+
+    def test_other_integrity_errors_are_not_replays(self, db, monkeypatch, record_visit):
+        """Test a constraint failure unrelated to the key is reported, not looked up as a replay."""
+        def failing_commit():
+            raise IntegrityError("INSERT", {}, Exception("CHECK constraint failed"))
+
+        monkeypatch.setattr(db, "commit", failing_commit)
+        with pytest.raises(DatabaseConnectionException):
+            record_visit(URL, key="fresh-key")
+
+
+class TestIdempotencyStoreInterface:
+    """Tests for the backend interface."""
+
+    def test_incomplete_backend_cannot_be_instantiated(self):
+        """Test a backend missing `set` fails at construction, not at the first retry."""
+        class GetOnly(idempotency.IdempotencyStore):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            GetOnly()
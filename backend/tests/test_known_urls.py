@@ -0,0 +1,123 @@
+"""Tests for the known-URL Bloom filter."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config.settings import settings
+from app.models import PageMetric
+from app.services import known_urls, page_metrics, retention, visit_stream
+from app.services.known_urls import BloomFilter, KnownUrls
+
+URL = "https://known.example.com/page"
+
+
+@pytest.fixture
+def enabled(db, monkeypatch):
+    monkeypatch.setattr(settings, "KNOWN_URLS_FILTER_ENABLED", True)
+    monkeypatch.setattr(settings, "KNOWN_URLS_MIN_CAPACITY", 1000)
+    monkeypatch.setattr(settings, "VISIT_STREAM_PG_BRIDGE", True)
+    monkeypatch.setattr(visit_stream, "bridge_generation", lambda: 1)
+    monkeypatch.setattr(known_urls, "urls", KnownUrls())
+    monkeypatch.setattr(visit_stream, "hub", visit_stream.VisitHub())
+    return known_urls.enable(db)
+
+
+class TestBloomFilter:
+    """Tests for BloomFilter."""
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        """Test every added item is found and unseen items mostly are not."""
+        bloom = BloomFilter(capacity=2000, false_positive_rate=0.01)
+        for i in range(2000):
+            bloom.add(f"https://example.com/{i}")
+
+        assert all(f"https://example.com/{i}" in bloom for i in range(2000))
+        false_positives = sum(f"https://other.example.com/{i}" in bloom for i in range(10000))
+        assert false_positives < 300  # 1% expected
+
+
+class TestKnownUrls:
+    """Tests for the filter's use in reads and writes."""
+
+    def test_disabled_filter_answers_maybe(self):
+        """Test an unbuilt filter never claims a URL is unknown."""
+        assert KnownUrls().might_contain("https://anything.example.com/")
+
+    def test_built_from_existing_rows_and_rollups(self, db, monkeypatch, record_visit):
+        """Test the startup build covers raw visits and rolled-up-only URLs."""
+        record_visit("https://known.example.com/old", datetime(2020, 1, 1, tzinfo=timezone.utc))
+        record_visit(URL)
+        retention.roll_up_old_visits(db, older_than_days=30)
+        assert db.query(PageMetric).count() == 1
+
+        monkeypatch.setattr(settings, "KNOWN_URLS_MIN_CAPACITY", 1000)
+        filter_ = KnownUrls()
+        assert filter_.build(db) == 2
+        assert filter_.might_contain(URL)
+        assert filter_.might_contain("https://known.example.com/old")
+
+    def test_unknown_url_skips_the_database(self, db, enabled, capture_statements):
+        """Test /metrics and /visits for a never-recorded URL run no query."""
+        statements = capture_statements()
+
+        assert page_metrics.get_latest_metrics_for_url(db, "https://never.example.com/") is None
+        assert page_metrics.get_visits_for_url(db, "https://never.example.com/") == []
+        assert statements == []
+
+    def test_enabling_requires_the_bridge(self, db, monkeypatch):
+        """Test the filter refuses to start when other workers' URLs could not reach it."""
+        monkeypatch.setattr(settings, "VISIT_STREAM_PG_BRIDGE", False)
+        monkeypatch.setattr(known_urls, "urls", KnownUrls())
+
+        with pytest.raises(ValueError, match="VISIT_STREAM_PG_BRIDGE"):
+            known_urls.enable(db)
+        assert not known_urls.urls.ready
+
+    def test_stopped_bridge_lets_every_url_through(self, db, enabled, monkeypatch, capture_statements):
+        """Test an unknown URL takes the query once the listener is gone, as its URLs may be missed."""
+        monkeypatch.setattr(visit_stream, "bridge_generation", lambda: None)
+        statements = capture_statements()
+
+        assert page_metrics.get_latest_metrics_for_url(db, "https://never.example.com/") is None
+        assert statements
+
+    def test_reconnected_bridge_lets_every_url_through_until_resynced(self, db, enabled, monkeypatch,
+                                                                      capture_statements):
+        """Test the filter is bypassed after a reconnect, as URLs may have been missed, until resync rebuilds it."""
+        monkeypatch.setattr(visit_stream, "bridge_generation", lambda: 2)
+        statements = capture_statements()
+        assert page_metrics.get_latest_metrics_for_url(db, "https://never.example.com/") is None
+        assert statements
+
+        known_urls.resync(db)
+        statements.clear()
+        assert enabled.generation == 2
+        assert page_metrics.get_latest_metrics_for_url(db, "https://never.example.com/") is None
+        assert statements == []
+
+    def test_new_visit_is_known_immediately(self, db, enabled, record_visit):
+        """Test a URL recorded after the build is found by the next read."""
+        record_visit(URL)
+
+        assert enabled.might_contain(URL)
+        assert page_metrics.get_latest_metrics_for_url(db, URL).visit_count == 1
+
+    def test_other_workers_visits_arrive_through_the_hub(self, enabled):
+        """Test URLs announced on the visit stream (the cross-worker bridge) are added."""
+        visit_stream.hub.publish({"url": "https://elsewhere.example.com/"})
+
+        assert enabled.might_contain("https://elsewhere.example.com/")
+
+    def test_rebuild_keeps_urls_added_during_the_scan(self, db, enabled, monkeypatch):
+        """Test a rebuild does not lose URLs recorded while it was reading the table."""
+        gather = known_urls.sharding.gather
+
+        def gather_with_concurrent_add(db, query):
+            enabled.add("https://during-rebuild.example.com/")
+            return gather(db, query)
+
+        monkeypatch.setattr(known_urls.sharding, "gather", gather_with_concurrent_add)
+        known_urls.rebuild(db)
+
+        assert enabled.might_contain("https://during-rebuild.example.com/")
@@ -0,0 +1,81 @@
+"""Tests for the logging pipeline."""
+
+import json
+import threading
+
+from loguru import logger
+
+from app.config import logger as log_config
+
+
+class TestSamplingFilter:
+    """Tests for make_sampling_filter."""
+
+    @staticmethod
+    def _record(name, level_no):
+        level = type("Level", (), {"no": level_no})()
+        return {"name": name, "level": level, "extra": {"name": name}}
+
+    def test_unsampled_logger_keeps_everything(self):
+        """Test loggers without a configured rate are never sampled."""
+        keep = log_config.make_sampling_filter({"app.middleware": 0.0})
+        assert keep(self._record("app.services.page_metrics", 20))
+
+    def test_prefix_rate_applies_below_warning(self):
+        """Test a dotted prefix drops DEBUG/INFO but never warnings or errors."""
+        keep = log_config.make_sampling_filter({"app.middleware": 0.0})
+        assert not keep(self._record("app.middleware.db_middleware", 20))
+        assert keep(self._record("app.middleware.db_middleware", 30))
+        assert keep(self._record("app.middleware.db_middleware", 40))
+
+
+class TestBackgroundSink:
+    """Tests for BackgroundSink."""
+
+    def test_stop_flushes_queue(self):
+        """Test queued messages are written before the writer stops."""
+        written = []
+        sink = log_config.BackgroundSink(written.append, maxsize=100, name="test")
+        for i in range(10):
+            sink(f"line {i}\n")
+        sink.stop()
+        assert written == [f"line {i}\n" for i in range(10)]
+
+    def test_overflow_is_dropped_and_reported(self):
+        """Test a full queue drops messages and the writer reports the count."""
+        release = threading.Event()
+        written = []
+
+        def slow_write(text):
+            release.wait()
+            written.append(text)
+
+        sink = log_config.BackgroundSink(slow_write, maxsize=2, name="test")
+        for i in range(10):
+            sink(f"line {i}\n")
+        assert sink.dropped > 0
+        release.set()
+        sink.stop()
+        assert any("dropped" in line for line in written)
+
+
+class TestJsonFormat:
+    """Tests for JSON log output."""
+
+    def test_json_lines_carry_request_id_and_extra(self):
+        """Test each record renders as one JSON object with the request id."""
+        lines = []
+        logger.configure(patcher=log_config._add_request_id)
+        handler_id = logger.add(lines.append, format=log_config._json_format)
+        token = log_config.request_id_var.set("abc123")
+        try:
+            log_config.get_logger("app.test").bind(user="u1").info("hello")
+        finally:
+            log_config.request_id_var.reset(token)
+            logger.remove(handler_id)
+
+        payload = json.loads(lines[0])
+        assert payload["message"] == "hello"
+        assert payload["logger"] == "app.test"
+        assert payload["request_id"] == "abc123"
+        assert payload["extra"] == {"user": "u1"}
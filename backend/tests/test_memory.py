@@ -0,0 +1,117 @@
+"""Tests for memory diagnostics and the rate limiter's registrations."""
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.config.settings import settings
+from app.main import app as main_app
+from app.middleware import MemoryMiddleware, memory
+from app.middleware.rate_limit import limiter
+from app.utils.memory import RouteAllocations, Snapshots
+from app.utils.profiling import ProfiledRoute
+
+TOKEN = "s3cret"
+ADMIN = {"X-Admin-Token": TOKEN, "Content-Type": "application/json"}
+
+_retained = []
+
+
+def leak(items: int) -> None:
+    _retained.extend(bytearray(256) for _ in range(items))
+
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+@router.get("/leak/{name}")
+def leaky(name: str, items: int = 100) -> dict:
+    leak(items)
+    return {"name": name}
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_DIAGNOSTICS_TOKEN", TOKEN)
+    monkeypatch.setattr(memory, "snapshots", Snapshots())
+    yield
+    memory.snapshots.stop()
+    _retained.clear()
+
+
+class TestAdminEndpoints:
+    """Tests for the /debug/memory endpoints."""
+
+    @pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}])
+    def test_hidden_without_the_token(self, client, admin, headers):
+        """Test a missing or wrong token gets a plain 404."""
+        assert client.get("/debug/memory", headers=headers).status_code == 404
+
+    def test_hidden_when_unconfigured(self, client):
+        """Test no token is accepted while none is configured."""
+        assert client.get("/debug/memory", headers={"X-Admin-Token": ""}).status_code == 404
+
+    def test_report_includes_gauges(self, client, admin):
+        """Test the report covers the process, in-process structures and routes."""
+        body = client.get("/debug/memory", headers=ADMIN).json()
+
+        assert body["allocated_blocks"] > 0
+        assert body["tracing"] is None
+        assert {"rate_limit_counters", "dedup_cache", "hot_store_bytes", "log_queues"} <= set(body["gauges"])
+
+    def test_snapshot_diff_finds_the_leak(self, client, admin):
+        """Test the second snapshot's growth points at the allocation site of retained objects."""
+        first = client.post("/debug/memory/snapshots", headers=ADMIN).json()
+        assert first["growth"] is None
+        assert first["tracing"]["traced_bytes"] >= 0
+
+        leak(2000)
+        second = client.post("/debug/memory/snapshots", headers=ADMIN, params={"top": 5}).json()
+        assert len(second["top"]) <= 5
+        assert second["growth"][0]["location"].startswith(__file__)
+        assert second["growth"][0]["count_diff"] >= 2000
+
+        assert client.delete("/debug/memory/snapshots", headers=ADMIN).json() == {"tracing": None}
+        assert client.get("/debug/memory", headers=ADMIN).json()["tracing"] is None
+
+
+class TestRouteAllocations:
+    """Tests for sampled per-route allocation counts."""
+
+    def test_sampled_requests_are_summed_per_route(self, monkeypatch):
+        """Test the retaining route stands out, keyed by its template."""
+        monkeypatch.setattr(settings, "MEMORY_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(memory, "route_allocations", RouteAllocations())
+        test_app = FastAPI()
+        test_app.include_router(router)
+        test_app.add_middleware(MemoryMiddleware)
+        client = TestClient(test_app)
+
+        for name in ("a", "b", "c"):
+            client.get(f"/leak/{name}", params={"items": 500})
+        routes = memory.route_allocations.snapshot()
+        _retained.clear()
+
+        assert list(routes) == ["GET /leak/{name}"]
+        assert routes["GET /leak/{name}"]["samples"] == 3
+        assert routes["GET /leak/{name}"]["mean_retained_blocks"] >= 500
+        assert routes["GET /leak/{name}"]["mean_retained_bytes"] is None  # Not tracing
+
+    def test_middleware_not_installed_by_default(self):
+        """Test the app carries no sampling middleware unless configured."""
+        assert not memory.enabled()
+        assert MemoryMiddleware not in [m.cls for m in main_app.user_middleware]
+
+
+class TestRateLimiter:
+    """Tests for the rate limiter's limit registrations."""
+
+    def test_limits_do_not_grow_with_requests(self, client):
+        """Test serving requests registers no further limits, so each check hits one counter."""
+        client.get("/")
+        before = {name: len(limits) for name, limits in limiter._route_limits.items()}
+        for _ in range(5):
+            client.get("/")
+
+        assert {name: len(limits) for name, limits in limiter._route_limits.items()} == before
+        assert all(count == 1 for count in before.values())
@@ -0,0 +1,134 @@
+"""Tests for on-demand request profiling."""
+
+import threading
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.config.settings import settings
+from app.main import app as main_app
+from app.middleware import ProfilingMiddleware, profiling
+from app.utils import profiling as stack_sampling
+from app.utils.profiling import Profile, ProfiledRoute, StackSampler
+
+TOKEN = "s3cret"
+
+
+def busy_work(ms: int) -> int:
+    deadline = time.perf_counter() + ms / 1000
+    spins = 0
+    while time.perf_counter() < deadline:
+        spins += 1
+    return spins
+
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+@router.get("/busy/{name}")
+def busy(name: str, ms: int = 60) -> dict:
+    return {"name": name, "spins": busy_work(ms)}
+
+
+@pytest.fixture
+def profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", TOKEN)
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(profiling, "_aggregates", None)
+    test_app = FastAPI()
+    test_app.include_router(router)
+    test_app.add_middleware(ProfilingMiddleware)
+    return TestClient(test_app)
+
+
+class TestRequestProfiles:
+    """Tests for profiling single flagged requests."""
+
+    def test_flagged_request_writes_collapsed_stacks(self, profiled, tmp_path):
+        """Test the endpoint's worker thread is sampled and the file is named in the response."""
+        response = profiled.get("/busy/a?ms=80", headers={"X-Profile": TOKEN})
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "a"  # The wrapped endpoint still gets its parameters
+        lines = (tmp_path / response.headers["X-Profile-File"]).read_text().splitlines()
+        assert lines
+        assert all(line.startswith("GET /busy/{name};") for line in lines)
+        assert any(f"{__name__}:busy_work" in line for line in lines)
+
+    @pytest.mark.parametrize("headers", [{}, {"X-Profile": "wrong"}])
+    def test_unflagged_requests_are_not_profiled(self, profiled, tmp_path, headers):
+        """Test a missing or wrong token leaves no trace."""
+        response = profiled.get("/busy/a?ms=1", headers=headers)
+
+        assert response.status_code == 200
+        assert "X-Profile-File" not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestStackSampler:
+    """Tests for the shared sampler thread."""
+
+    def test_stop_waits_for_the_pass_in_progress(self, monkeypatch):
+        """Test a profile's stacks are final once stop returns, even mid-pass."""
+        in_pass = threading.Event()
+
+        def slow_collapse(frame):
+            in_pass.set()
+            time.sleep(0.2)
+            return "outer;inner"
+
+        monkeypatch.setattr(stack_sampling, "collapse", slow_collapse)
+        sampler = StackSampler(interval_seconds=0.001)
+        profile = Profile()
+        profile.threads.add(threading.get_ident())
+        sampler.start(profile)
+        assert in_pass.wait(timeout=5)
+
+        sampler.stop(profile)
+        stopped = dict(profile.stacks)
+        time.sleep(0.05)
+        assert stopped == {"outer;inner": 1} == dict(profile.stacks)
+
+
+class TestAggregateProfiles:
+    """Tests for sampled aggregate profiles."""
+
+    def test_sampled_requests_share_a_window(self, profiled, tmp_path, monkeypatch):
+        """Test sampled requests are written to one aggregate file rooted at their route."""
+        monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+        profiled.get("/busy/a?ms=40")
+        profiled.get("/busy/b?ms=40")
+        profiling.close_aggregates()
+
+        files = list(tmp_path.glob("aggregate-*.collapsed"))
+        assert len(files) == 1
+        assert "GET /busy/{name};" in files[0].read_text()
+
+    def test_keeps_newest_windows(self, tmp_path):
+        """Test rotation prunes all but the newest `keep` aggregate files."""
+        aggregates = profiling.AggregateProfiles(str(tmp_path), window_seconds=3600, keep=2)
+        names = [f"aggregate-2020010{day}T000000-1.collapsed" for day in (1, 2, 3)]
+        for name in names:
+            (tmp_path / name).write_text("")
+        profile = Profile()
+        profile.stacks["f"] += 1
+        aggregates.add("GET /x", profile)
+
+        written = aggregates.rotate(force=True)
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted([names[2], written.name])
+
+
+class TestDisabled:
+    """Tests for the default, unconfigured state."""
+
+    def test_middleware_not_installed(self):
+        """Test the app carries no profiling middleware unless configured."""
+        assert not profiling.enabled()
+        assert ProfilingMiddleware not in [m.cls for m in main_app.user_middleware]
+
+    def test_unprofiled_endpoint_runs_directly(self):
+        """Test route endpoints need no active profile."""
+        assert busy("x", ms=0)["name"] == "x"
@@ -0,0 +1,93 @@
+"""Tests pinning the hot history queries to their intended indexes."""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.config import Base
+from app.models import PageMetric
+from app.services import page_metrics
+from app.utils.query_plans import explain_plan
+
+COVERING_INDEX = "ix_page_metrics_url_datetime_covering"
+PARAMS = {"value": "https://example.com/a", "limit": 50, "offset": 0}
+EXPECTED_INDEX = {
+    "url": COVERING_INDEX,
+    "host": "ix_page_metrics_host_datetime",
+    "domain": "ix_page_metrics_domain_datetime",
+}
+HOT_STATEMENTS = {
+    "visits": page_metrics._VISITS_STMTS,
+    "latest": page_metrics._LATEST_STMTS,
+    "visits_with_repeats": page_metrics._VISITS_WITH_REPEATS_STMTS,
+    "latest_with_repeats": page_metrics._LATEST_WITH_REPEATS_STMTS,
+}
+
+# Postgres plans are only checked against a scratch database given here
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+class TestIndexes:
+    """Tests for the page_metrics index set."""
+
+    def test_no_redundant_indexes(self):
+        """Test the primary key and covering index are not shadowed by narrower duplicates."""
+        names = {index.name for index in PageMetric.__table__.indexes}
+        assert COVERING_INDEX in names
+        assert not names & {"ix_page_metrics_id", "ix_page_metrics_url", "ix_page_metrics_url_datetime"}
+
+
+class TestSqlitePlans:
+    """EXPLAIN QUERY PLAN checks on SQLite."""
+
+    @pytest.mark.parametrize("name", HOT_STATEMENTS)
+    @pytest.mark.parametrize("column", page_metrics.LOOKUP_COLUMNS)
+    def test_hot_queries_use_lookup_index(self, db, name, column):
+        """Test each per-URL/host/domain read searches its index and never scans page_metrics."""
+        plan = explain_plan(db, HOT_STATEMENTS[name][column], PARAMS)
+        assert EXPECTED_INDEX[column] in plan.indexes
+        assert "page_metrics" not in plan.full_scans
+
+    def test_repeats_join_is_index_only(self, db):
+        """Test expanding repeats reads only the repeats index."""
+        plan = explain_plan(db, page_metrics._VISITS_WITH_REPEATS_STMTS["url"], PARAMS)
+        assert "ix_page_visit_repeats_visit_datetime" in plan.index_only
+        assert "page_visit_repeats" not in plan.full_scans
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+class TestPostgresPlans:
+    """EXPLAIN checks on Postgres; needs an empty scratch database."""
+
+    @pytest.fixture
+    def pg(self):
+        engine = create_engine(POSTGRES_URL)
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        session.add_all(
+            PageMetric(
+                url=f"https://example.com/{i % 50}", host="example.com", domain="example.com",
+                datetime_visited=datetime(2026, 1, 1, tzinfo=timezone.utc), link_count=i,
+                word_count=i, image_count=i,
+            )
+            for i in range(1000)
+        )
+        session.commit()
+        # Index-only scans need an up-to-date visibility map
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM ANALYZE page_metrics")
+        session.execute(text("SET enable_seqscan = off"))
+        yield session
+        session.close()
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+    @pytest.mark.parametrize("name", ["visits", "latest"])
+    def test_url_reads_are_index_only(self, pg, name):
+        """Test /visits and /metrics for a URL are answered from the covering index alone."""
+        plan = explain_plan(pg, HOT_STATEMENTS[name]["url"], PARAMS)
+        assert COVERING_INDEX in plan.index_only
+        assert "page_metrics" not in plan.full_scans
@@ -0,0 +1,72 @@
+"""Tests for the retention rollup job."""
+
+from datetime import datetime, timedelta, timezone
+
+from app.models import PageMetric, PageMetricDaily
+from app.services import page_metrics, retention
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+URL = "https://example.com/a"
+
+
+def _days_ago(days, hours=0):
+    return NOW - timedelta(days=days, hours=hours)
+
+
+class TestRollUpOldVisits:
+    """Tests for roll_up_old_visits."""
+
+    def test_rolls_up_only_old_days(self, db, add_visit_row):
+        """Test raw rows past the cutoff become one rollup per URL and day."""
+        add_visit_row(URL, _days_ago(40), link_count=10)
+        add_visit_row(URL, _days_ago(40, 1), link_count=20)
+        add_visit_row(URL, _days_ago(41), link_count=5)
+        add_visit_row(URL, _days_ago(1), link_count=99)
+        db.commit()
+
+        result = retention.roll_up_old_visits(db, older_than_days=30, batch_size=2, now=NOW)
+
+        assert result.rows_rolled_up == 3
+        assert result.batches == 2
+        assert db.query(PageMetric).count() == 1
+        day = db.query(PageMetricDaily).filter_by(day=(NOW - timedelta(days=40)).date()).one()
+        assert day.visit_count == 2
+        assert (day.link_count_min, day.link_count_max, day.link_count_avg) == (10, 20, 15)
+        assert day.last_link_count == 10  # hours=0 is the later visit
+
+    def test_repeat_runs_merge_into_existing_rollup(self, db, add_visit_row):
+        """Test a second run adds to the same day's rollup instead of duplicating it."""
+        add_visit_row(URL, _days_ago(40), link_count=10)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+        add_visit_row(URL, _days_ago(40, 2), link_count=30)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        day = db.query(PageMetricDaily).one()
+        assert day.visit_count == 2
+        assert day.link_count_sum == 40
+
+    def test_latest_metrics_include_rolled_up_visits(self, db, add_visit_row):
+        """Test /metrics totals stay correct after rollup."""
+        add_visit_row(URL, _days_ago(40), link_count=10)
+        add_visit_row(URL, _days_ago(35), link_count=11)
+        add_visit_row(URL, _days_ago(1), link_count=12)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        metrics = page_metrics.get_latest_metrics_for_url(db, URL)
+        assert metrics.visit_count == 3
+        assert metrics.link_count == 12
+
+    def test_latest_metrics_when_all_rows_rolled_up(self, db, add_visit_row):
+        """Test a URL with only rollups still reports its latest visit and total."""
+        add_visit_row(URL, _days_ago(40), link_count=10)
+        add_visit_row(URL, _days_ago(35), link_count=11)
+        db.commit()
+        retention.roll_up_old_visits(db, older_than_days=30, now=NOW)
+
+        metrics = page_metrics.get_latest_metrics_for_url(db, URL)
+        assert metrics.visit_count == 2
+        assert metrics.link_count == 11
+        assert page_metrics.get_latest_metrics_for_domain(db, "example.com").visit_count == 2
@@ -0,0 +1,84 @@
+"""Tests for URL prefix/substring search."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import PageMetric
+from app.services import search
+from app.services.search import UrlIndex
+
+NOW = datetime(2026, 1, 10, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def history(db):
+    """Visits with distinct recency and counts."""
+    rows = [
+        ("https://example.com/docs", 0),
+        ("https://example.com/docs", 5),
+        ("https://example.com/blog", 1),
+        ("https://www.example.org/docs_100%", 2),
+        ("http://other.com/Example", 3),
+    ]
+    for url, hours_ago in rows:
+        db.add(PageMetric(
+            url=url,
+            link_count=1,
+            word_count=1,
+            image_count=1,
+            datetime_visited=NOW - timedelta(hours=hours_ago),
+        ))
+    db.commit()
+    return db
+
+
+@pytest.fixture(params=["sql", "index"])
+def backend(request, history):
+    """Run each test against the SQL path and the in-process index."""
+    if request.param == "index":
+        search.enable_index(history)
+    yield history
+    search.index = None
+
+
+class TestSearchUrls:
+    """Tests for search_urls on both backends."""
+
+    def test_prefix_without_scheme(self, backend):
+        """Test a bare host prefix matches http(s) and www variants."""
+        results = search.search_urls(backend, "EXAMPLE.", mode="prefix")
+        assert [r.url for r in results] == [
+            "https://example.com/docs",
+            "https://example.com/blog",
+            "https://www.example.org/docs_100%",
+        ]
+        assert results[0].visit_count == 2
+
+    def test_substring_case_insensitive(self, backend):
+        """Test substring search ignores case and ranks by recency."""
+        results = search.search_urls(backend, "example", mode="substring", limit=10)
+        assert [r.url for r in results][-1] == "http://other.com/Example"
+        assert len(results) == 4
+
+    def test_like_wildcards_are_literal(self, backend):
+        """Test % and _ in the query do not act as wildcards."""
+        results = search.search_urls(backend, "_100%", mode="substring")
+        assert [r.url for r in results] == ["https://www.example.org/docs_100%"]
+
+    def test_invalid_mode(self, backend):
+        """Test unknown modes raise ValueError."""
+        with pytest.raises(ValueError):
+            search.search_urls(backend, "x", mode="fuzzy")
+
+
+class TestUrlIndex:
+    """Tests for incremental index updates."""
+
+    def test_add_updates_stats(self):
+        """Test repeat visits bump count and recency without duplicating the URL."""
+        index = UrlIndex()
+        index.add("https://a.com", NOW - timedelta(days=1))
+        index.add("https://a.com", NOW)
+        assert len(index) == 1
+        assert index.search("a.com", "prefix", 5) == [("https://a.com", 2, NOW.replace(tzinfo=None))]
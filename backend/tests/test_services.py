@@ -1,13 +1,21 @@
 """Tests for page metrics service functions."""
 
+import os
+import threading
 import pytest
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
 
+from app.config import Base
+from app.config.settings import settings
 from app.models import PageMetric
 from app.services import page_metrics
 from app.schemas import page_metric as schemas
 
+# Postgres-only behaviour is only checked against a scratch database given here
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
 
 class TestCreatePageVisit:
     """Tests for create_page_visit service function."""
@@ -132,3 +140,142 @@ class TestGetVisitsForUrl:
         result = page_metrics.get_visits_for_url(db, url, limit=5)
         
         assert len(result) == 5
+
+
+class TestDomainQueries:
+    """Tests for domain-scoped visit lookups."""
+
+    def test_create_page_visit_stores_host_and_domain(self, db, record_visit):
+        """Test host and registrable domain are extracted at write time."""
+        result = record_visit("https://Blog.Example.com/post")
+
+        persisted = db.query(PageMetric).filter(PageMetric.id == result.id).one()
+        assert persisted.host == "blog.example.com"
+        assert persisted.domain == "example.com"
+
+    def test_registrable_domain_includes_subdomains(self, db, record_visit):
+        """Test querying example.com returns visits to all its hosts."""
+        record_visit("https://example.com/a")
+        record_visit("https://blog.example.com/b")
+        record_visit("https://other.com/c")
+
+        visits = page_metrics.get_visits_for_domain(db, "example.com")
+        metrics = page_metrics.get_latest_metrics_for_domain(db, "example.com")
+
+        assert {v.url for v in visits} == {"https://example.com/a", "https://blog.example.com/b"}
+        assert metrics.visit_count == 2
+
+    def test_subdomain_matches_exact_host(self, db, record_visit):
+        """Test querying a subdomain does not include sibling hosts."""
+        record_visit("https://example.com/a")
+        record_visit("https://blog.example.com/b")
+
+        visits = page_metrics.get_visits_for_domain(db, "blog.example.com")
+
+        assert [v.url for v in visits] == ["https://blog.example.com/b"]
+
+    def test_unknown_domain_returns_none(self, db):
+        """Test metrics for a never-visited domain are None."""
+        assert page_metrics.get_latest_metrics_for_domain(db, "nowhere.test") is None
+
+
+class TestVisitChanges:
+    """Tests for the incremental change feed."""
+
+    def test_pages_follow_cursor_in_insert_order(self, db, record_visit):
+        """Test following next_cursor returns every visit exactly once, oldest first."""
+        created = [record_visit(f"https://example.com/{i}").id for i in range(5)]
+
+        first = page_metrics.get_visit_changes(db, since=0, limit=2)
+        second = page_metrics.get_visit_changes(db, since=first.next_cursor, limit=2)
+        third = page_metrics.get_visit_changes(db, since=second.next_cursor, limit=2)
+
+        seen = [v.id for page in (first, second, third) for v in page.changes]
+        assert seen == created
+        assert first.has_more and second.has_more
+        assert not third.has_more
+
+    def test_caught_up_keeps_cursor(self, db, record_visit):
+        """Test an empty page returns the same cursor so clients can poll with it."""
+        visit = record_visit("https://example.com/a")
+
+        page = page_metrics.get_visit_changes(db, since=visit.id)
+
+        assert page.changes == []
+        assert page.next_cursor == visit.id
+        assert not page.has_more
+
+    def test_negative_cursor_raises(self, db):
+        """Test a negative cursor is rejected."""
+        with pytest.raises(ValueError):
+            page_metrics.get_visit_changes(db, since=-1)
+
+    def test_unsettled_ids_return_an_empty_page(self, db, record_visit, monkeypatch):
+        """Test a page is empty and keeps both cursors while lower ids may still commit."""
+        record_visit("https://example.com/a")
+        monkeypatch.setattr(page_metrics, "_settled_ids", lambda db: None)
+
+        page = page_metrics.get_visit_changes(db, since=0, since_repeat=3)
+
+        assert page.changes == []
+        assert (page.next_cursor, page.next_repeat_cursor) == (0, 3)
+        assert not page.has_more
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+class TestPostgresVisitChanges:
+    """Change feed checks on Postgres with interleaved writers; needs an empty scratch database."""
+
+    @pytest.fixture
+    def pg(self):
+        engine = create_engine(POSTGRES_URL)
+        Base.metadata.create_all(engine)
+        yield sessionmaker(bind=engine, expire_on_commit=False)
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+    @staticmethod
+    def _insert(session, url):
+        visit = PageMetric(
+            url=url, host="example.com", domain="example.com",
+            datetime_visited=datetime.now(timezone.utc), link_count=1, word_count=1, image_count=1,
+        )
+        session.add(visit)
+        session.flush()
+        return visit.id
+
+    def test_higher_id_committed_first_waits_for_the_lower(self, pg, monkeypatch):
+        """Test the cursor does not pass a lower id whose transaction is still open."""
+        monkeypatch.setattr(settings, "VISIT_CHANGES_SETTLE_SECONDS", 0.1)
+        slow, fast, reader = pg(), pg(), pg()
+        lower = self._insert(slow, "https://example.com/slow")
+        higher = self._insert(fast, "https://example.com/fast")
+        fast.commit()
+
+        page = page_metrics.get_visit_changes(reader, since=0)
+        assert page.changes == [] and page.next_cursor == 0
+        reader.rollback()
+
+        slow.commit()
+        page = page_metrics.get_visit_changes(reader, since=0)
+        assert [v.id for v in page.changes] == [lower, higher]
+        for session in (slow, fast, reader):
+            session.close()
+
+    def test_page_includes_a_write_finishing_during_the_wait(self, pg, monkeypatch):
+        """Test a lower id committing while the page waits is returned before the higher one."""
+        monkeypatch.setattr(settings, "VISIT_CHANGES_SETTLE_SECONDS", 5.0)
+        slow, fast, reader = pg(), pg(), pg()
+        lower = self._insert(slow, "https://example.com/slow")
+        higher = self._insert(fast, "https://example.com/fast")
+        fast.commit()
+
+        committer = threading.Timer(0.2, slow.commit)
+        committer.start()
+        page = page_metrics.get_visit_changes(reader, since=0)
+        committer.join()
+
+        assert [v.id for v in page.changes] == [lower, higher]
+        assert page.next_cursor == higher
+        for session in (slow, fast, reader):
+            session.close()
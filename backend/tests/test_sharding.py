@@ -0,0 +1,214 @@
+"""Tests for URL-hash sharding of the per-URL tables."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.config.db as db_config
+from app.config import Base
+from app.models import PageMetric, PageMetricDaily
+from app.services import page_metrics, search, sharding
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def _shard_factories(count):
+    factories = []
+    for _ in range(count):
+        engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        factories.append(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False))
+    return factories
+
+
+@pytest.fixture
+def shards(db, monkeypatch):
+    factories = _shard_factories(3)
+    monkeypatch.setattr(db_config, "ShardSessionLocals", factories)
+    yield factories
+    sharding.close_sessions(db)
+
+
+def _urls_on_distinct_shards(count, host="example.com"):
+    """One URL per shard index in [0, count)."""
+    found = {}
+    i = 0
+    while len(found) < count:
+        url = f"https://{host}/page-{i}"
+        found.setdefault(sharding.shard_for_url(url, count), url)
+        i += 1
+    return [found[index] for index in range(count)]
+
+
+def _count(factory, model=PageMetric):
+    session = factory()
+    try:
+        return session.query(model).count()
+    finally:
+        session.close()
+
+
+class TestJumpHash:
+    """Tests for shard selection."""
+
+    def test_stable_and_in_range(self):
+        """Test a URL always maps to the same shard within range."""
+        url = "https://example.com/a"
+        assert sharding.shard_for_url(url, 7) == sharding.shard_for_url(url, 7)
+        assert all(0 <= sharding.shard_for_url(f"https://e.com/{i}", 7) < 7 for i in range(200))
+
+    def test_adding_shard_only_moves_urls_to_it(self):
+        """Test growing from 4 to 5 shards moves roughly a fifth of URLs, all onto shard 4."""
+        urls = [f"https://example.com/{i}" for i in range(2000)]
+        moved = [url for url in urls if sharding.shard_for_url(url, 4) != sharding.shard_for_url(url, 5)]
+        assert all(sharding.shard_for_url(url, 5) == 4 for url in moved)
+        assert 300 < len(moved) < 500
+
+
+class TestShardRouting:
+    """Tests for single-shard routing and cross-shard reads."""
+
+    def test_visits_are_stored_on_their_shard(self, db, shards, record_visit):
+        """Test writes and per-URL reads go to the URL's shard only."""
+        urls = _urls_on_distinct_shards(3)
+        for url in urls:
+            record_visit(url, NOW)
+
+        assert [_count(factory) for factory in shards] == [1, 1, 1]
+        assert db.query(PageMetric).count() == 0
+        assert page_metrics.get_latest_metrics_for_url(db, urls[2]).visit_count == 1
+        assert len(page_metrics.get_visits_for_url(db, urls[1])) == 1
+
+    def test_domain_reads_merge_shards(self, db, shards, record_visit):
+        """Test domain visits are merged newest first and counts summed across shards."""
+        urls = _urls_on_distinct_shards(3)
+        for i, url in enumerate(urls):
+            record_visit(url, NOW + timedelta(hours=i), link_count=i)
+
+        visits = page_metrics.get_visits_for_domain(db, "example.com", limit=2, offset=1)
+        assert [visit.link_count for visit in visits] == [1, 0]
+        latest = page_metrics.get_latest_metrics_for_domain(db, "example.com")
+        assert latest.visit_count == 3
+        assert latest.last_url == urls[2]
+
+    def test_search_merges_shards(self, db, shards, record_visit):
+        """Test SQL search returns matches from every shard."""
+        urls = _urls_on_distinct_shards(3)
+        for url in urls:
+            record_visit(url, NOW)
+
+        results = search.search_urls(db, "https://example.com/page", limit=10)
+        assert sorted(result.url for result in results) == sorted(urls)
+
+    def test_change_feed_is_rejected(self, db, shards):
+        """Test the id-watermark change feed refuses sharded storage."""
+        with pytest.raises(ValueError):
+            page_metrics.get_visit_changes(db)
+
+
+class TestRebalance:
+    """Tests for moving URLs after appending a shard."""
+
+    @staticmethod
+    def _seed(session, url, first_id, rows=2):
+        for i in range(rows):
+            session.add(PageMetric(
+                id=first_id + i, url=url, host="example.com", domain="example.com",
+                datetime_visited=NOW, link_count=1, word_count=1, image_count=1,
+            ))
+        session.commit()
+
+    def test_moves_misplaced_urls(self):
+        """Test URLs stored under a 2-shard layout end up on their shard of 3, once."""
+        factories = _shard_factories(3)
+        sessions = [factory() for factory in factories]
+        urls = [f"https://example.com/{i}" for i in range(30)]
+        for i, url in enumerate(urls):
+            self._seed(sessions[sharding.shard_for_url(url, 2)], url, first_id=i * 10 + 1)
+
+        result = sharding.rebalance(sessions, batch_size=7)
+
+        moved = [url for url in urls if sharding.shard_for_url(url, 3) == 2]
+        assert result.urls_moved == len(moved) > 0
+        for url in urls:
+            expected = sharding.shard_for_url(url, 3)
+            counts = [s.query(PageMetric).filter_by(url=url).count() for s in sessions]
+            assert counts[expected] == 2 and sum(counts) == 2
+        assert sharding.rebalance(sessions).urls_moved == 0
+        for session in sessions:
+            session.close()
+
+    def test_moves_rollups_and_refuses_id_collisions(self):
+        """Test daily rollups move with their URL and a colliding visit id aborts the move."""
+        source, target = (factory() for factory in _shard_factories(2))
+        url = "https://example.com/collide"
+        self._seed(source, url, first_id=1)
+        self._seed(target, "https://example.com/other", first_id=1)
+        source.add(PageMetricDaily(
+            url=url, host="example.com", domain="example.com", day=NOW.date(), visit_count=1,
+            link_count_min=1, link_count_max=1, link_count_sum=1,
+            word_count_min=1, word_count_max=1, word_count_sum=1,
+            image_count_min=1, image_count_max=1, image_count_sum=1,
+            last_visited=NOW, last_link_count=1, last_word_count=1, last_image_count=1,
+        ))
+        source.commit()
+
+        with pytest.raises(RuntimeError):
+            sharding.move_url(source, target, url)
+        assert source.query(PageMetric).filter_by(url=url).count() == 2
+
+        target.query(PageMetric).delete()
+        target.commit()
+        assert sharding.move_url(source, target, url) == 3
+        assert target.query(PageMetricDaily).filter_by(url=url).count() == 1
+        assert source.query(PageMetricDaily).count() == 0
+        source.close()
+        target.close()
+
+    @staticmethod
+    def _rollup(url, visit_count, counts, last_visited):
+        low, high = counts
+        return PageMetricDaily(
+            url=url, host="example.com", domain="example.com", day=NOW.date(),
+            visit_count=visit_count,
+            link_count_min=low, link_count_max=high, link_count_sum=low + high,
+            word_count_min=low, word_count_max=high, word_count_sum=low + high,
+            image_count_min=low, image_count_max=high, image_count_sum=low + high,
+            last_visited=last_visited, last_link_count=high, last_word_count=high,
+            last_image_count=high,
+        )
+
+    def test_merges_a_rollup_both_shards_hold(self):
+        """Test a day rolled up on both shards is merged, not dropped, when the URL moves."""
+        source, target = (factory() for factory in _shard_factories(2))
+        url = "https://example.com/both"
+        source.add(self._rollup(url, 2, (3, 5), NOW - timedelta(hours=2)))
+        source.commit()
+        target.add(self._rollup(url, 3, (1, 4), NOW - timedelta(hours=1)))
+        target.commit()
+
+        assert sharding.move_url(source, target, url) == 1
+        merged = target.query(PageMetricDaily).filter_by(url=url).one()
+        assert merged.visit_count == 5
+        assert (merged.link_count_min, merged.link_count_max, merged.link_count_sum) == (1, 5, 13)
+        assert merged.last_link_count == 4
+        assert merged.last_visited.replace(tzinfo=timezone.utc) == NOW - timedelta(hours=1)
+        source.close()
+        target.close()
+
+    def test_copies_in_batches(self):
+        """Test a URL with more rows than one batch moves completely."""
+        source, target = (factory() for factory in _shard_factories(2))
+        url = "https://example.com/many"
+        self._seed(source, url, first_id=1, rows=25)
+
+        assert sharding.move_url(source, target, url, batch_size=10) == 25
+        assert target.query(PageMetric).filter_by(url=url).count() == 25
+        assert source.query(PageMetric).count() == 0
+        source.close()
+        target.close()
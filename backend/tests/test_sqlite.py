@@ -0,0 +1,162 @@
+"""Tests for the embedded SQLite engine configuration."""
+
+import threading
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.config import Base
+from app.config.db import _create_engine, _sessionmaker
+from app.config.settings import settings
+from app.config.sqlite import WriterLock, _is_write
+from app.models import PageMetric
+from app.schemas.page_metric import PageMetricCreateDTO
+from app.services import page_metrics
+
+
+def _file_engine(tmp_path):
+    engine = _create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+class TestSqliteEngine:
+    """Tests for pragmas and the single-writer lock."""
+
+    def test_pragmas_applied_on_connect(self, tmp_path):
+        """Test WAL, synchronous, mmap and cache pragmas are set on every connection."""
+        engine = _file_engine(tmp_path)
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA mmap_size")).scalar() > 0
+            assert conn.execute(text("PRAGMA cache_size")).scalar() < 0
+        engine.dispose()
+
+    def test_concurrent_writers_do_not_lock(self, tmp_path):
+        """Test parallel create_page_visit calls queue instead of failing with 'database is locked'."""
+        engine = _file_engine(tmp_path)
+        Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        errors = []
+
+        def write(worker):
+            db = Session()
+            try:
+                for i in range(20):
+                    page_metrics.create_page_visit(
+                        db,
+                        PageMetricCreateDTO(
+                            url=f"https://w{worker}.example.com/{i}", link_count=1, word_count=1, image_count=1
+                        ),
+                    )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        with Session() as db:
+            assert db.execute(select(func.count(PageMetric.id))).scalar() == 80
+        engine.dispose()
+
+    def test_read_then_write_transaction(self, tmp_path):
+        """Test a transaction that reads first can still write and commit."""
+        engine = _file_engine(tmp_path)
+        with engine.begin() as conn:
+            conn.execute(select(func.count(PageMetric.id))).scalar()
+            conn.execute(
+                PageMetric.__table__.insert().values(
+                    url="https://a.example.com", link_count=1, word_count=1, image_count=1
+                )
+            )
+        with engine.connect() as conn:
+            assert conn.execute(select(func.count(PageMetric.id))).scalar() == 1
+        engine.dispose()
+
+    @pytest.mark.parametrize("statement, writes", [
+        ("WITH recent AS (SELECT id FROM page_metrics) SELECT count(*) FROM recent", False),
+        ("with recursive n(i) as (select 1 union all select i + 1 from n where i < 3) select i from n", False),
+        ('WITH "select" AS (SELECT 1) DELETE FROM page_metrics', True),
+        ("WITH old AS (SELECT id FROM page_metrics) INSERT INTO page_metrics SELECT * FROM old", True),
+        ("  SELECT 1", False),
+        ("UPDATE page_metrics SET link_count = 0", True),
+    ])
+    def test_statement_classification(self, statement, writes):
+        """Test CTE reads are reads, and a WITH clause ahead of a write is a write."""
+        assert _is_write(statement) is writes
+
+    def test_cte_read_beside_own_write(self, tmp_path, monkeypatch):
+        """Test a thread with an open write can read through a CTE on another session without queueing."""
+        monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT_SECONDS", 1.0)
+        engine = _file_engine(tmp_path)
+        Session = sessionmaker(bind=engine)
+        writer, reader = Session(), Session()
+        writer.add(PageMetric(url="https://a.example.com", link_count=1, word_count=1, image_count=1))
+        writer.flush()
+
+        count = reader.execute(text("WITH rows AS (SELECT id FROM page_metrics) SELECT count(*) FROM rows"))
+        assert count.scalar() == 0
+        reader.close()
+        writer.commit()
+        writer.close()
+        engine.dispose()
+
+    def test_read_then_write_session_outlasts_a_concurrent_commit(self, tmp_path):
+        """Test a flagged session writes after another connection tried to commit between its read and write."""
+        engine = _file_engine(tmp_path)
+        Session = _sessionmaker(engine)
+        insert = PageMetric.__table__.insert()
+        errors = []
+
+        def commit_other():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert.values(url="https://b.example.com", link_count=1, word_count=1, image_count=1))
+            except Exception as e:
+                errors.append(e)
+
+        db = Session()
+        db.info["read_then_write"] = True
+        assert db.execute(select(func.count(PageMetric.id))).scalar() == 0
+        other = threading.Thread(target=commit_other)
+        other.start()
+        other.join(timeout=0.5)  # Long enough to commit, were it not queued behind this session
+        db.execute(insert.values(url="https://a.example.com", link_count=1, word_count=1, image_count=1))
+        db.commit()
+        db.close()
+        other.join()
+
+        assert errors == []
+        with engine.connect() as conn:
+            assert conn.execute(select(func.count(PageMetric.id))).scalar() == 2
+        engine.dispose()
+
+
+class TestWriterLock:
+    """Tests for the per-thread re-entrant writer lock."""
+
+    def test_reentrant_per_thread_and_released_anywhere(self):
+        """Test the holding thread takes it again at once, others wait, and any thread can release it."""
+        lock = WriterLock()
+        assert lock.acquire(timeout=0) and lock.acquire(timeout=0)
+
+        attempts = []
+        other = threading.Thread(target=lambda: attempts.append(lock.acquire(timeout=0.05)))
+        other.start()
+        other.join()
+        assert attempts == [False]
+
+        releaser = threading.Thread(target=lambda: (lock.release(), lock.release()))
+        releaser.start()
+        releaser.join()
+        other = threading.Thread(target=lambda: attempts.append(lock.acquire(timeout=0)))
+        other.start()
+        other.join()
+        assert attempts == [False, True]
@@ -0,0 +1,37 @@
+"""Tests for prebuilt hot-path statements and cache instrumentation."""
+
+from app.services import page_metrics
+from app.utils.statement_cache import instrument
+
+URL = "https://cache.example.com/page"
+
+
+class TestStatementCache:
+    """Tests for statement cache reuse on the history reads."""
+
+    def test_repeated_reads_hit_compiled_cache(self, db, record_visit):
+        """Test the second execution of each hot read is a cache hit."""
+        for i in range(3):
+            record_visit(URL, link_count=i)
+        stats = instrument(db.get_bind())
+        page_metrics.get_visits_for_url(db, URL)
+        page_metrics.get_latest_metrics_for_url(db, URL)
+        stats.reset()
+
+        page_metrics.get_visits_for_url(db, URL, limit=2, offset=1)
+        page_metrics.get_latest_metrics_for_url(db, URL)
+        assert stats.misses == 0
+        assert stats.hits == 2
+        assert stats.hit_rate == 1.0
+
+    def test_bound_limit_and_offset_are_applied(self, db, record_visit):
+        """Test pagination values are bound per call, not baked into the statement."""
+        for i in range(5):
+            record_visit(URL, link_count=i)
+        assert len(page_metrics.get_visits_for_url(db, URL, limit=2)) == 2
+        assert len(page_metrics.get_visits_for_url(db, URL, limit=10, offset=3)) == 2
+
+    def test_instrument_is_idempotent(self, db):
+        """Test instrumenting an engine twice returns the same counters."""
+        engine = db.get_bind()
+        assert instrument(engine) is instrument(engine)
@@ -0,0 +1,76 @@
+"""Tests for per-URL distribution statistics."""
+
+import statistics
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services import stats
+
+URL = "https://stats.example.com/page"
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class TestMetricStats:
+    """Tests for get_metric_stats."""
+
+    def test_distribution_matches_reference(self, db, add_visit_row):
+        """Test min/max/mean/stddev/percentiles agree with the statistics module."""
+        links = [1, 2, 3, 4, 10]
+        for i, n in enumerate(links):
+            add_visit_row(URL, NOW - timedelta(hours=i), link_count=n, word_count=n * 10)
+        add_visit_row("https://other.example.com", NOW, link_count=999)
+        db.commit()
+
+        result = stats.get_metric_stats(db, URL)
+
+        assert result.visit_count == 5
+        assert result.link_count.min == 1 and result.link_count.max == 10
+        assert result.link_count.mean == pytest.approx(4.0)
+        assert result.link_count.stddev == pytest.approx(statistics.stdev(links))
+        assert result.link_count.p50 == pytest.approx(3.0)
+        assert result.link_count.p90 == pytest.approx(7.6)  # Interpolated like percentile_cont
+        assert result.word_count.max == 100
+        assert result.image_count.stddev == 0
+
+    def test_time_range_is_half_open(self, db, add_visit_row):
+        """Test visits are filtered to [start, end)."""
+        for hours_ago, n in ((0, 1), (5, 2), (10, 3)):
+            add_visit_row(URL, NOW - timedelta(hours=hours_ago), link_count=n)
+        db.commit()
+
+        result = stats.get_metric_stats(db, URL, start=NOW - timedelta(hours=10), end=NOW)
+
+        assert result.visit_count == 2
+        assert (result.link_count.min, result.link_count.max) == (2, 3)
+
+    def test_empty_range_returns_nulls(self, db):
+        """Test no visits gives a zero count and null statistics."""
+        result = stats.get_metric_stats(db, URL)
+
+        assert result.visit_count == 0
+        assert result.link_count.mean is None and result.link_count.p99 is None
+
+    def test_single_visit_has_no_stddev(self, db, add_visit_row):
+        """Test sample stddev is null for one visit, as stddev_samp is."""
+        add_visit_row(URL, NOW, link_count=7)
+        db.commit()
+
+        result = stats.get_metric_stats(db, URL)
+
+        assert result.link_count.stddev is None
+        assert result.link_count.p99 == 7
+
+    def test_inverted_range_raises(self, db):
+        """Test start must be before end."""
+        with pytest.raises(ValueError):
+            stats.get_metric_stats(db, URL, start=NOW, end=NOW - timedelta(days=1))
+
+    def test_postgres_uses_ordered_set_aggregates(self):
+        """Test the Postgres path computes percentiles in SQL."""
+        stmt = stats._stats_stmt(stats._visit_source(URL, NOW, None, naive=False, repeats=True))
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert sql.count("percentile_cont(") == 9
+        assert "WITHIN GROUP (ORDER BY visits.link_count)" in sql
+        assert "stddev_samp" in sql
@@ -0,0 +1,159 @@
+"""Tests for traffic capture and replay."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.config.settings import settings
+from app.middleware import traffic_capture
+from app.utils import traffic_replay
+
+
+class TestAnonymizer:
+    """Tests for capture pseudonyms."""
+
+    def test_urls_are_stable_and_keep_domains(self):
+        """Test a URL always gets the same pseudonym and its host stays under its domain."""
+        anonymizer = traffic_capture.Anonymizer(b"key")
+        url = anonymizer.url("https://blog.example.com/post?id=1")
+        assert url == anonymizer.url("https://blog.example.com/post?id=1")
+        assert "example" not in url and "post" not in url
+        pseudo_domain = anonymizer.domain("example.com")
+        assert url.split("/")[2].endswith("." + pseudo_domain)
+        assert anonymizer.path("/domains/example.com/visits") == f"/domains/{pseudo_domain}/visits"
+
+    def test_query_and_body_fields(self):
+        """Test url and q parameters and the body url are replaced, other fields kept."""
+        anonymizer = traffic_capture.Anonymizer(b"key")
+        query = anonymizer.query("url=https%3A%2F%2Fexample.com%2Fa&limit=5&q=secret")
+        assert "example" not in query and "secret" not in query and "limit=5" in query
+        body = anonymizer.body({"url": "https://example.com/a", "link_count": 3})
+        assert body["link_count"] == 3 and "example" not in body["url"]
+
+
+class TestCaptureMiddleware:
+    """Tests for TrafficCaptureMiddleware."""
+
+    @pytest.fixture
+    def capture(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_ENABLED", True)
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_ANONYMIZE", False)
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_FILE", str(tmp_path / "traffic.jsonl"))
+        yield tmp_path / "traffic.jsonl"
+        traffic_capture.close_recorder()
+
+    @staticmethod
+    def _app():
+        app = FastAPI()
+        app.add_middleware(traffic_capture.TrafficCaptureMiddleware)
+
+        @app.post("/items/{item_id}")
+        async def create(item_id: int, request: Request):
+            return {"id": item_id, "received": await request.json()}
+
+        @app.get("/health")
+        def health():
+            return {}
+
+        return app
+
+    def test_records_sampled_requests(self, capture):
+        """Test a request is captured with route, body and status and still reaches the handler."""
+        client = TestClient(self._app())
+        response = client.post("/items/7?x=1", json={"url": "https://example.com"})
+        client.get("/health")
+        traffic_capture.close_recorder()
+
+        assert response.json()["received"] == {"url": "https://example.com"}
+        lines = capture.read_text().splitlines()
+        assert len(lines) == 1
+        record = json.loads(lines[0])
+        assert record["method"] == "POST"
+        assert record["path"] == "/items/7" and record["route"] == "/items/{item_id}"
+        assert record["query"] == "x=1"
+        assert record["body"] == {"url": "https://example.com"}
+        assert record["status"] == 200 and record["duration_ms"] >= 0
+
+    def test_workers_share_a_generated_key(self, capture, monkeypatch):
+        """Test without a salt every recorder on the same file pseudonymizes a URL alike."""
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_ANONYMIZE", True)
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_SALT", "")
+        first = traffic_capture.get_recorder().anonymizer.url("https://example.com/a")
+        traffic_capture.close_recorder()  # A restart, or another worker opening the same file
+        second = traffic_capture.get_recorder().anonymizer.url("https://example.com/a")
+
+        assert first == second and "example.com" not in first
+        key_file = capture.with_name("traffic.jsonl.key")
+        assert key_file.stat().st_mode & 0o077 == 0
+        monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_SALT", "other")
+        traffic_capture.close_recorder()
+        assert traffic_capture.get_recorder().anonymizer.url("https://example.com/a") != first
+
+
+class TestReplay:
+    """Tests for the replay driver."""
+
+    @staticmethod
+    def _records():
+        return [
+            {"ts": 0.0, "method": "GET", "path": "/metrics", "route": "/metrics", "query": "url=a"},
+            {"ts": 0.01, "method": "GET", "path": "/missing", "query": ""},
+            {"ts": 0.02, "method": "POST", "path": "/visits", "route": "/visits", "body": {"x": 1}},
+            {"ts": 0.03, "method": "GET", "path": "/metrics", "route": "/metrics", "query": "url=b"},
+        ]
+
+    @staticmethod
+    def _client(seen):
+        def handler(request):
+            seen.append(request)
+            if request.url.path == "/visits":
+                return httpx.Response(500)
+            if request.url.path == "/missing":
+                return httpx.Response(404)
+            return httpx.Response(200)
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test")
+
+    def test_reports_per_endpoint_outcomes(self):
+        """Test every record is sent with its query and body and grouped by route."""
+        seen = []
+
+        async def run():
+            async with self._client(seen) as client:
+                return await traffic_replay.replay(self._records(), client, speed=None, concurrency=2)
+
+        stats = asyncio.run(run())
+        assert len(seen) == 4
+        assert seen[0].url.params["url"] == "a"
+        assert json.loads(seen[2].content) == {"x": 1}
+        assert stats["GET /metrics"].count == 2
+        assert stats["POST /visits"].summary()["error_rate"] == 1.0
+        assert stats["GET /missing"].summary()["client_error_rate"] == 1.0
+
+    def test_paced_replay_keeps_spacing(self):
+        """Test 1x replay takes about as long as the capture spans, and 2x half as long."""
+        records = [{"ts": i * 0.05, "method": "GET", "path": "/metrics"} for i in range(5)]
+
+        async def run(speed):
+            loop = asyncio.get_running_loop()
+            async with self._client([]) as client:
+                started = loop.time()
+                await traffic_replay.replay(records, client, speed=speed)
+                return loop.time() - started
+
+        assert asyncio.run(run(1.0)) >= 0.19
+        assert asyncio.run(run(2.0)) < 0.19
+
+    def test_parse_speed_and_percentile(self):
+        """Test speed strings and nearest-rank percentiles."""
+        assert traffic_replay.parse_speed("4x") == 4.0
+        assert traffic_replay.parse_speed("max") is None
+        stats = traffic_replay.EndpointStats()
+        for latency in range(1, 101):
+            stats.record(float(latency), 200)
+        assert stats.percentile(50) == 50.0 and stats.percentile(99) == 99.0
@@ -0,0 +1,77 @@
+"""Tests for URL canonicalization."""
+
+import pytest
+
+from app.utils import urls
+from app.utils.urls import canonicalize_url
+
+
+class TestCanonicalizeUrl:
+    """Tests for canonicalize_url."""
+
+    @pytest.mark.parametrize(
+        "raw, expected",
+        [
+            ("https://example.com/", "https://example.com"),
+            ("HTTPS://Example.COM/Path/", "https://example.com/Path"),
+            ("http://example.com:80/a", "http://example.com/a"),
+            ("https://example.com:443", "https://example.com"),
+            ("https://example.com:8443/", "https://example.com:8443"),
+            ("https://example.com/a/?q=1#section", "https://example.com/a?q=1"),
+            ("  https://example.com  ", "https://example.com"),
+        ],
+    )
+    def test_canonical_forms(self, raw, expected):
+        """Test scheme/host lowercasing, default ports, fragments and slashes."""
+        assert canonicalize_url(raw) == expected
+
+    def test_idempotent(self):
+        """Test canonicalizing a canonical URL returns it unchanged."""
+        once = canonicalize_url("HTTP://Example.com:80/a/#x")
+        assert canonicalize_url(once) == once
+
+    @pytest.mark.parametrize(
+        "raw",
+        ["", "ftp://example.com", "example.com", "https://", "https://example.com:99999", "https://" + "a" * 2048],
+    )
+    def test_invalid_urls_raise(self, raw):
+        """Test invalid URLs raise ValueError."""
+        with pytest.raises(ValueError):
+            canonicalize_url(raw)
+
+    def test_strip_tracking_params(self):
+        """Test tracking parameters are removed and others kept in order."""
+        result = urls._canonicalize(
+            "https://example.com/a?utm_source=x&id=7&fbclid=abc&b=2", strip_tracking=True
+        )
+        assert result == "https://example.com/a?id=7&b=2"
+
+    def test_results_are_cached(self):
+        """Test repeated lookups of the same raw string hit the cache."""
+        canonicalize_url.cache_clear()
+        canonicalize_url("https://cached.example.com/")
+        canonicalize_url("https://cached.example.com/")
+        assert canonicalize_url.cache_info().hits == 1
+
+
+class TestRegistrableDomain:
+    """Tests for host and registrable domain extraction."""
+
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            ("https://example.com/a", ("example.com", "example.com")),
+            ("https://www.blog.example.com", ("www.blog.example.com", "example.com")),
+            ("https://news.bbc.co.uk/x", ("news.bbc.co.uk", "bbc.co.uk")),
+            ("http://127.0.0.1:8000/a", ("127.0.0.1", "127.0.0.1")),
+            ("http://localhost:3000", ("localhost", "localhost")),
+        ],
+    )
+    def test_split_host(self, url, expected):
+        """Test host and eTLD+1 are derived from the URL."""
+        assert urls.split_host(url) == expected
+
+    def test_normalize_host_rejects_garbage(self):
+        """Test invalid hostnames raise ValueError."""
+        with pytest.raises(ValueError):
+            urls.normalize_host("not a host/")
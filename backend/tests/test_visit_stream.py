@@ -0,0 +1,204 @@
+"""Tests for the live visit fan-out hub."""
+
+import asyncio
+import os
+import sys
+import time
+import types
+
+import pytest
+
+from app.config.settings import settings
+from app.schemas import page_metric as schemas
+from app.services import page_metrics, visit_stream
+from app.services.visit_stream import VisitHub
+
+
+def _event(url, visit_id=1):
+    return {
+        "id": visit_id,
+        "url": url,
+        "link_count": 1,
+        "word_count": 2,
+        "image_count": 3,
+        "datetime_visited": None,
+    }
+
+
+class TestVisitHub:
+    """Tests for VisitHub subscription and delivery."""
+
+    def test_publish_reaches_matching_subscribers_only(self):
+        """Test events are delivered only to subscribers of that URL."""
+        async def scenario():
+            hub = VisitHub()
+            matching = hub.subscribe(["https://example.com"])
+            other = hub.subscribe(["https://other.com"])
+            delivered = hub.publish(_event("https://example.com"))
+            await asyncio.sleep(0)
+            return delivered, matching.queue.qsize(), other.queue.qsize()
+
+        assert asyncio.run(scenario()) == (1, 1, 0)
+
+    def test_slow_consumer_drops_oldest(self):
+        """Test a full buffer keeps the newest events and counts drops."""
+        async def scenario():
+            hub = VisitHub(buffer_size=2)
+            subscription = hub.subscribe(["https://example.com"])
+            for visit_id in range(1, 5):
+                hub.publish(_event("https://example.com", visit_id))
+            await asyncio.sleep(0)
+            ids = [(await subscription.get())["id"] for _ in range(2)]
+            return ids, subscription.dropped
+
+        assert asyncio.run(scenario()) == ([3, 4], 2)
+
+    def test_unsubscribe_removes_subscription(self):
+        """Test unsubscribed connections stop receiving events."""
+        async def scenario():
+            hub = VisitHub()
+            subscription = hub.subscribe(["https://example.com", "https://other.com"])
+            hub.unsubscribe(subscription)
+            return hub.publish(_event("https://example.com")), hub.subscriber_count()
+
+        assert asyncio.run(scenario()) == (0, 0)
+
+    def test_failing_listener_does_not_stop_delivery(self):
+        """Test a listener that raises is logged, and later listeners and subscribers still get the event."""
+        async def scenario():
+            hub = VisitHub()
+            heard = []
+            hub.add_listener(lambda event: 1 / 0)
+            hub.add_listener(lambda event: heard.append(event["id"]))
+            subscription = hub.subscribe(["https://example.com"])
+            delivered = hub.publish(_event("https://example.com", 7))
+            await asyncio.sleep(0)
+            return delivered, heard, subscription.queue.qsize()
+
+        assert asyncio.run(scenario()) == (1, [7], 1)
+
+    def test_create_page_visit_publishes(self, db):
+        """Test that recording a visit publishes it to the shared hub."""
+        async def scenario():
+            subscription = visit_stream.hub.subscribe(["https://example.com"])
+            try:
+                page_metrics.create_page_visit(
+                    db,
+                    schemas.PageMetricCreateDTO(
+                        url="https://example.com/",
+                        link_count=10,
+                        word_count=500,
+                        image_count=5,
+                    ),
+                )
+                return await asyncio.wait_for(subscription.get(), timeout=1)
+            finally:
+                visit_stream.hub.unsubscribe(subscription)
+
+        event = asyncio.run(scenario())
+        assert event["url"] == "https://example.com"
+        assert event["link_count"] == 10
+
+
+class _FakeListenConnection:
+    """A LISTEN connection whose socket is readable and whose poll fails if `broken`."""
+
+    def __init__(self, broken):
+        self.broken = broken
+        self.notifies = []
+        self.executed = []
+        self._read, self._write = os.pipe()
+        os.write(self._write, b"x")
+
+    def fileno(self):
+        return self._read
+
+    def set_session(self, autocommit):
+        pass
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, statement):
+                connection.executed.append(statement)
+
+        return Cursor()
+
+    def poll(self):
+        if self.broken:
+            raise OSError("server closed the connection unexpectedly")
+
+    def close(self):
+        for fd in (self._read, self._write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class TestPostgresNotifyBridge:
+    """Tests for the bridge's liveness report and reconnection."""
+
+    def test_reconnects_and_listens_again(self, monkeypatch):
+        """Test a failed connection is replaced, LISTEN re-issued and the generation advanced."""
+        broken, healthy = _FakeListenConnection(broken=True), _FakeListenConnection(broken=False)
+        connections = [broken, healthy]
+        attempts = []
+
+        def connect(dsn):
+            attempts.append(dsn)
+            if len(attempts) == 2:
+                raise OSError("connection refused")  # One failed attempt while the server is down
+            return connections.pop(0)
+
+        monkeypatch.setitem(sys.modules, "psycopg2", types.SimpleNamespace(connect=connect))
+        bridge = visit_stream.PostgresNotifyBridge(VisitHub(), "postgresql://db/history")
+        bridge.RECONNECT_MIN_SECONDS = 0.01
+        bridge.start()
+        try:
+            deadline = time.monotonic() + 5
+            while not (bridge.running and bridge.generation == 2) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert bridge.running and bridge.generation == 2
+            assert len(attempts) == 3
+            assert healthy.executed == ["LISTEN page_visits"]
+        finally:
+            bridge.stop()
+        assert not bridge.running
+
+    def test_not_running_until_its_listener_runs(self, monkeypatch):
+        """Test a bridge whose listener thread has not started or has exited reports not running."""
+        bridge = visit_stream.PostgresNotifyBridge(VisitHub(), "postgresql://unused")
+        assert not bridge.running
+
+        monkeypatch.setattr(visit_stream, "_bridge", bridge)
+        assert not visit_stream.bridge_running()
+        monkeypatch.setattr(visit_stream, "_bridge", None)
+        assert not visit_stream.bridge_running()
+
+    @pytest.mark.parametrize("url", [
+        "postgresql://app:s3cret@db:5432/history",
+        "postgresql+psycopg://app:s3cret@db:5432/history",
+        "postgresql+psycopg2://app:s3cret@db:5432/history",
+    ])
+    def test_listens_with_a_plain_libpq_url(self, url):
+        """Test any SQLAlchemy Postgres driver suffix is dropped, keeping the password."""
+        assert visit_stream.libpq_dsn(url) == "postgresql://app:s3cret@db:5432/history"
+
+    def test_ready_reports_the_bridge(self, client, monkeypatch):
+        """Test /ready says whether the bridge is listening when it is configured."""
+        monkeypatch.setattr(client.app.state, "ready", True, raising=False)
+        monkeypatch.setattr(client.app.state, "startup", types.SimpleNamespace(total=0.5, phases={}), raising=False)
+        assert "visit_stream_bridge" not in client.get("/ready").json()
+
+        monkeypatch.setattr(settings, "VISIT_STREAM_PG_BRIDGE", True)
+        assert client.get("/ready").json()["visit_stream_bridge"] == "reconnecting"
+        monkeypatch.setattr(visit_stream, "bridge_running", lambda: True)
+        assert client.get("/ready").json()["visit_stream_bridge"] == "listening"